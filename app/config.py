@@ -0,0 +1,60 @@
+"""Настройки приложения, читаемые из переменных окружения с префиксом FLASHMIND_.
+
+Например, FLASHMIND_DB_PATH=/var/lib/flashmind/flashcards.db uvicorn main:app --workers 4
+запускает четыре процесса, работающих с одним файлом базы.
+"""
+
+from pathlib import Path
+
+from database.storage import StorageConfig
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Настройки базы данных приложения
+
+    Attributes:
+        db_path (str): путь к файлу базы. Относительный путь считается от рабочей директории в момент
+            чтения настроек и сразу превращается в абсолютный, чтобы все соединения открывали один файл
+        pool_size (int): сколько соединений для чтения открывает каждый процесс
+        busy_timeout (float): сколько секунд ждать блокировку, которую держит другой процесс
+        busy_retries (int): сколько раз повторить начало записи, если база осталась заблокированной
+        cache_ttl (float): время жизни кэша чтения в секундах. Кэш каждого процесса не видит изменений
+            других процессов, поэтому при нескольких процессах это граница устаревания ответов
+        group_commit (bool): выполнять одиночные изменения пачками (см. SimpleDB)
+        compaction_interval (float): период фонового сжатия файла базы в секундах. 0 отключает сжатие
+    """
+
+    model_config = SettingsConfigDict(env_prefix="FLASHMIND_")
+
+    db_path: str = "flashcards.db"
+    pool_size: int = 5
+    busy_timeout: float = 5.0
+    busy_retries: int = 3
+    cache_ttl: float = 5.0
+    group_commit: bool = False
+    compaction_interval: float = 300.0
+
+    @field_validator("db_path")
+    @classmethod
+    def resolve_db_path(cls, value):
+        """Превращает путь к базе в абсолютный"""
+        if value == ":memory:":
+            return value
+        return str(Path(value).expanduser().resolve())
+
+    def database_options(self):
+        """Возвращает именованные аргументы SimpleDB для этих настроек
+
+        Returns:
+            dict: аргументы конструктора SimpleDB
+        """
+        return {
+            "db_file": self.db_path,
+            "pool_size": self.pool_size,
+            "storage": StorageConfig(busy_timeout=self.busy_timeout, busy_retries=self.busy_retries),
+            "cache_ttl": self.cache_ttl,
+            "group_commit": self.group_commit,
+            "compaction_interval": self.compaction_interval or None,
+        }
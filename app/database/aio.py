@@ -0,0 +1,72 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncSimpleDB:
+    """Асинхронный интерфейс к SimpleDB.
+
+    Повторяет методы SimpleDB, но выполняет их на выделенных потоках базы данных, поэтому запросы
+    к SQLite и фиксация транзакций не блокируют цикл событий. Вызовы ставятся в очередь исполнителя
+    и разбираются его потоками, каждый из которых берет соединение из пула SimpleDB.
+
+    Методы iter_* возвращают обычные генераторы, их нужно перебирать вне цикла событий
+    (например, отдавать в StreamingResponse, который перебирает их в пуле потоков).
+    """
+
+    def __init__(self, db, workers=None):
+        """
+        Args:
+            db (SimpleDB): синхронная база данных, к которой адресуются вызовы
+            workers (int, optional): количество потоков базы данных. По умолчанию по одному на
+                каждое соединение для чтения и одно на запись
+        """
+        self.db = db
+        self.workers = workers or db.read_pool.size + 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="simpledb")
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет произвольную функцию на потоке базы данных
+
+        Args:
+            func (callable): функция, работающая с SimpleDB
+            *args: позиционные аргументы функции
+            **kwargs: именованные аргументы функции
+
+        Returns:
+            object: результат функции
+        """
+        loop = asyncio.get_running_loop()
+        # Как и asyncio.to_thread, переносим контекст вызывающей задачи в поток, чтобы время запросов
+        # к базе засчитывалось запросу к API, который их выполнил
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        if getattr(attr, "batched_write", False) and self.db.group_commit is not None:
+            # Изменение ставится прямо в очередь групповой фиксации: ожидание фиксации пачки
+            # не занимает поток базы данных
+            method = attr.__wrapped__
+
+            @functools.wraps(attr)
+            async def call(*args, **kwargs):
+                return await asyncio.wrap_future(self.db.group_commit.submit(method, self.db, *args, **kwargs))
+
+        else:
+
+            @functools.wraps(attr)
+            async def call(*args, **kwargs):
+                return await self.run(attr, *args, **kwargs)
+
+        # Кэшируем обертку, чтобы не создавать ее при каждом обращении
+        self.__dict__[name] = call
+        return call
+
+    def close(self):
+        """Дожидается завершения поставленных в очередь вызовов и останавливает потоки"""
+        self._executor.shutdown(wait=True)
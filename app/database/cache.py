@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReadThroughCache:
+    """Ограниченный по размеру LRU-кэш с временем жизни записей.
+
+    Значение загружается функцией loader при промахе и кэшируется. Если во время загрузки
+    произошла инвалидация, загруженное значение не сохраняется: оно могло быть прочитано до
+    фиксации изменений, которые эту инвалидацию вызвали.
+    """
+
+    def __init__(self, maxsize=1024, ttl=5.0, clock=time.monotonic):
+        """
+        Args:
+            maxsize (int): максимальное количество записей. 0 отключает кэширование
+            ttl (float): время жизни записи в секундах
+            clock (callable): источник монотонного времени
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get_or_load(self, key, loader, cacheable=None):
+        """Возвращает значение из кэша или загружает его
+
+        Args:
+            key (hashable): ключ записи
+            loader (callable): функция без аргументов, загружающая значение при промахе
+            cacheable (callable, optional): проверка, стоит ли сохранять загруженное значение.
+                Значения None не сохраняются никогда
+
+        Returns:
+            object: значение из кэша или результат loader
+        """
+        if self.maxsize <= 0:
+            return loader()
+
+        now = self.clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._data[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            generation = self._generation
+
+        value = loader()
+        if value is None or (cacheable is not None and not cacheable(value)):
+            return value
+
+        with self._lock:
+            if generation != self._generation:
+                return value
+            self._data[key] = (value, now + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+        return value
+
+    def get_many_or_load(self, keys, loader):
+        """Возвращает значения нескольких ключей, загружая все отсутствующие в кэше одним вызовом
+
+        Args:
+            keys (iterable): ключи записей
+            loader (callable): функция, принимающая список ключей-промахов и возвращающая словарь
+                {ключ: значение} для найденных. Отсутствующие в словаре ключи не кэшируются
+
+        Returns:
+            dict: {ключ: значение} для найденных ключей
+        """
+        keys = list(dict.fromkeys(keys))
+        if self.maxsize <= 0:
+            return loader(keys) if keys else {}
+
+        now = self.clock()
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is not None:
+                    value, expires_at = entry
+                    if expires_at > now:
+                        self._data.move_to_end(key)
+                        self._stats["hits"] += 1
+                        found[key] = value
+                        continue
+                    del self._data[key]
+                    self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                missing.append(key)
+            generation = self._generation
+
+        if not missing:
+            return found
+        loaded = {key: value for key, value in loader(missing).items() if value is not None}
+        found.update(loaded)
+
+        with self._lock:
+            if generation != self._generation:
+                return found
+            for key, value in loaded.items():
+                self._data[key] = (value, now + self.ttl)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+        return found
+
+    def invalidate(self, *keys):
+        """Удаляет записи с указанными ключами
+
+        Args:
+            *keys: ключи удаляемых записей
+        """
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        """Удаляет все записи"""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        """Возвращает счетчики кэша
+
+        Returns:
+            dict: количество попаданий, промахов, вытеснений, устаревших и инвалидированных записей и размер кэша
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._data)
+            stats["maxsize"] = self.maxsize
+        return stats
@@ -0,0 +1,61 @@
+"""Фоновое освобождение места в файле базы данных.
+
+В режиме auto_vacuum = INCREMENTAL страницы, освободившиеся после удаления записей, остаются в файле
+в списке свободных страниц, пока их не вернет PRAGMA incremental_vacuum. Compactor периодически
+проверяет размер этого списка и, если он превысил порог, возвращает страницы небольшими шагами
+(SimpleDB.compact), каждый в своей короткой транзакции. В режиме WAL читатели при этом не
+блокируются, а остальные записи ждут не дольше одного шага.
+"""
+
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class Compactor:
+    """Поток, периодически возвращающий свободные страницы базы данных файловой системе"""
+
+    def __init__(self, db, interval=300.0, min_free_pages=1024, step_pages=256):
+        """
+        Args:
+            db (SimpleDB): база данных, место в которой нужно освобождать
+            interval (float): период проверки в секундах
+            min_free_pages (int): сколько свободных страниц должно накопиться, чтобы начать сжатие
+            step_pages (int): сколько страниц возвращать за одну транзакцию
+        """
+        self.db = db
+        self.interval = interval
+        self.min_free_pages = min_free_pages
+        self.step_pages = step_pages
+        self.runs = 0
+        self.freed_pages = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="simpledb-compactor", daemon=True)
+        self._thread.start()
+
+    def run_once(self):
+        """Сжимает базу, если свободных страниц больше порога
+
+        Returns:
+            int: количество возвращенных страниц
+        """
+        if self.db.storage_stats()["freelist_count"] < self.min_free_pages:
+            return 0
+        freed = self.db.compact(step_pages=self.step_pages)
+        self.runs += 1
+        self.freed_pages += freed
+        return freed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Ошибка фонового сжатия базы данных")
+
+    def close(self):
+        """Останавливает поток сжатия"""
+        self._stop.set()
+        self._thread.join()
@@ -1,61 +1,527 @@
+import functools
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from functools import cached_property
+
+from .aio import AsyncSimpleDB
+from .cache import ReadThroughCache
+from .compaction import Compactor
+from .group_commit import GroupCommitWriter
+from .instrumentation import InstrumentedConnection, QueryStats
+from .migrations import SIMILARITY_INDEX_SCOPE, migrate
+from .pool import ConnectionPool
+from .records import FlashcardRecord, TopicRecord, row_factory, select_columns
+from .scheduler import ReviewState, schedule, to_local_naive
+from .similarity import (
+    card_signature,
+    estimate_similarity,
+    jaccard,
+    lsh_buckets,
+    pack_signature,
+    shingles,
+    unpack_signature,
+)
+from .storage import StorageConfig, connect, is_memory, retry_busy
+from .timestamps import to_timestamp
+
+
+_TOPIC_COLUMNS = select_columns(TopicRecord)
+_FLASHCARD_COLUMNS = select_columns(FlashcardRecord)
+_TOPIC_ROW = row_factory(TopicRecord)
+_FLASHCARD_ROW = row_factory(FlashcardRecord)
+
+
+def fetch_records(conn, factory, sql, parameters=()):
+    """Выполняет запрос и возвращает строки, созданные фабрикой строк factory
+
+    Args:
+        conn (sqlite3.Connection): соединение с базой
+        factory (callable): фабрика строк курсора, например row_factory(FlashcardRecord)
+        sql (str): запрос, колонки которого идут в порядке полей записи
+        parameters (tuple, optional): параметры запроса
+
+    Returns:
+        list: записи
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = factory
+    return cursor.execute(sql, parameters).fetchall()
+
+
+def empty_topic_stats(topic_id):
+    """Возвращает статистику темы без карточек (см. SimpleDB.get_topics_stats)
+
+    Args:
+        topic_id (int): id темы
+
+    Returns:
+        dict: статистика с нулевыми счетчиками
+    """
+    return {
+        "topic_id": topic_id,
+        "card_count": 0,
+        "average_difficulty": None,
+        "difficulty_histogram": [],
+        "due_count": 0,
+        "overdue_count": 0,
+        "last_reviewed_at": None,
+    }
+
+
+def fts_query(text):
+    """Превращает пользовательский текст в безопасный запрос FTS5
+
+    Каждое слово берется в кавычки, поэтому операторы и спецсимволы синтаксиса FTS5 во вводе
+    пользователя не приводят к ошибкам.
+
+    Args:
+        text (str): поисковый запрос пользователя
+
+    Returns:
+        str: запрос для MATCH или пустая строка, если в тексте нет слов
+    """
+    return " ".join('"' + token.replace('"', '""') + '"' for token in text.split())
+
+
+class PreconditionFailed(Exception):
+    """Ошибка, возникающая, если запись изменилась и не удовлетворяет условию обновления"""
+
+
+class TopicNotFound(Exception):
+    """Ошибка, возникающая, если карточку переносят в несуществующую тему"""
+
+
+class NearDuplicate(Exception):
+    """Ошибка, возникающая, если в базе уже есть карточка, слишком похожая на создаваемую
+
+    Attributes:
+        flashcard (tuple): запись найденной похожей карточки
+        similarity (float): коэффициент Жаккара шинглов двух карточек
+    """
+
+    def __init__(self, flashcard, similarity):
+        super().__init__(f"Похожая карточка уже существует: {flashcard[0]} (похожесть {similarity:.2f})")
+        self.flashcard = flashcard
+        self.similarity = similarity
+
+
+def batched_write(method):
+    """Помечает метод SimpleDB как отдельное изменение, которое можно выполнить групповой фиксацией
+
+    Если у базы включена групповая фиксация, вызов ставится в ее очередь и ждет фиксации пачки,
+    в которую попал. Вызовы изнутри уже открытой транзакции записи выполняются в ней сразу.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.group_commit is None or self.pool.held():
+            return method(self, *args, **kwargs)
+        return self.group_commit.submit(method, self, *args, **kwargs).result()
+
+    wrapper.batched_write = True
+    return wrapper
+
+
+# Списки карточек темы длиннее этого значения не кэшируются, чтобы кэш не занимал много памяти
+MAX_CACHED_LIST_SIZE = 1000
+
+# Сколько карточек с наибольшим числом общих корзин LSH рассматривать при поиске похожих
+MAX_SIMILAR_CANDIDATES = 500
+# Кандидаты, оценка похожести которых по сигнатурам ниже порога больше чем на это значение (около трех
+# стандартных отклонений оценки), отбрасываются без точного сравнения
+SIGNATURE_SLACK = 0.2
 
 
 class SimpleDB:
-    """Класс управляющий базой данных"""
+    """Класс управляющий базой данных.
 
-    def __init__(self, db_file="flashcards.db", check_same_thread: bool = True):
+    Каждый метод берет соединение из пула на время своей работы, поэтому один экземпляр SimpleDB
+    можно безопасно использовать из нескольких потоков одновременно. Запись идет через единственное
+    пишущее соединение, а чтение - через отдельный пул соединений только для чтения, которые в режиме
+    WAL не блокируются на время записи.
+    """
+
+    def __init__(
+        self,
+        db_file="flashcards.db",
+        check_same_thread: bool = True,
+        pool_size: int = 5,
+        pool_timeout=30.0,
+        storage: StorageConfig = None,
+        cache_size: int = 1024,
+        cache_ttl: float = 5.0,
+        slow_query_ms: float = 100.0,
+        group_commit: bool = False,
+        group_commit_window_ms: float = 2.0,
+        group_commit_max_batch: int = 500,
+        compaction_interval: float = None,
+    ):
+        """
+        Args:
+            db_file (str): путь к файлу базы данных или ":memory:"
+            check_same_thread (bool): оставлен для совместимости. Соединения пула всегда создаются с
+                check_same_thread=False, так как пул гарантирует, что соединением в каждый момент
+                времени пользуется только один поток
+            pool_size (int): максимальное количество соединений для чтения
+            pool_timeout (float): сколько секунд ждать свободное соединение
+            storage (StorageConfig, optional): настройки SQLite. По умолчанию WAL и StorageConfig()
+            cache_size (int): сколько записей хранить в кэше чтения тем и карточек. 0 отключает кэш
+            cache_ttl (float): время жизни записи кэша в секундах. Ограничивает, насколько устаревшими
+                могут быть данные, измененные другим процессом
+            slow_query_ms (float, optional): запросы дольше этого порога в миллисекундах записываются в журнал
+                вместе с планом выполнения. None отключает журнал медленных запросов
+            group_commit (bool): выполнять одиночные изменения (создание, обновление, повторение и удаление
+                тем и карточек) пачками в общих транзакциях. Вызов возвращается только после фиксации пачки
+            group_commit_window_ms (float): сколько миллисекунд после первого изменения пачки ждать следующие
+            group_commit_max_batch (int): максимальное количество изменений в одной транзакции
+            compaction_interval (float, optional): период в секундах, с которым фоновый поток возвращает
+                свободные страницы файла базы (см. compact). None отключает фоновое сжатие
+        """
         self.db_file = db_file
-        self.conn = sqlite3.connect(self.db_file, check_same_thread=check_same_thread)
-        self.cursor = self.conn.cursor()
+        self.check_same_thread = check_same_thread
+        self.storage = storage or StorageConfig()
+        self.query_stats = QueryStats(None if slow_query_ms is None else slow_query_ms / 1000)
+        # SQLite допускает только одного писателя, поэтому пишущее соединение одно
+        self.pool = ConnectionPool(self._connect, size=1, timeout=pool_timeout)
+        if is_memory(self.db_file):
+            # База в памяти существует только внутри одного соединения, поэтому читаем через него же
+            self.read_pool = self.pool
+        else:
+            self.read_pool = ConnectionPool(self._connect_read_only, size=pool_size, timeout=pool_timeout)
+        self.cache = ReadThroughCache(maxsize=cache_size, ttl=cache_ttl)
+        self._local = threading.local()
+        self._busy_lock = threading.Lock()
+        self._busy_retries = 0
         self.create_tables()
+        self.group_commit = None
+        if group_commit:
+            self.group_commit = GroupCommitWriter(self, group_commit_window_ms / 1000, group_commit_max_batch)
+        self.compactor = None
+        if compaction_interval is not None:
+            self.compactor = Compactor(self, interval=compaction_interval)
 
-    def create_tables(self):
-        """Функция для создания таблиц"""
-        self.cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS topics (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                description TEXT,
-                created_at TEXT,
-                updated_at TEXT
-            )
+    def _connect(self, read_only=False):
+        """Создает соединение с базой данных, которое передает статистику запросов в query_stats"""
+        conn = connect(self.db_file, self.storage, read_only=read_only, factory=InstrumentedConnection)
+        conn.stats = self.query_stats
+        return conn
+
+    def _connect_read_only(self):
+        """Создает соединение только для чтения"""
+        return self._connect(read_only=True)
+
+    @contextmanager
+    def _read(self):
+        """Выдает соединение для чтения.
+
+        Если поток уже находится внутри транзакции записи, чтение идет через пишущее соединение,
+        чтобы видеть собственные незафиксированные изменения.
         """
-        )
+        pool = self.pool if self.pool.held() else self.read_pool
+        with pool.connection() as conn:
+            yield conn
 
-        self.cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS flashcards (
-                id INTEGER PRIMARY KEY,
-                topic_id INTEGER,
-                question TEXT,
-                answer TEXT,
-                difficulty_level INTEGER,
-                last_reviewed_at TEXT,
-                created_at TEXT,
-                updated_at TEXT,
-                FOREIGN KEY (topic_id) REFERENCES topics(id)
-            )
+    @contextmanager
+    def _snapshot(self):
+        """Выдает соединение для чтения, все запросы которого видят один и тот же снимок базы
+
+        Внутри транзакции записи используется ее соединение и ее транзакция.
+        """
+        with self._read() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+
+    @contextmanager
+    def _write(self):
+        """Выдает пишущее соединение в транзакции, которая фиксируется при выходе из самого внешнего блока.
+
+        После успешной фиксации самой внешней транзакции выполняются действия, отложенные через _after_commit.
+        """
+        if self.pool.held():
+            with self.pool.transaction() as conn:
+                yield conn
+            return
+
+        self._local.after_commit = []
+        try:
+            with self.pool.transaction() as conn:
+                # Блокировка записи берется в начале транзакции, а не при первом изменении: иначе
+                # проверка, прочитанная до изменения, могла бы устареть из-за записи другого процесса
+                retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"), self.storage, self._count_busy_retry)
+                yield conn
+            callbacks = self._local.after_commit
+        finally:
+            self._local.after_commit = None
+        for callback in callbacks:
+            callback()
+
+    def _count_busy_retry(self):
+        with self._busy_lock:
+            self._busy_retries += 1
+
+    def busy_stats(self):
+        """Возвращает количество повторов операций, получивших SQLITE_BUSY от другого процесса
+
+        Returns:
+            dict: количество повторов (ключ "retries")
+        """
+        with self._busy_lock:
+            return {"retries": self._busy_retries}
+
+    def _after_commit(self, callback):
+        """Откладывает действие до фиксации текущей транзакции записи или выполняет его сразу вне транзакции"""
+        pending = getattr(self._local, "after_commit", None)
+        if pending is None:
+            callback()
+        else:
+            pending.append(callback)
+
+    def _invalidate(self, *keys):
+        """Удаляет записи кэша после фиксации текущей транзакции"""
+        self._after_commit(lambda: self.cache.invalidate(*keys))
+
+    def _cached(self, key, loader, cacheable=None):
+        """Читает значение через кэш.
+
+        Внутри транзакции записи кэш не используется: чтение должно видеть незафиксированные изменения
+        и не должно сохранять их в кэш до фиксации.
+        """
+        if self.pool.held():
+            return loader()
+        return self.cache.get_or_load(key, loader, cacheable)
+
+    def _cached_many(self, kind, ids, loader):
+        """Читает записи по нескольким id через кэш, загружая промахи одним вызовом loader
+
+        Args:
+            kind (str): тип записи, первая часть ключа кэша, например "flashcard"
+            ids (iterable): id записей
+            loader (callable): функция, принимающая список id и возвращающая словарь {id: запись}
+
+        Returns:
+            dict: {id: запись} для найденных записей
         """
+        if self.pool.held():
+            return loader(list(dict.fromkeys(ids)))
+        found = self.cache.get_many_or_load(
+            [(kind, record_id) for record_id in ids],
+            lambda keys: {(kind, record_id): row for record_id, row in loader([key[1] for key in keys]).items()},
         )
+        return {key[1]: row for key, row in found.items()}
 
-        self.conn.commit()
+    def _fetch_by_ids(self, table, ids, chunk_size=500):
+        """Читает записи таблицы по списку id запросами WHERE id IN (...) не длиннее chunk_size параметров
+
+        Returns:
+            dict: {id: запись} для найденных записей
+        """
+        rows = {}
+        with self._read() as conn:
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start : start + chunk_size]
+                for row in conn.execute(
+                    f"SELECT * FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                ):
+                    rows[row[0]] = row
+        return rows
+
+    @cached_property
+    def aio(self):
+        """Асинхронный интерфейс к этой базе данных для использования из обработчиков async def
+
+        Returns:
+            AsyncSimpleDB: обертка, выполняющая методы SimpleDB в потоках базы данных
+        """
+        return AsyncSimpleDB(self)
+
+    def pool_stats(self):
+        """Возвращает метрики пулов соединений
+
+        Returns:
+            dict: метрики пула чтения и пишущего соединения (ключи "read" и "write")
+        """
+        return {"read": self.read_pool.stats(), "write": self.pool.stats()}
+
+    def get_version(self, scope):
+        """Возвращает версию области данных, которая увеличивается при каждом ее изменении
+
+        Args:
+            scope (str): "topics" - список тем, "flashcards" - все карточки, "topic:<id>" - карточки темы
+
+        Returns:
+            int: текущая версия, 0 если область еще не изменялась
+        """
+        with self._read() as conn:
+            return self._version(conn, scope)
+
+    def _version(self, conn, scope):
+        row = conn.execute("SELECT version FROM resource_versions WHERE scope = ?", (scope,)).fetchone()
+        return row[0] if row else 0
+
+    def cache_stats(self):
+        """Возвращает счетчики кэша чтения
+
+        Returns:
+            dict: количество попаданий, промахов, вытеснений и текущий размер кэша
+        """
+        return self.cache.stats()
+
+    def create_tables(self):
+        """Функция для создания таблиц. Приводит схему базы к последней версии"""
+        with self.pool.connection() as conn:
+            retry_busy(lambda: migrate(conn), self.storage, self._count_busy_retry)
+
+    def flashcard_columns(self):
+        """Возвращает имена колонок карточек в порядке, в котором их возвращают iter_flashcards и get_*_page
+
+        Имена берутся из полей FlashcardRecord, по которым строится список колонок этих запросов, а не из
+        PRAGMA table_info: порядок колонок в таблице может измениться после пересоздания таблицы миграцией.
+
+        Returns:
+            list: список имен колонок
+        """
+        return list(FlashcardRecord._fields)
+
+    def backup(self, destination):
+        """Сохраняет согласованный снимок базы данных в файл с помощью online backup API SQLite
+
+        Снимок копируется за один шаг внутри одной транзакции чтения: в режиме WAL она не мешает
+        писателю, а страницы пишутся прямо в файл назначения, не накапливаясь в памяти.
+
+        Args:
+            destination (str): путь к файлу снимка. Существующий файл будет перезаписан
+        """
+        target = sqlite3.connect(destination)
+        try:
+            with self._read() as conn:
+                conn.backup(target)
+        finally:
+            target.close()
+
+    def storage_stats(self):
+        """Возвращает размер файла базы данных в страницах
+
+        Returns:
+            dict: размер страницы в байтах, количество страниц, количество свободных страниц и режим auto_vacuum
+                (0 - выключен, 1 - полный, 2 - инкрементальный)
+        """
+        with self._read() as conn:
+            return {
+                name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("page_size", "page_count", "freelist_count", "auto_vacuum")
+            }
+
+    def compact(self, max_pages=None, step_pages=256):
+        """Возвращает свободные страницы файлу базы данных через PRAGMA incremental_vacuum
+
+        Страницы возвращаются шагами по step_pages, каждый шаг - отдельной короткой записью, поэтому
+        сжатие не задерживает другие записи надолго, а читатели в режиме WAL не ждут его вовсе.
+        Работает только в режиме auto_vacuum = INCREMENTAL, в котором создаются новые базы. Старую базу
+        можно перевести в этот режим методом vacuum.
+
+        Args:
+            max_pages (int, optional): сколько страниц вернуть не больше чем. По умолчанию все свободные
+            step_pages (int): сколько страниц возвращать за один шаг
+
+        Returns:
+            int: количество возвращенных страниц
+        """
+        if self.storage_stats()["auto_vacuum"] != 2:
+            return 0
+        freed = 0
+        while max_pages is None or freed < max_pages:
+            step = step_pages if max_pages is None else min(step_pages, max_pages - freed)
+            with self._write() as conn:
+                before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if before:
+                    conn.execute(f"PRAGMA incremental_vacuum({step})").fetchall()
+                    step_freed = before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not before or not step_freed:
+                break
+            freed += step_freed
+        if freed:
+            # Файл базы укорачивается, когда освобожденные страницы переносятся из WAL
+            with self.pool.connection() as conn:
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        return freed
+
+    def vacuum(self):
+        """Полностью перестраивает файл базы данных и включает инкрементальное освобождение места
+
+        В отличие от compact, блокирует запись на все время перестройки, поэтому предназначен для
+        разового перевода старых баз в режим auto_vacuum = INCREMENTAL.
+        """
+        with self.pool.connection() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
 
     def close(self):
         """Функция для закрытия базы данных"""
-        self.conn.close()
+        if self.compactor is not None:
+            self.compactor.close()
+        if "aio" in self.__dict__:
+            self.aio.close()
+        if self.group_commit is not None:
+            self.group_commit.close()
+        self.read_pool.close()
+        self.pool.close()
 
     # Функции для работы с темами карточек
     def get_all_topics(self):
         """Функция, возвращающая список тем
 
         Returns:
-            object : список тем из файла
+            list[TopicRecord]: список тем из файла
+        """
+        with self._read() as conn:
+            return fetch_records(conn, _TOPIC_ROW, f"SELECT {_TOPIC_COLUMNS} FROM topics")
+
+    def get_topics_page(self, after=None, limit=100):
+        """Функция, возвращающая страницу тем по курсору (keyset-пагинация по id)
+
+        Args:
+            after (int, optional): id последней темы предыдущей страницы. Defaults to None.
+            limit (int, optional): максимальное количество тем на странице. Defaults to 100.
+
+        Returns:
+            list[TopicRecord]: список тем с id больше after, упорядоченный по id
         """
-        self.cursor.execute("SELECT * FROM topics")
-        return self.cursor.fetchall()
+        with self._read() as conn:
+            return fetch_records(
+                conn,
+                _TOPIC_ROW,
+                f"SELECT {_TOPIC_COLUMNS} FROM topics WHERE id > ? ORDER BY id LIMIT ?",
+                (after or 0, limit),
+            )
+
+    def iter_topics(self, batch_size=500, after=None):
+        """Генератор, лениво перебирающий все темы страницами
+
+        Соединение берется из пула только на время чтения одной страницы, поэтому генератор
+        можно долго не дочитывать, не удерживая соединение и транзакцию чтения. В памяти
+        одновременно находится не больше batch_size записей.
+
+        Args:
+            batch_size (int, optional): количество тем, читаемых за один запрос. Defaults to 500.
+            after (int, optional): начать с темы, следующей за этим id. Defaults to None.
+
+        Yields:
+            TopicRecord: запись темы
+        """
+        while True:
+            page = self.get_topics_page(after, batch_size)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = page[-1][0]
 
     def get_topic(self, topic_id):
         """Функция, которая возвращает тему с заданным topic_id из таблицы topics
@@ -66,8 +532,26 @@ class SimpleDB:
         Returns:
             object | None: кортеж с записью темы
         """
-        self.cursor.execute("SELECT * FROM topics WHERE id = ?", (topic_id,))
-        return self.cursor.fetchone()
+        return self._cached(("topic", topic_id), lambda: self._fetch_topic(topic_id))
+
+    def _fetch_topic(self, topic_id):
+        with self._read() as conn:
+            return conn.execute("SELECT * FROM topics WHERE id = ?", (topic_id,)).fetchone()
+
+    def get_topics_by_ids(self, topic_ids, chunk_size=500):
+        """Возвращает темы с заданными id
+
+        Темы, уже лежащие в кэше, берутся из него, остальные читаются запросами WHERE id IN (...)
+        по chunk_size id, чтобы не превысить ограничение SQLite на количество параметров.
+
+        Args:
+            topic_ids (list): id тем. Повторы допускаются
+            chunk_size (int, optional): сколько id передавать в одном запросе. Defaults to 500.
+
+        Returns:
+            dict: {id: запись темы} для найденных тем
+        """
+        return self._cached_many("topic", topic_ids, lambda ids: self._fetch_by_ids("topics", ids, chunk_size))
 
     def get_topic_by_name(self, name):
         """Функция, которая возвращает тему с заданным именем из таблицы topics
@@ -78,9 +562,10 @@ class SimpleDB:
         Returns:
             object | None: кортеж с записью темы, если найдена, иначе None
         """
-        self.cursor.execute("SELECT * FROM topics WHERE name = ?", (name,))
-        return self.cursor.fetchone()
+        with self._read() as conn:
+            return conn.execute("SELECT * FROM topics WHERE name = ?", (name,)).fetchone()
 
+    @batched_write
     def create_topic(self, name, description=None):
         """Функция, которая создает новую тему в таблице topics
         Если тема с таким именем уже существует, возвращает существующую тему.
@@ -91,33 +576,39 @@ class SimpleDB:
         Returns:
             object: cозданная тема
         """
-        check_topic = self.get_topic_by_name(name)
-        if check_topic:
-            return check_topic
-
-        now = datetime.now().isoformat()
-        self.cursor.execute(
-            """
-            INSERT INTO topics(name, description, created_at, updated_at)
-            VALUES(?, ?, ?, ?)
-            """,
-            (name, description, now, now),
-        )
-        self.conn.commit()
-        return self.get_topic(self.cursor.lastrowid)
+        now = to_timestamp(datetime.now())
+        with self._write() as conn:
+            new_topic = conn.execute(
+                """
+                INSERT INTO topics(name, description, created_at, updated_at)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(name) DO NOTHING
+                RETURNING *
+                """,
+                (name, description, now, now),
+            ).fetchone()
+            if new_topic:
+                return new_topic
+            return self.get_topic_by_name(name)
 
-    def update_topic(self, topic_id, name=None, description=None):
+    @batched_write
+    def update_topic(self, topic_id, name=None, description=None, precondition=None):
         """Функция для обновления существующей темы
 
         Args:
             topic_id (int): id темы
             name (str, optional): Название темы. Defaults to None.
             description (str, optional): Описание темы. Defaults to None.
+            precondition (callable, optional): проверка текущей записи темы внутри транзакции.
+                Если она возвращает False, тема не обновляется. Defaults to None.
+
+        Raises:
+            PreconditionFailed: если текущая запись не прошла проверку precondition
 
         Returns:
             object: возвращает обновленный обьект с информацией о теме
         """
-        now = datetime.now().isoformat()
+        now = to_timestamp(datetime.now())
         update_fields = []
         params = []
         if name:
@@ -133,13 +624,19 @@ class SimpleDB:
 
         if update_fields:
             query = f"UPDATE topics SET {', '.join(update_fields)} WHERE id = ?"
-            self.cursor.execute(query, params)
-            self.conn.commit()
-            return self.get_topic(topic_id)
+            with self._write() as conn:
+                if precondition is not None:
+                    current = self.get_topic(topic_id)
+                    if current and not precondition(current):
+                        raise PreconditionFailed(f"Тема {topic_id} была изменена")
+                conn.execute(query, params)
+                self._invalidate(("topic", topic_id))
+                return self.get_topic(topic_id)
         return None
 
+    @batched_write
     def delete_topic(self, topic_id):
-        """Удаляет тему по id
+        """Удаляет тему по id вместе со всеми ее карточками одной транзакцией
 
         Args:
             topic_id (int): номер темы
@@ -147,20 +644,72 @@ class SimpleDB:
         Returns:
             boolean: возвращает true, если тема была удаленаб false в противоположном случае
         """
-        self.cursor.execute("DELETE FROM topics WHERE id = ?", (topic_id,))
-        self.conn.commit()
+        with self._write() as conn:
+            flashcard_ids = [
+                row[0] for row in conn.execute("SELECT id FROM flashcards WHERE topic_id = ?", (topic_id,))
+            ]
+            # Карточки темы удаляются тем же запросом через ON DELETE CASCADE
+            cursor = conn.execute("DELETE FROM topics WHERE id = ?", (topic_id,))
+            self._invalidate(("topic", topic_id), *(("flashcard", i) for i in flashcard_ids))
         # информирование о том что тема была удалена
-        return self.cursor.rowcount > 0
+        return cursor.rowcount > 0
 
     # Функции для работы с карточками
     def get_all_flashcards(self):
         """Функция, возвращающая все существующие карточки
 
         Returns:
-            object: массив с информацией о каждой карточке
+            list[FlashcardRecord]: массив с информацией о каждой карточке
+        """
+        with self._read() as conn:
+            return fetch_records(conn, _FLASHCARD_ROW, f"SELECT {_FLASHCARD_COLUMNS} FROM flashcards")
+
+    def get_flashcards_page(self, after=None, limit=100, topic_id=None):
+        """Функция, возвращающая страницу карточек по курсору (keyset-пагинация по id)
+
+        Args:
+            after (int, optional): id последней карточки предыдущей страницы. Defaults to None.
+            limit (int, optional): максимальное количество карточек на странице. Defaults to 100.
+            topic_id (int, optional): вернуть карточки только этой темы. Defaults to None.
+
+        Returns:
+            list[FlashcardRecord]: список карточек с id больше after, упорядоченный по id
+        """
+        with self._read() as conn:
+            if topic_id is None:
+                return fetch_records(
+                    conn,
+                    _FLASHCARD_ROW,
+                    f"SELECT {_FLASHCARD_COLUMNS} FROM flashcards WHERE id > ? ORDER BY id LIMIT ?",
+                    (after or 0, limit),
+                )
+            return fetch_records(
+                conn,
+                _FLASHCARD_ROW,
+                f"SELECT {_FLASHCARD_COLUMNS} FROM flashcards WHERE topic_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (topic_id, after or 0, limit),
+            )
+
+    def iter_flashcards(self, batch_size=500, topic_id=None, after=None):
+        """Генератор, лениво перебирающий карточки страницами
+
+        Как и iter_topics, держит соединение только на время чтения страницы и хранит в памяти
+        не больше batch_size записей.
+
+        Args:
+            batch_size (int, optional): количество карточек, читаемых за один запрос. Defaults to 500.
+            topic_id (int, optional): перебирать карточки только этой темы. Defaults to None.
+            after (int, optional): начать с карточки, следующей за этим id. Defaults to None.
+
+        Yields:
+            FlashcardRecord: запись карточки
         """
-        self.cursor.execute("SELECT * FROM flashcards")
-        return self.cursor.fetchall()
+        while True:
+            page = self.get_flashcards_page(after, batch_size, topic_id)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = page[-1][0]
 
     def get_flashcard_by_id(self, flashcard_id):
         """Функция возращающая карточку по id
@@ -171,8 +720,28 @@ class SimpleDB:
         Returns:
             object: содержимое карточки
         """
-        self.cursor.execute("SELECT * FROM flashcards WHERE id = ?", (flashcard_id,))
-        return self.cursor.fetchone()
+        return self._cached(("flashcard", flashcard_id), lambda: self._fetch_flashcard(flashcard_id))
+
+    def _fetch_flashcard(self, flashcard_id):
+        with self._read() as conn:
+            return conn.execute("SELECT * FROM flashcards WHERE id = ?", (flashcard_id,)).fetchone()
+
+    def get_flashcards_by_ids(self, flashcard_ids, chunk_size=500):
+        """Возвращает карточки с заданными id
+
+        Карточки, уже лежащие в кэше, берутся из него, остальные читаются запросами WHERE id IN (...)
+        по chunk_size id, чтобы не превысить ограничение SQLite на количество параметров.
+
+        Args:
+            flashcard_ids (list): id карточек. Повторы допускаются
+            chunk_size (int, optional): сколько id передавать в одном запросе. Defaults to 500.
+
+        Returns:
+            dict: {id: запись карточки} для найденных карточек
+        """
+        return self._cached_many(
+            "flashcard", flashcard_ids, lambda ids: self._fetch_by_ids("flashcards", ids, chunk_size)
+        )
 
     def get_flashcard_by_question(self, flashcard_question):
         """Функция возращающая карточку по question
@@ -183,10 +752,11 @@ class SimpleDB:
         Returns:
             object: содержимое карточки
         """
-        self.cursor.execute("SELECT * FROM flashcards WHERE question = ?", (flashcard_question,))
-        return self.cursor.fetchone()
+        with self._read() as conn:
+            return conn.execute("SELECT * FROM flashcards WHERE question = ?", (flashcard_question,)).fetchone()
 
-    def create_flashcard(self, topic_id, question, answer, difficulty_level=1):
+    @batched_write
+    def create_flashcard(self, topic_id, question, answer, difficulty_level=1, max_similarity=None):
         """Функция создающая новую карточку
 
         Args:
@@ -194,28 +764,180 @@ class SimpleDB:
             question (int): вопрос
             answer (int): ответ на вопрос
             difficulty_level (int): уровень сложности карточки
+            max_similarity (float, optional): не создавать карточку, если в базе есть карточка с похожестью
+                текста не меньше этого значения (от 0 до 1). По умолчанию проверяется только совпадение вопроса
+
+        Raises:
+            NearDuplicate: если найдена слишком похожая карточка
 
         Returns:
             object: созданная карточка
         """
-        check_flashcard = self.get_flashcard_by_question(question)
-        if check_flashcard:
-            return check_flashcard
+        now = to_timestamp(datetime.now())
+        if max_similarity is not None:
+            # Индекс обновляется в отдельной транзакции, чтобы отклоненная карточка не откатывала его
+            self._refresh_similarity_index()
+        with self._write() as conn:
+            if max_similarity is not None and self.get_flashcard_by_question(question) is None:
+                self._sync_similarity_index(conn)
+                signature = card_signature(question, answer)
+                similar = self._rank_similar(conn, question, answer, signature, max_similarity, limit=1)
+                if similar:
+                    raise NearDuplicate(*similar[0])
+            new_flashcard = conn.execute(
+                """
+                INSERT INTO flashcards(
+                    topic_id, question, answer, difficulty_level, last_reviewed_at, created_at, updated_at, due_at
+                )
+                VALUES(?, ?, ?, ?, NULL, ?, ?, ?)
+                ON CONFLICT(question) DO NOTHING
+                RETURNING *
+                """,
+                (topic_id, question, answer, difficulty_level, now, now, now),
+            ).fetchone()
+            if new_flashcard:
+                return new_flashcard
+            return self.get_flashcard_by_question(question)
 
-        now = datetime.now().isoformat()
-        self.cursor.execute(
-            """
-                INSERT INTO flashcards(topic_id, question, answer, difficulty_level, last_reviewed_at, created_at, updated_at) VALUES(?, ?, ?, ?, NULL, ?, ?)
-            """,
-            (topic_id, question, answer, difficulty_level, now, now),
-        )
-        self.conn.commit()
-        return self.get_flashcard_by_id(self.cursor.lastrowid)
+    def create_flashcards_bulk(self, topic_id, flashcards, chunk_size=500, max_similarity=None):
+        """Функция, создающая много карточек одной темы за несколько транзакций
+
+        Карточки обрабатываются пачками по chunk_size: для каждой пачки одним запросом ищутся уже
+        существующие вопросы, новые карточки вставляются через executemany, и пачка фиксируется
+        одной транзакцией.
+
+        Args:
+            topic_id (int): id темы карточек
+            flashcards (list): список кортежей (question, answer, difficulty_level)
+            chunk_size (int, optional): количество карточек в одной транзакции. Defaults to 500.
+            max_similarity (float, optional): не создавать карточки, похожесть текста которых на карточку
+                в базе или ранее в загружаемых данных не меньше этого значения (от 0 до 1)
+
+        Returns:
+            list: для каждой входной карточки кортеж (статус, id карточки). Статус "created" - карточка
+                создана, "exists" - карточка с таким вопросом уже была в базе, "duplicate" - вопрос
+                повторяется внутри загружаемых данных, "similar" - найдена похожая карточка, id которой
+                возвращается
+        """
+        results = []
+        for start in range(0, len(flashcards), chunk_size):
+            results.extend(
+                self._create_flashcards_chunk(topic_id, flashcards[start : start + chunk_size], max_similarity)
+            )
+        return results
+
+    def _create_flashcards_chunk(self, topic_id, flashcards, max_similarity=None):
+        questions = list({flashcard[0] for flashcard in flashcards})
+        placeholders = ", ".join("?" * len(questions))
+        now = to_timestamp(datetime.now())
+        with self._write() as conn:
+            if max_similarity is not None:
+                # Карточки предыдущих пачек попадают в индекс здесь, в той же транзакции
+                self._sync_similarity_index(conn)
+            existing = dict(
+                conn.execute(
+                    f"SELECT question, id FROM flashcards WHERE question IN ({placeholders})", questions
+                ).fetchall()
+            )
+            statuses = []
+            new_rows = {}
+            signatures = {}
+            # Вопрос отклоненной карточки -> id похожей карточки в базе или вопрос похожей карточки из этой пачки
+            similar_to = {}
+            chunk_index = {}
+            for question, answer, difficulty_level in flashcards:
+                if question in existing:
+                    statuses.append("exists")
+                elif question in similar_to:
+                    statuses.append("similar")
+                elif question in new_rows:
+                    statuses.append("duplicate")
+                else:
+                    if max_similarity is not None:
+                        signatures[question] = signature = card_signature(question, answer)
+                        match = self._find_similar_in_chunk(
+                            conn, question, answer, signatures, max_similarity, chunk_index, new_rows
+                        )
+                        if match is not None:
+                            similar_to[question] = match
+                            statuses.append("similar")
+                            continue
+                        for bucket in lsh_buckets(signature):
+                            chunk_index.setdefault(bucket, []).append(question)
+                    statuses.append("created")
+                    new_rows[question] = (topic_id, question, answer, difficulty_level, now, now, now)
+            if new_rows:
+                conn.executemany(
+                    """
+                    INSERT INTO flashcards(
+                        topic_id, question, answer, difficulty_level, last_reviewed_at, created_at, updated_at, due_at
+                    )
+                    VALUES(?, ?, ?, ?, NULL, ?, ?, ?)
+                    """,
+                    list(new_rows.values()),
+                )
+                created = list(new_rows)
+                existing.update(
+                    conn.execute(
+                        f"SELECT question, id FROM flashcards WHERE question IN ({', '.join('?' * len(created))})",
+                        created,
+                    ).fetchall()
+                )
+        for question, match in similar_to.items():
+            existing[question] = existing[match] if isinstance(match, str) else match
+        return [(status, existing[flashcard[0]]) for status, flashcard in zip(statuses, flashcards)]
+
+    def _find_similar_in_chunk(self, conn, question, answer, signatures, threshold, chunk_index, new_rows):
+        """Ищет карточку, похожую на загружаемую, в базе и среди уже принятых карточек той же пачки
+
+        Returns:
+            int | str | None: id похожей карточки в базе, вопрос похожей карточки пачки или None
+        """
+        signature = signatures[question]
+        similar = self._rank_similar(conn, question, answer, signature, threshold, limit=1)
+        if similar:
+            return similar[0][0][0]
+        candidates = {other for bucket in lsh_buckets(signature) for other in chunk_index.get(bucket, ())}
+        target = shingles(question, answer)
+        for other in sorted(candidates):
+            if estimate_similarity(signature, signatures[other]) < threshold - SIGNATURE_SLACK:
+                continue
+            if jaccard(target, shingles(other, new_rows[other][2])) >= threshold:
+                return other
+        return None
 
+    @batched_write
     def update_flashcard(
-        self, flashcard_id, topic_id=None, question=None, answer=None, difficulty_level=None, last_reviewed_at=None
+        self,
+        flashcard_id,
+        topic_id=None,
+        question=None,
+        answer=None,
+        difficulty_level=None,
+        last_reviewed_at=None,
+        precondition=None,
     ):
-        now = datetime.now().isoformat()
+        """Функция для обновления существующей карточки
+
+        Args:
+            flashcard_id (int): id карточки
+            topic_id (int, optional): новая тема карточки. Defaults to None.
+            question (str, optional): новый вопрос. Defaults to None.
+            answer (str, optional): новый ответ. Defaults to None.
+            difficulty_level (int, optional): новый уровень сложности. Defaults to None.
+            last_reviewed_at (datetime, optional): время последнего повторения. Время с часовым поясом
+                сохраняется как локальное время без пояса. Defaults to None.
+            precondition (callable, optional): проверка текущей записи карточки внутри транзакции.
+                Если она возвращает False, карточка не обновляется. Defaults to None.
+
+        Raises:
+            PreconditionFailed: если текущая запись не прошла проверку precondition
+            TopicNotFound: если темы topic_id не существует
+
+        Returns:
+            object | None: обновленная карточка или None, если карточка не найдена
+        """
+        now = to_timestamp(datetime.now())
         update_fields = []
         params = []
 
@@ -237,10 +959,7 @@ class SimpleDB:
 
         if last_reviewed_at is not None:
             update_fields.append("last_reviewed_at = ?")
-            if isinstance(last_reviewed_at, datetime):
-                params.append(last_reviewed_at.isoformat())
-            else:
-                params.append(last_reviewed_at)
+            params.append(to_timestamp(last_reviewed_at))
 
         update_fields.append("updated_at = ?")
         params.append(now)
@@ -248,23 +967,386 @@ class SimpleDB:
         if update_fields:
             query = f"UPDATE flashcards SET {', '.join(update_fields)} WHERE id = ?"
             params.append(flashcard_id)
-            self.cursor.execute(query, params)
-            self.conn.commit()
-            return self.get_flashcard_by_id(flashcard_id)
+            with self._write() as conn:
+                previous = self.get_flashcard_by_id(flashcard_id)
+                if not previous:
+                    return None
+                if precondition is not None and not precondition(previous):
+                    raise PreconditionFailed(f"Карточка {flashcard_id} была изменена")
+                # Тема проверяется в той же транзакции: иначе внешний ключ отклонит изменение как конфликт
+                if topic_id is not None and not self._topic_exists(conn, topic_id):
+                    raise TopicNotFound(f"Тема {topic_id} не найдена")
+                conn.execute(query, params)
+                self._invalidate(("flashcard", flashcard_id))
+                return self.get_flashcard_by_id(flashcard_id)
         return None
 
+    def _topic_exists(self, conn, topic_id):
+        return conn.execute("SELECT 1 FROM topics WHERE id = ?", (topic_id,)).fetchone() is not None
+
     def get_flashcards_by_topic(self, topic_id):
         """Возвращает все карточки в определенной теме
 
+        Список кэшируется по версии карточек темы. Версию увеличивают триггеры базы, поэтому запись
+        из другого соединения или процесса тоже приводит к чтению нового списка. Список сохраняется
+        в кэш, только если он прочитан в одной транзакции с той же версией, по которой построен ключ.
+
         Args:
             topic_id (int): номер темы
 
         Returns:
             object: массив с информацией о каждой карточке по определенной теме
         """
-        self.cursor.execute("SELECT * FROM flashcards WHERE topic_id = ?", (topic_id,))
-        return self.cursor.fetchall()
+        version = self.get_version(f"topic:{topic_id}")
+        _, flashcards = self._cached(
+            ("topic_flashcards", topic_id, version),
+            lambda: self._fetch_flashcards_by_topic(topic_id),
+            cacheable=lambda loaded: loaded[0] == version and len(loaded[1]) <= MAX_CACHED_LIST_SIZE,
+        )
+        return list(flashcards)
+
+    def _fetch_flashcards_by_topic(self, topic_id):
+        """Читает карточки темы вместе с версией, к которой они относятся"""
+        with self._snapshot() as conn:
+            version = self._version(conn, f"topic:{topic_id}")
+            flashcards = fetch_records(
+                conn, _FLASHCARD_ROW, f"SELECT {_FLASHCARD_COLUMNS} FROM flashcards WHERE topic_id = ?", (topic_id,)
+            )
+        return version, tuple(flashcards)
+
+    def search_flashcards(self, query, topic_id=None, limit=20, offset=0):
+        """Полнотекстовый поиск карточек по вопросу и ответу
+
+        Каждое слово запроса ищется как отдельная фраза, найденные карточки должны содержать все слова.
+        Результаты упорядочены по релевантности bm25.
+
+        Args:
+            query (str): поисковый запрос
+            topic_id (int, optional): искать только в этой теме. Defaults to None.
+            limit (int, optional): количество результатов. Defaults to 20.
+            offset (int, optional): сколько лучших результатов пропустить. Defaults to 0.
+
+        Returns:
+            object: массив записей карточек, к каждой из которых в конце добавлены релевантность
+                (чем меньше, тем лучше) и фрагмент текста с выделенными совпадениями
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = """
+            SELECT flashcards.*, bm25(flashcards_fts) AS rank,
+                snippet(flashcards_fts, -1, '<mark>', '</mark>', '…', 16) AS snippet
+            FROM flashcards_fts
+            JOIN flashcards ON flashcards.id = flashcards_fts.rowid
+            WHERE flashcards_fts MATCH ?
+        """
+        params = [match]
+        if topic_id is not None:
+            sql += " AND flashcards.topic_id = ?"
+            params.append(topic_id)
+        sql += " ORDER BY rank LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._read() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _refresh_similarity_index(self):
+        """Обновляет индекс похожих карточек в отдельной транзакции записи, если он отстал от журнала changes
+
+        Пока индекс актуален, транзакция записи не открывается: проверка читает две строки.
+        """
+        with self._snapshot() as conn:
+            if self._similarity_index_behind(conn) is None:
+                return
+        with self._write() as conn:
+            self._sync_similarity_index(conn)
 
+    def _similarity_index_behind(self, conn):
+        """Возвращает пару (проиндексированная ревизия, последняя ревизия журнала) или None, если индекс актуален"""
+        indexed = self._version(conn, SIMILARITY_INDEX_SCOPE)
+        latest = conn.execute("SELECT COALESCE(MAX(rev), 0) FROM changes").fetchone()[0]
+        return (indexed, latest) if latest > indexed else None
+
+    def _sync_similarity_index(self, conn):
+        """Дописывает в индекс LSH карточки, созданные или измененные после последнего обновления индекса
+
+        Индекс нужен только поиску похожих карточек, поэтому запись карточки его не обновляет. Перед поиском
+        сигнатуры вычисляются для карточек из журнала changes с ревизией больше запомненной, так что стоимость
+        зависит от количества изменений с прошлого поиска, а не от размера базы.
+
+        Args:
+            conn (sqlite3.Connection): пишущее соединение внутри транзакции
+        """
+        behind = self._similarity_index_behind(conn)
+        if behind is None:
+            return
+        indexed, latest = behind
+        cards = conn.execute(
+            """
+            SELECT flashcards.id, flashcards.question, flashcards.answer
+            FROM changes
+            JOIN flashcards ON flashcards.id = changes.entity_id
+            WHERE changes.rev > ? AND changes.entity = 'flashcard' AND changes.deleted = 0
+            """,
+            (indexed,),
+        ).fetchall()
+        if cards:
+            self._index_similarity(
+                conn, [(card_id, card_signature(question, answer)) for card_id, question, answer in cards], replace=True
+            )
+        conn.execute(
+            "INSERT INTO resource_versions(scope, version) VALUES (?, ?) "
+            "ON CONFLICT(scope) DO UPDATE SET version = excluded.version",
+            (SIMILARITY_INDEX_SCOPE, latest),
+        )
+
+    def _index_similarity(self, conn, entries, replace=False):
+        """Записывает сигнатуры MinHash и корзины LSH карточек внутри текущей транзакции записи
+
+        Args:
+            conn (sqlite3.Connection): пишущее соединение
+            entries (list): пары (id карточки, сигнатура из similarity.card_signature)
+            replace (bool): удалить прежние корзины карточек (при изменении текста)
+        """
+        if replace:
+            conn.executemany("DELETE FROM flashcard_lsh WHERE flashcard_id = ?", [(entry[0],) for entry in entries])
+        conn.executemany(
+            "INSERT OR REPLACE INTO flashcard_minhash(flashcard_id, signature) VALUES (?, ?)",
+            [(flashcard_id, pack_signature(signature)) for flashcard_id, signature in entries],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO flashcard_lsh(bucket, flashcard_id) VALUES (?, ?)",
+            [(bucket, flashcard_id) for flashcard_id, signature in entries for bucket in lsh_buckets(signature)],
+        )
+
+    def _rank_similar(self, conn, question, answer, signature, threshold, limit, exclude_id=None):
+        """Находит карточки, похожие на текст, среди карточек с общими корзинами LSH
+
+        Кандидаты сначала отсеиваются по оценке похожести из сигнатур, и только оставшиеся читаются
+        целиком и сравниваются точно.
+
+        Returns:
+            list: пары (запись карточки, похожесть) по убыванию похожести
+        """
+        buckets = lsh_buckets(signature)
+        candidates = conn.execute(
+            f"""
+            SELECT candidates.flashcard_id, flashcard_minhash.signature
+            FROM (
+                SELECT flashcard_id, COUNT(*) AS shared FROM flashcard_lsh
+                WHERE bucket IN ({", ".join("?" * len(buckets))}) AND flashcard_id IS NOT ?
+                GROUP BY flashcard_id
+                ORDER BY shared DESC
+                LIMIT ?
+            ) AS candidates
+            JOIN flashcard_minhash ON flashcard_minhash.flashcard_id = candidates.flashcard_id
+            """,
+            (*buckets, exclude_id, MAX_SIMILAR_CANDIDATES),
+        ).fetchall()
+        ids = [
+            flashcard_id
+            for flashcard_id, blob in candidates
+            if estimate_similarity(signature, unpack_signature(blob)) >= threshold - SIGNATURE_SLACK
+        ]
+        if not ids:
+            return []
+        target = shingles(question, answer)
+        ranked = []
+        for flashcard in conn.execute(f"SELECT * FROM flashcards WHERE id IN ({', '.join('?' * len(ids))})", ids):
+            similarity = jaccard(target, shingles(flashcard[2], flashcard[3]))
+            if similarity >= threshold:
+                ranked.append((flashcard, similarity))
+        ranked.sort(key=lambda pair: (-pair[1], pair[0][0]))
+        return ranked[:limit]
+
+    def find_similar_flashcards(self, question, answer, threshold=0.5, limit=10):
+        """Ищет карточки, похожие на текст, по индексу LSH без сравнения со всеми карточками
+
+        Похожесть - коэффициент Жаккара множеств трехсимвольных шинглов вопроса и ответа. Индекс находит
+        карточки с похожестью от 0.5 с вероятностью не ниже 93%, менее похожие могут быть пропущены.
+
+        Args:
+            question (str): вопрос
+            answer (str): ответ
+            threshold (float, optional): минимальная похожесть от 0 до 1. Defaults to 0.5.
+            limit (int, optional): максимальное количество результатов. Defaults to 10.
+
+        Returns:
+            list: пары (запись карточки, похожесть) по убыванию похожести
+        """
+        self._refresh_similarity_index()
+        with self._read() as conn:
+            return self._rank_similar(conn, question, answer, card_signature(question, answer), threshold, limit)
+
+    def get_similar_flashcards(self, flashcard_id, threshold=0.5, limit=10):
+        """Ищет карточки, похожие на карточку с указанным id (см. find_similar_flashcards)
+
+        Args:
+            flashcard_id (int): id карточки
+            threshold (float, optional): минимальная похожесть от 0 до 1. Defaults to 0.5.
+            limit (int, optional): максимальное количество результатов. Defaults to 10.
+
+        Returns:
+            list | None: пары (запись карточки, похожесть) или None, если карточка не найдена
+        """
+        self._refresh_similarity_index()
+        with self._read() as conn:
+            flashcard = conn.execute("SELECT * FROM flashcards WHERE id = ?", (flashcard_id,)).fetchone()
+            if flashcard is None:
+                return None
+            row = conn.execute(
+                "SELECT signature FROM flashcard_minhash WHERE flashcard_id = ?", (flashcard_id,)
+            ).fetchone()
+            signature = unpack_signature(row[0]) if row else card_signature(flashcard[2], flashcard[3])
+            return self._rank_similar(conn, flashcard[2], flashcard[3], signature, threshold, limit, flashcard_id)
+
+    def get_topics_stats(self, topic_ids, now=None, chunk_size=500):
+        """Возвращает сводную статистику карточек для нескольких тем
+
+        Количество карточек, распределение по сложности и время последнего повторения читаются из
+        счетчиков topic_stats и topic_difficulty, которые триггеры обновляют при каждой записи, поэтому
+        их стоимость не зависит от размера темы. Количество карточек к повторению зависит от текущего
+        времени и считается по индексу (topic_id, due_at) без чтения самих карточек.
+
+        Args:
+            topic_ids (list): id тем
+            now (datetime, optional): момент, относительно которого считаются карточки к повторению
+            chunk_size (int, optional): сколько тем запрашивать одним запросом. Defaults to 500.
+
+        Returns:
+            dict: для каждой найденной темы словарь с количеством карточек (card_count), средней сложностью
+                (average_difficulty), распределением по сложности (difficulty_histogram), количеством карточек
+                к повторению (due_count), просроченных с прошлых дней (overdue_count) и временем последнего
+                повторения (last_reviewed_at)
+        """
+        now = to_local_naive(now or datetime.now())
+        due_before = now
+        overdue_before = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        stats = {}
+        with self._read() as conn:
+            for start in range(0, len(topic_ids), chunk_size):
+                chunk = list(topic_ids[start : start + chunk_size])
+                placeholders = ", ".join("?" * len(chunk))
+                for topic_id, card_count, last_reviewed_at in conn.execute(
+                    "SELECT topic_id, card_count, last_reviewed_at FROM topic_stats "
+                    f"WHERE topic_id IN ({placeholders})",
+                    chunk,
+                ):
+                    stats[topic_id] = {
+                        **empty_topic_stats(topic_id),
+                        "card_count": card_count,
+                        "last_reviewed_at": last_reviewed_at,
+                    }
+                for topic_id, difficulty_level, card_count in conn.execute(
+                    "SELECT topic_id, difficulty_level, card_count FROM topic_difficulty "
+                    f"WHERE topic_id IN ({placeholders}) ORDER BY topic_id, difficulty_level",
+                    chunk,
+                ):
+                    stats[topic_id]["difficulty_histogram"].append(
+                        {"difficulty_level": difficulty_level, "card_count": card_count}
+                    )
+                for topic_id, due_count, overdue_count in conn.execute(
+                    "SELECT topic_id, COUNT(*), SUM(due_at < ?) FROM flashcards "
+                    f"WHERE topic_id IN ({placeholders}) AND due_at <= ? GROUP BY topic_id",
+                    [to_timestamp(overdue_before), *chunk, to_timestamp(due_before)],
+                ):
+                    stats[topic_id]["due_count"] = due_count
+                    stats[topic_id]["overdue_count"] = overdue_count
+        for topic_stats in stats.values():
+            histogram = topic_stats["difficulty_histogram"]
+            rated = sum(bucket["card_count"] for bucket in histogram)
+            if rated:
+                total = sum(bucket["difficulty_level"] * bucket["card_count"] for bucket in histogram)
+                topic_stats["average_difficulty"] = total / rated
+        return stats
+
+    def get_topic_stats(self, topic_id, now=None):
+        """Возвращает сводную статистику карточек темы (см. get_topics_stats)
+
+        Args:
+            topic_id (int): id темы
+            now (datetime, optional): момент, относительно которого считаются карточки к повторению
+
+        Returns:
+            dict | None: статистика темы или None, если тема не найдена
+        """
+        return self.get_topics_stats([topic_id], now).get(topic_id)
+
+    def get_due_flashcards(self, topic_id, limit=20, now=None):
+        """Возвращает карточки темы, которые пора повторить, начиная с самых просроченных
+
+        Запрос выполняется поиском по диапазону индекса (topic_id, due_at), поэтому его стоимость
+        зависит только от limit, а не от количества карточек в теме.
+
+        Args:
+            topic_id (int): номер темы
+            limit (int, optional): максимальное количество карточек. Defaults to 20.
+            now (datetime, optional): момент, на который считаются просроченные карточки. По умолчанию сейчас
+
+        Returns:
+            object: массив карточек, упорядоченный по времени повторения
+        """
+        now = to_local_naive(now or datetime.now())
+        with self._read() as conn:
+            return conn.execute(
+                "SELECT * FROM flashcards WHERE topic_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?",
+                (topic_id, to_timestamp(now), limit),
+            ).fetchall()
+
+    @batched_write
+    def review_flashcard(self, flashcard_id, grade, reviewed_at=None):
+        """Записывает результат повторения карточки и переносит ее следующее повторение
+
+        Args:
+            flashcard_id (int): id карточки
+            grade (int): оценка ответа от 0 до 5
+            reviewed_at (datetime, optional): время повторения. По умолчанию сейчас
+
+        Returns:
+            object | None: обновленная карточка или None, если карточка не найдена
+        """
+        reviewed_at = to_local_naive(reviewed_at or datetime.now())
+        with self._write() as conn:
+            current = conn.execute(
+                "SELECT ease_factor, interval_days, repetitions FROM flashcards WHERE id = ?", (flashcard_id,)
+            ).fetchone()
+            if not current:
+                return None
+            state, due_at = schedule(ReviewState(*current), grade, reviewed_at)
+            flashcard = conn.execute(
+                """
+                UPDATE flashcards
+                SET last_reviewed_at = ?, due_at = ?, ease_factor = ?, interval_days = ?, repetitions = ?,
+                    updated_at = ?
+                WHERE id = ?
+                RETURNING *
+                """,
+                (
+                    to_timestamp(reviewed_at),
+                    to_timestamp(due_at),
+                    state.ease_factor,
+                    state.interval_days,
+                    state.repetitions,
+                    to_timestamp(datetime.now()),
+                    flashcard_id,
+                ),
+            ).fetchone()
+            self._invalidate(("flashcard", flashcard_id))
+            return flashcard
+
+    @batched_write
+    def review_flashcards(self, reviews):
+        """Записывает результаты нескольких повторений одной транзакцией
+
+        Args:
+            reviews (iterable): кортежи (flashcard_id, grade, reviewed_at), как аргументы review_flashcard
+
+        Returns:
+            list: обновленные карточки в порядке reviews, None для ненайденных
+        """
+        with self._write():
+            return [self.review_flashcard(*review) for review in reviews]
+
+    @batched_write
     def delete_flashcard(self, flashcard_id):
         """Удаляет карточку по id
 
@@ -274,9 +1356,47 @@ class SimpleDB:
         Returns:
             boolean: возвращает true если карточка была удалена, false в противоположном случае
         """
-        self.cursor.execute("DELETE FROM flashcards WHERE id = ?", (flashcard_id,))
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        with self._write() as conn:
+            deleted = conn.execute("DELETE FROM flashcards WHERE id = ? RETURNING topic_id", (flashcard_id,)).fetchone()
+            if deleted:
+                self._invalidate(("flashcard", flashcard_id))
+        return deleted is not None
+
+    def get_changes(self, since=0, limit=500):
+        """Возвращает темы и карточки, изменившиеся после указанной ревизии, в порядке изменения
+
+        Журнал хранит одну строку на запись, а поиск идет по первичному ключу rev, поэтому стоимость
+        запроса зависит только от количества изменений после since, а не от размера базы. Журнал и сами
+        записи читаются одним запросом, то есть из одного согласованного снимка базы.
+
+        Args:
+            since (int, optional): ревизия, после которой нужны изменения. 0 - все записи. Defaults to 0.
+            limit (int, optional): максимальное количество изменений. Defaults to 500.
+
+        Returns:
+            list: кортежи (rev, entity, entity_id, deleted, row), где entity - "topic" или "flashcard",
+                а row - текущая строка записи или None для удаленной
+        """
+        with self._read() as conn:
+            topic_width = len(conn.execute("SELECT * FROM topics LIMIT 0").description)
+            rows = conn.execute(
+                """
+                SELECT changes.rev, changes.entity, changes.entity_id, changes.deleted, topics.*, flashcards.*
+                FROM changes
+                LEFT JOIN topics ON changes.entity = 'topic' AND topics.id = changes.entity_id
+                LEFT JOIN flashcards ON changes.entity = 'flashcard' AND flashcards.id = changes.entity_id
+                WHERE changes.rev > ?
+                ORDER BY changes.rev
+                LIMIT ?
+            """,
+                (since, limit),
+            ).fetchall()
+
+        changes = []
+        for rev, entity, entity_id, deleted, *columns in rows:
+            row = columns[:topic_width] if entity == "topic" else columns[topic_width:]
+            changes.append((rev, entity, entity_id, bool(deleted), None if deleted else tuple(row)))
+        return changes
 
 
 if __name__ == "__main__":
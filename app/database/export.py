@@ -0,0 +1,124 @@
+"""Потоковый экспорт карточек в JSON Lines и CSV и снимки базы данных.
+
+Экспорт читает карточки страницами через SimpleDB.iter_flashcards, поэтому расход памяти не зависит
+от размера базы. Модуль можно запустить из корня репозитория как утилиту командной строки:
+
+    python -m app.database.export export --db flashcards.db --format csv --topic 1 --output deck.csv
+    python -m app.database.export snapshot --db flashcards.db --output backup.db
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+
+from .database import SimpleDB
+from .timestamps import json_default
+
+
+EXPORT_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_jsonl(db, topic_id=None, batch_size=500):
+    """Генератор строк JSON Lines: по одной карточке на строку
+
+    Args:
+        db (SimpleDB): база данных
+        topic_id (int, optional): экспортировать только карточки этой темы
+        batch_size (int, optional): количество карточек, читаемых за один запрос
+
+    Yields:
+        str: строки JSON Lines очередных batch_size карточек, каждая - JSON-объект карточки с переводом строки
+    """
+    lines = []
+    for row in db.iter_flashcards(batch_size=batch_size, topic_id=topic_id):
+        # Имена полей берутся из самой записи, поэтому всегда соответствуют значениям
+        lines.append(json.dumps(row._asdict(), ensure_ascii=False, default=json_default) + "\n")
+        # Порции по batch_size строк, как и в CSV: каждая порция - отдельная часть ответа и вызов сжатия
+        if len(lines) == batch_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def export_csv(db, topic_id=None, batch_size=500):
+    """Генератор строк CSV с заголовком из имен колонок
+
+    Args:
+        db (SimpleDB): база данных
+        topic_id (int, optional): экспортировать только карточки этой темы
+        batch_size (int, optional): количество карточек, читаемых за один запрос
+
+    Yields:
+        str: очередная порция CSV
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(db.flashcard_columns())
+    for index, row in enumerate(db.iter_flashcards(batch_size=batch_size, topic_id=topic_id), start=1):
+        # str(datetime) разделяет дату и время пробелом, а экспорт всегда выдавал формат isoformat
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        if index % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export(db, export_format, topic_id=None):
+    """Возвращает генератор экспорта в указанном формате
+
+    Args:
+        db (SimpleDB): база данных
+        export_format (str): "jsonl" или "csv"
+        topic_id (int, optional): экспортировать только карточки этой темы
+
+    Returns:
+        Iterator[str]: генератор порций экспорта
+    """
+    if export_format == "jsonl":
+        return export_jsonl(db, topic_id)
+    if export_format == "csv":
+        return export_csv(db, topic_id)
+    raise ValueError(f"Неизвестный формат экспорта: {export_format}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт карточек и снимки базы данных FlashMind")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="выгрузить карточки в JSON Lines или CSV")
+    export_parser.add_argument("--db", default="flashcards.db", help="путь к файлу базы данных")
+    export_parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="jsonl")
+    export_parser.add_argument("--topic", type=int, help="выгрузить только карточки этой темы")
+    export_parser.add_argument("--output", help="файл для выгрузки. По умолчанию стандартный вывод")
+
+    snapshot_parser = commands.add_parser("snapshot", help="сохранить согласованный снимок базы данных")
+    snapshot_parser.add_argument("--db", default="flashcards.db", help="путь к файлу базы данных")
+    snapshot_parser.add_argument("--output", required=True, help="файл снимка")
+
+    args = parser.parse_args(argv)
+    db = SimpleDB(db_file=args.db)
+    try:
+        if args.command == "snapshot":
+            db.backup(args.output)
+            return
+        output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        try:
+            for chunk in export(db, args.format, args.topic):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
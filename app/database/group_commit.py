@@ -0,0 +1,151 @@
+"""Групповая фиксация записей: много мелких изменений - одна транзакция.
+
+Каждая фиксация транзакции в SQLite стоит записи в журнал, а при synchronous=FULL еще и fsync,
+поэтому при большом потоке мелких изменений (например, результатов повторения карточек) пропускная
+способность упирается в частоту фиксаций. GroupCommitWriter принимает изменения в очередь, а его
+единственный поток собирает их в пачки (до max_batch изменений или пока не истечет окно window)
+и выполняет каждую пачку одной транзакцией.
+
+Каждое изменение выполняется внутри своей точки сохранения (SAVEPOINT): ошибка одного изменения
+откатывает только его, остальные изменения пачки фиксируются. Результат изменения передается
+вызывающему только после фиксации всей пачки, поэтому успешный ответ гарантирует ту же надежность
+хранения, что и обычная запись с текущей настройкой synchronous.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+# Признак остановки потока фиксации
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Поток, выполняющий изменения SimpleDB пачками в общих транзакциях"""
+
+    def __init__(self, db, window=0.002, max_batch=500):
+        """
+        Args:
+            db (SimpleDB): база данных, изменения которой выполняются
+            window (float): сколько секунд после первого изменения ждать следующие перед фиксацией.
+                0 - фиксировать сразу все, что накопилось в очереди, пока шла предыдущая фиксация
+            max_batch (int): максимальное количество изменений в одной транзакции
+        """
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"batches": 0, "operations": 0, "failed_batches": 0, "max_batch_size": 0, "commit_time": 0.0}
+        self._thread = threading.Thread(target=self._run, name="simpledb-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """Ставит изменение в очередь
+
+        Функция выполняется на потоке фиксации в контексте (contextvars) вызывающего.
+
+        Args:
+            func (callable): функция, выполняющая изменение через методы SimpleDB
+            *args: позиционные аргументы функции
+            **kwargs: именованные аргументы функции
+
+        Returns:
+            concurrent.futures.Future: результат функции, доступный после фиксации транзакции
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Групповая фиксация остановлена")
+            self._queue.put((future, contextvars.copy_context(), func, args, kwargs))
+        return future
+
+    def _collect(self):
+        """Ждет первое изменение и добирает следующие в пределах окна и размера пачки"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        """Выполняет пачку изменений одной транзакцией и передает результаты вызывающим"""
+        outcomes = []
+        started = time.perf_counter()
+        try:
+            # _write открывает транзакцию BEGIN IMMEDIATE, поэтому RELEASE точки сохранения не фиксирует
+            # изменение отдельно: вся пачка фиксируется при выходе из блока
+            with self.db._write() as conn:
+                for future, context, func, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        outcomes.append(None)
+                        continue
+                    conn.execute("SAVEPOINT group_commit_item")
+                    try:
+                        outcomes.append((True, context.run(func, *args, **kwargs)))
+                    except BaseException as exc:
+                        conn.execute("ROLLBACK TO group_commit_item")
+                        outcomes.append((False, exc))
+                    conn.execute("RELEASE group_commit_item")
+        except BaseException as exc:
+            # Транзакция не зафиксирована: не сохранилось ни одно изменение пачки
+            with self._lock:
+                self._stats["failed_batches"] += 1
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["operations"] += len(batch)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+            self._stats["commit_time"] += time.perf_counter() - started
+        for (future, *_), outcome in zip(batch, outcomes):
+            if outcome is None:
+                continue
+            ok, value = outcome
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self):
+        """Возвращает счетчики групповой фиксации
+
+        Returns:
+            dict: количество зафиксированных и неудачных пачек, изменений, максимальный размер пачки,
+                суммарное время выполнения пачек и длина очереди
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def close(self):
+        """Выполняет уже поставленные в очередь изменения и останавливает поток фиксации"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
@@ -0,0 +1,359 @@
+"""Измерение времени и количества строк запросов к SQLite.
+
+Соединения SimpleDB создаются с фабрикой InstrumentedConnection. Ее курсоры засекают время выполнения
+запроса вместе с чтением результата (fetchone, fetchall, fetchmany или перебор курсора) и передают
+итог в QueryStats. Запросы, выполнявшиеся дольше порога, записываются в журнал вместе с планом
+EXPLAIN QUERY PLAN. План снимается только в потоке, который выполняет запрос: сразу после execute, если
+уже оно оказалось медленным, или при явном дочитывании результата. Курсор, освобождаемый сборщиком мусора,
+только передает время и количество строк: финализатор может выполняться в любом потоке, когда соединение
+уже возвращено в пул или занято чужой транзакцией.
+
+В метриках запрос обозначается короткой меткой query_label (команда, таблица и хэш текста), а полный
+текст остается в журнале медленных запросов.
+
+Если для текущего запроса к API установлен счетчик через request_timer, время всех запросов к базе,
+выполненных в его контексте, суммируется в нем. Это позволяет разделить время ответа на работу SQLite
+и остальное (построение моделей, сериализацию).
+"""
+
+import bisect
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм длительности в секундах
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Максимальное количество различных запросов, для которых ведется отдельная статистика
+MAX_TRACKED_QUERIES = 500
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+[\"`\[]?(\w+)", re.IGNORECASE)
+
+# Счетчик времени запросов к базе для текущего запроса к API: [секунды, количество запросов]
+request_timer = ContextVar("request_timer", default=None)
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Приводит текст запроса к виду, по которому группируется статистика
+
+    Лишние пробелы схлопываются, а списки параметров IN (?, ?, ...) любой длины заменяются на одно "?...",
+    чтобы пачки разного размера считались одним запросом.
+    """
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    return _PLACEHOLDER_LIST.sub("?...", sql)
+
+
+@lru_cache(maxsize=1024)
+def query_label(sql):
+    """Возвращает короткую стабильную метку запроса для метрик
+
+    Метка состоит из первой команды запроса, первой упомянутой таблицы и 8 символов хэша нормализованного
+    текста, например "select:topics:1f0e3dad". Хэш различает запросы к одной таблице и не зависит
+    от запуска процесса, поэтому ряды метрик не меняются между перезапусками.
+    """
+    if sql == "other":
+        return sql
+    sql = normalize_sql(sql)
+    parts = [sql.split(" ", 1)[0].lower()]
+    table = _TABLE.search(sql)
+    if table is not None:
+        parts.append(table.group(1).lower())
+    parts.append(hashlib.blake2b(sql.encode(), digest_size=4).hexdigest())
+    return ":".join(parts)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин в формате Prometheus"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Добавляет наблюдение"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Возвращает пары (граница корзины, количество наблюдений не больше нее), последняя граница - +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class QueryStats:
+    """Потокобезопасная статистика запросов к базе данных, сгруппированная по тексту запроса"""
+
+    def __init__(self, slow_query_seconds=0.1, slow_log_size=50):
+        """
+        Args:
+            slow_query_seconds (float | None): порог медленного запроса в секундах. None отключает журнал
+            slow_log_size (int): сколько последних медленных запросов хранить вместе с их планами
+        """
+        self.slow_query_seconds = slow_query_seconds
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.slow_count = 0
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, seconds, rows):
+        """Учитывает выполненный запрос
+
+        Args:
+            sql (str): текст запроса
+            seconds (float): время выполнения вместе с чтением результата
+            rows (int): количество прочитанных или измененных строк
+        """
+        key = normalize_sql(sql)
+        timer = request_timer.get()
+        if timer is not None:
+            timer[0] += seconds
+            timer[1] += 1
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                if len(self._queries) >= MAX_TRACKED_QUERIES:
+                    key = "other"
+                    entry = self._queries.get(key)
+                if entry is None:
+                    entry = self._queries[key] = {"histogram": Histogram(), "rows": 0, "errors": 0}
+            entry["histogram"].observe(seconds)
+            entry["rows"] += rows
+
+    def record_error(self, sql):
+        """Учитывает запрос, завершившийся ошибкой"""
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is not None:
+                entry["errors"] += 1
+
+    def is_slow(self, seconds):
+        """Проверяет, превышает ли длительность порог медленного запроса"""
+        return self.slow_query_seconds is not None and seconds >= self.slow_query_seconds
+
+    def record_slow(self, sql, seconds, rows, plan):
+        """Записывает медленный запрос в журнал
+
+        Args:
+            sql (str): текст запроса
+            seconds (float): время выполнения
+            rows (int): количество строк
+            plan (list): строки EXPLAIN QUERY PLAN
+        """
+        with self._lock:
+            self.slow_count += 1
+            self.slow_queries.append(
+                {
+                    "sql": normalize_sql(sql),
+                    "label": query_label(sql),
+                    "seconds": seconds,
+                    "rows": rows,
+                    "plan": plan,
+                    "at": time.time(),
+                }
+            )
+        logger.warning(
+            "Медленный запрос %s: %.1f мс, строк: %d: %s; план: %s",
+            query_label(sql),
+            seconds * 1000,
+            rows,
+            normalize_sql(sql),
+            "; ".join(plan),
+        )
+
+    def snapshot(self):
+        """Возвращает копию статистики
+
+        Returns:
+            dict: для каждого запроса - метка для метрик, гистограмма длительности, количество строк и ошибок
+        """
+        with self._lock:
+            return {
+                key: {
+                    "label": query_label(key),
+                    "buckets": entry["histogram"].cumulative(),
+                    "sum": entry["histogram"].sum,
+                    "count": entry["histogram"].count,
+                    "rows": entry["rows"],
+                    "errors": entry["errors"],
+                }
+                for key, entry in self._queries.items()
+            }
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, измеряющий время выполнения запроса и чтения его результата"""
+
+    _pending = None
+
+    def _start(self, sql, parameters, many):
+        self._finish()
+        # Текст, параметры, executemany, время, строки и план, если он снят сразу после выполнения
+        self._pending = [sql, parameters, many, 0.0, 0, None]
+
+    def _add(self, started, rows):
+        pending = self._pending
+        if pending is not None:
+            pending[3] += time.perf_counter() - started
+            pending[4] += rows
+
+    def _capture_plan(self):
+        """Снимает план запроса, если он уже медленный, пока курсор используется потоком, который его выполнил"""
+        pending = self._pending
+        stats = self.connection.stats
+        if pending is not None and stats is not None and stats.is_slow(pending[3]):
+            pending[5] = self._explain(pending[0], None if pending[2] else pending[1])
+
+    def _finish(self, explain=True):
+        """Передает накопленное время и количество строк в статистику соединения
+
+        Args:
+            explain (bool): можно ли снять план медленного запроса, если он не снят после execute. False
+                для финализатора: он может выполняться в другом потоке, и соединение использовать нельзя
+        """
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        stats = self.connection.stats
+        if stats is None:
+            return
+        sql, parameters, many, seconds, rows, plan = pending
+        if self.description is None and self.rowcount > 0:
+            rows = self.rowcount
+        stats.record(sql, seconds, rows)
+        if stats.is_slow(seconds):
+            if plan is None:
+                if explain:
+                    plan = self._explain(sql, None if many else parameters)
+                else:
+                    plan = ["план не снят: запрос стал медленным при чтении результата"]
+            stats.record_slow(sql, seconds, rows, plan)
+
+    def _explain(self, sql, parameters):
+        """Возвращает план запроса. Для executemany параметры неизвестны, и план строится для NULL вместо них"""
+        if parameters is None:
+            parameters = (None,) * sql.count("?")
+        try:
+            plan = sqlite3.Cursor(self.connection).execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+            return [row[-1] for row in plan.fetchall()]
+        except sqlite3.Error as exc:
+            return [f"план недоступен: {exc}"]
+
+    def _fail(self, sql):
+        self._pending = None
+        if self.connection.stats is not None:
+            self.connection.stats.record_error(sql)
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters, False)
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except sqlite3.Error:
+            self._fail(sql)
+            raise
+        self._add(started, 0)
+        self._capture_plan()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None, True)
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            self._fail(sql)
+            raise
+        self._add(started, 0)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started, row is not None)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(started, len(rows))
+        if len(rows) < (self.arraysize if size is None else size):
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started, len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(started, 0)
+            self._finish()
+            raise
+        self._add(started, 1)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Курсоры, результат которых дочитан не полностью (например, fetchone по первичному ключу),
+        # учитываются при освобождении. Финализатор может выполняться в любом потоке, поэтому он только
+        # записывает время и строки и не обращается к соединению
+        try:
+            self._finish(explain=False)
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение, курсоры которого передают время и количество строк запросов в QueryStats"""
+
+    stats = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        # Фиксация в режиме WAL включает запись в журнал и, в зависимости от synchronous, fsync,
+        # поэтому тоже учитывается как отдельный запрос
+        if self.stats is None or not self.in_transaction:
+            return super().commit()
+        started = time.perf_counter()
+        super().commit()
+        self.stats.record("COMMIT", time.perf_counter() - started, 0)
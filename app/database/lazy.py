@@ -0,0 +1,48 @@
+"""Отложенное открытие базы данных.
+
+Модуль приложения создается при импорте, а uvicorn --workers импортирует его в каждом рабочем
+процессе. LazySimpleDB ничего не открывает при создании: соединения, миграции и фоновые потоки
+появляются в процессе, который первым обратится к базе, обычно в обработчике запуска приложения
+(lifespan). Поэтому ни соединения SQLite, ни потоки не переживают fork и не делятся между процессами.
+"""
+
+import threading
+
+
+class LazySimpleDB:
+    """Обертка, создающая SimpleDB при первом обращении и пропускающая к нему все атрибуты"""
+
+    def __init__(self, factory):
+        """
+        Args:
+            factory (callable): функция без аргументов, создающая SimpleDB
+        """
+        self._factory = factory
+        self._db = None
+        self._lock = threading.Lock()
+
+    @property
+    def opened(self):
+        """Открыта ли база"""
+        return self._db is not None
+
+    def open(self):
+        """Открывает базу, если она еще не открыта
+
+        Returns:
+            SimpleDB: открытая база
+        """
+        with self._lock:
+            if self._db is None:
+                self._db = self._factory()
+            return self._db
+
+    def __getattr__(self, name):
+        return getattr(self._db or self.open(), name)
+
+    def close(self):
+        """Закрывает базу. Следующее обращение откроет ее заново"""
+        with self._lock:
+            db, self._db = self._db, None
+        if db is not None:
+            db.close()
@@ -0,0 +1,553 @@
+"""Версионированные миграции схемы базы данных.
+
+Текущая версия схемы хранится в PRAGMA user_version. Каждая миграция выполняется в отдельной
+транзакции вместе с обновлением номера версии, поэтому прерванная миграция не оставляет базу
+в промежуточном состоянии.
+"""
+
+import logging
+
+from .similarity import card_signature, lsh_buckets, pack_signature
+from .timestamps import TIMESTAMP_TYPE, to_timestamp
+
+
+logger = logging.getLogger(__name__)
+
+# Область resource_versions, в которой хранится ревизия журнала changes, до которой проиндексированы
+# сигнатуры похожих карточек
+SIMILARITY_INDEX_SCOPE = "similarity"
+
+
+def _create_base_tables(conn):
+    """Создает таблицы тем и карточек"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS topics (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            description TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    """
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS flashcards (
+            id INTEGER PRIMARY KEY,
+            topic_id INTEGER,
+            question TEXT,
+            answer TEXT,
+            difficulty_level INTEGER,
+            last_reviewed_at TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            FOREIGN KEY (topic_id) REFERENCES topics(id)
+        )
+    """
+    )
+
+
+def _ensure_unique(conn, table, column):
+    """Проверяет, что в колонке нет повторяющихся значений, перед созданием уникального индекса"""
+    duplicates = conn.execute(
+        f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column} HAVING COUNT(*) > 1 LIMIT 5"
+    ).fetchall()
+    if duplicates:
+        values = ", ".join(repr(value) for value, _ in duplicates)
+        raise RuntimeError(
+            f"Невозможно создать уникальный индекс по {table}.{column}: найдены повторяющиеся значения {values}"
+        )
+
+
+def _add_lookup_indexes(conn):
+    """Добавляет индексы для поиска темы по имени, карточки по вопросу и карточек по теме"""
+    _ensure_unique(conn, "topics", "name")
+    _ensure_unique(conn, "flashcards", "question")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_topics_name ON topics(name)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_flashcards_question ON flashcards(question)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_flashcards_topic_id ON flashcards(topic_id)")
+
+
+def _add_review_schedule(conn):
+    """Добавляет состояние интервального повторения карточек и индекс очереди повторения по теме"""
+    conn.execute("ALTER TABLE flashcards ADD COLUMN due_at TEXT")
+    conn.execute("ALTER TABLE flashcards ADD COLUMN ease_factor REAL NOT NULL DEFAULT 2.5")
+    conn.execute("ALTER TABLE flashcards ADD COLUMN interval_days REAL NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE flashcards ADD COLUMN repetitions INTEGER NOT NULL DEFAULT 0")
+    # Уже существующие карточки становятся к повторению сразу
+    conn.execute("UPDATE flashcards SET due_at = COALESCE(last_reviewed_at, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_flashcards_topic_due ON flashcards(topic_id, due_at)")
+
+
+def _add_full_text_search(conn):
+    """Добавляет полнотекстовый индекс FTS5 по вопросам и ответам и триггеры его синхронизации"""
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts USING fts5(
+            question,
+            answer,
+            content='flashcards',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS flashcards_fts_insert AFTER INSERT ON flashcards BEGIN
+            INSERT INTO flashcards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+        END
+    """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS flashcards_fts_delete AFTER DELETE ON flashcards BEGIN
+            INSERT INTO flashcards_fts(flashcards_fts, rowid, question, answer)
+            VALUES ('delete', old.id, old.question, old.answer);
+        END
+    """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS flashcards_fts_update AFTER UPDATE OF question, answer ON flashcards BEGIN
+            INSERT INTO flashcards_fts(flashcards_fts, rowid, question, answer)
+            VALUES ('delete', old.id, old.question, old.answer);
+            INSERT INTO flashcards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+        END
+    """
+    )
+    conn.execute("INSERT INTO flashcards_fts(flashcards_fts) VALUES ('rebuild')")
+
+
+def _bump(scope):
+    """SQL для увеличения версии области данных внутри триггера"""
+    return (
+        f"INSERT INTO resource_versions(scope, version) VALUES ({scope}, 1) "
+        "ON CONFLICT(scope) DO UPDATE SET version = version + 1;"
+    )
+
+
+def _add_resource_versions(conn):
+    """Добавляет счетчики версий списков тем и карточек, которые увеличиваются триггерами при каждой записи"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS resource_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """
+    )
+    bump_topics = _bump("'topics'")
+    bump_flashcards = _bump("'flashcards'")
+    bump_old_topic = _bump("'topic:' || old.topic_id")
+    bump_new_topic = _bump("'topic:' || new.topic_id")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS topics_version_{event.lower()} AFTER {event} ON topics "
+            f"BEGIN {bump_topics} END"
+        )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS flashcards_version_insert AFTER INSERT ON flashcards "
+        f"BEGIN {bump_flashcards} {bump_new_topic} END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS flashcards_version_update AFTER UPDATE ON flashcards "
+        f"BEGIN {bump_flashcards} {bump_old_topic} {bump_new_topic} END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS flashcards_version_delete AFTER DELETE ON flashcards "
+        f"BEGIN {bump_flashcards} {bump_old_topic} END"
+    )
+
+
+def _add_change_log(conn):
+    """Добавляет журнал изменений для инкрементальной синхронизации клиентов.
+
+    В журнале хранится одна строка на каждую тему и карточку с номером последней ревизии, в которой она
+    менялась. AUTOINCREMENT гарантирует, что номера ревизий только растут и не переиспользуются, а INSERT OR
+    REPLACE переносит запись в конец журнала, поэтому его размер не превышает числа записей и надгробий.
+    Удаление оставляет надгробие deleted = 1.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS changes (
+            rev INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (entity, entity_id)
+        )
+    """
+    )
+    for table, entity in (("topics", "topic"), ("flashcards", "flashcard")):
+        for event, row, deleted in (("INSERT", "new", 0), ("UPDATE", "new", 0), ("DELETE", "old", 1)):
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()} AFTER {event} ON {table} BEGIN "
+                f"INSERT OR REPLACE INTO changes(entity, entity_id, deleted) VALUES ('{entity}', {row}.id, {deleted}); "
+                "END"
+            )
+        # Уже существующие записи попадают в журнал, чтобы первая синхронизация вернула их все
+        conn.execute(f"INSERT INTO changes(entity, entity_id) SELECT '{entity}', id FROM {table} ORDER BY id")
+
+
+def _rebuild_table(conn, table, definition, convert=None):
+    """Пересоздает таблицу с новым определением колонок и ограничений, сохраняя данные, индексы и триггеры
+
+    SQLite не умеет менять ограничения и типы колонок существующей таблицы, поэтому таблица создается
+    заново под временным именем, данные копируются, старая таблица удаляется, а новая переименовывается.
+    Индексы и триггеры удаляются вместе со старой таблицей и создаются заново по их сохраненному SQL.
+    Внешние ключи на время пересоздания должны быть отключены (это делает migrate). Триггеры других
+    таблиц, которые ссылаются на пересоздаваемую, нужно удалить заранее: без нее переименование
+    не проходит проверку схемы.
+
+    Args:
+        conn (sqlite3.Connection): соединение внутри транзакции миграции
+        table (str): имя таблицы
+        definition (str): определение колонок и ограничений новой таблицы
+        convert (dict, optional): SQL-выражения, которыми заполняются колонки новой таблицы вместо
+            значений одноименных колонок старой
+    """
+    dependents = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL "
+        "ORDER BY type, name",
+        (table,),
+    ).fetchall()
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    values = ", ".join((convert or {}).get(column, column) for column in columns)
+    conn.execute(f"CREATE TABLE {table}_new ({definition})")
+    conn.execute(f"INSERT INTO {table}_new({', '.join(columns)}) SELECT {values} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for (sql,) in dependents:
+        conn.execute(sql)
+
+
+def _add_cascade_delete(conn):
+    """Удаляет карточки без темы и добавляет каскадное удаление карточек вместе с их темой
+
+    Карточки удаляются обычным DELETE, поэтому триггеры убирают их из полнотекстового индекса
+    и оставляют надгробия в журнале изменений.
+    """
+    conn.execute("DELETE FROM flashcards WHERE topic_id IS NOT NULL AND topic_id NOT IN (SELECT id FROM topics)")
+    _rebuild_table(
+        conn,
+        "flashcards",
+        """
+            id INTEGER PRIMARY KEY,
+            topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
+            question TEXT,
+            answer TEXT,
+            difficulty_level INTEGER,
+            last_reviewed_at TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            due_at TEXT,
+            ease_factor REAL NOT NULL DEFAULT 2.5,
+            interval_days REAL NOT NULL DEFAULT 0,
+            repetitions INTEGER NOT NULL DEFAULT 0
+        """,
+    )
+    violations = conn.execute("PRAGMA foreign_key_check(flashcards)").fetchall()
+    if violations:
+        raise RuntimeError(f"После пересоздания таблицы flashcards нарушены внешние ключи: {violations[:5]}")
+
+
+def _create_topic_stats_triggers(conn):
+    """Создает триггеры, поддерживающие topic_stats и topic_difficulty
+
+    Время последнего повторения сравнивается с проверкой на NULL, а не через COALESCE с пустой строкой,
+    поэтому условия работают и для ISO-строк, и для чисел (см. _store_timestamps_as_integers).
+    """
+
+    def add(row):
+        return (
+            "UPDATE topic_stats SET card_count = card_count + 1, "
+            f"last_reviewed_at = CASE WHEN last_reviewed_at IS NULL OR {row}.last_reviewed_at > last_reviewed_at "
+            f"THEN {row}.last_reviewed_at ELSE last_reviewed_at END WHERE topic_id = {row}.topic_id; "
+            "INSERT INTO topic_difficulty(topic_id, difficulty_level, card_count) "
+            f"SELECT {row}.topic_id, {row}.difficulty_level, 1 "
+            f"WHERE {row}.topic_id IS NOT NULL AND {row}.difficulty_level IS NOT NULL "
+            "ON CONFLICT(topic_id, difficulty_level) DO UPDATE SET card_count = card_count + 1;"
+        )
+
+    def remove(row):
+        return (
+            f"UPDATE topic_stats SET card_count = card_count - 1 WHERE topic_id = {row}.topic_id; "
+            "UPDATE topic_difficulty SET card_count = card_count - 1 "
+            f"WHERE topic_id = {row}.topic_id AND difficulty_level = {row}.difficulty_level; "
+            "DELETE FROM topic_difficulty "
+            f"WHERE topic_id = {row}.topic_id AND difficulty_level = {row}.difficulty_level AND card_count <= 0;"
+        )
+
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS topics_stats_insert AFTER INSERT ON topics "
+        "BEGIN INSERT INTO topic_stats(topic_id) VALUES (new.id); END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS flashcards_stats_insert AFTER INSERT ON flashcards BEGIN {add('new')} END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS flashcards_stats_delete AFTER DELETE ON flashcards BEGIN {remove('old')} END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS flashcards_stats_move AFTER UPDATE OF topic_id, difficulty_level ON flashcards "
+        "WHEN old.topic_id IS NOT new.topic_id OR old.difficulty_level IS NOT new.difficulty_level "
+        f"BEGIN {remove('old')} {add('new')} END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS flashcards_stats_review AFTER UPDATE OF last_reviewed_at ON flashcards "
+        "WHEN new.last_reviewed_at IS NOT old.last_reviewed_at "
+        "BEGIN UPDATE topic_stats SET last_reviewed_at = new.last_reviewed_at WHERE topic_id = new.topic_id "
+        "AND (last_reviewed_at IS NULL OR new.last_reviewed_at > last_reviewed_at); END"
+    )
+
+
+def _add_topic_stats(conn):
+    """Добавляет сводные счетчики карточек по темам, которые поддерживаются триггерами при каждой записи
+
+    topic_stats хранит для каждой темы количество карточек и время последнего повторения в ней,
+    topic_difficulty - количество карточек темы на каждом уровне сложности. Строка topic_stats
+    создается вместе с темой, поэтому триггеры карточек только обновляют ее. Триггеры удаления
+    тоже используют только UPDATE и DELETE: при каскадном удалении темы строки ее счетчиков могут
+    быть уже удалены, и вставка вновь создала бы их для несуществующей темы.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS topic_stats (
+            topic_id INTEGER PRIMARY KEY REFERENCES topics(id) ON DELETE CASCADE,
+            card_count INTEGER NOT NULL DEFAULT 0,
+            last_reviewed_at TEXT
+        )
+    """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS topic_difficulty (
+            topic_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE,
+            difficulty_level INTEGER NOT NULL,
+            card_count INTEGER NOT NULL,
+            PRIMARY KEY (topic_id, difficulty_level)
+        ) WITHOUT ROWID
+    """
+    )
+
+    _create_topic_stats_triggers(conn)
+
+    # Счетчики уже существующих тем считаются один раз при миграции
+    conn.execute(
+        """
+        INSERT INTO topic_stats(topic_id, card_count, last_reviewed_at)
+        SELECT topics.id, COUNT(flashcards.id), MAX(flashcards.last_reviewed_at)
+        FROM topics LEFT JOIN flashcards ON flashcards.topic_id = topics.id
+        GROUP BY topics.id
+    """
+    )
+    conn.execute(
+        """
+        INSERT INTO topic_difficulty(topic_id, difficulty_level, card_count)
+        SELECT topic_id, difficulty_level, COUNT(*) FROM flashcards
+        WHERE topic_id IS NOT NULL AND difficulty_level IS NOT NULL
+        GROUP BY topic_id, difficulty_level
+    """
+    )
+
+
+def _add_similarity_index(conn):
+    """Добавляет сигнатуры MinHash и корзины LSH для поиска похожих карточек и заполняет их для уже существующих
+
+    Сигнатуры вычисляются в Python (см. similarity), поэтому таблицы поддерживают методы SimpleDB,
+    а не триггеры. При удалении карточки ее сигнатура и корзины удаляются каскадно.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS flashcard_minhash (
+            flashcard_id INTEGER PRIMARY KEY REFERENCES flashcards(id) ON DELETE CASCADE,
+            signature BLOB NOT NULL
+        )
+    """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS flashcard_lsh (
+            bucket INTEGER NOT NULL,
+            flashcard_id INTEGER NOT NULL REFERENCES flashcards(id) ON DELETE CASCADE,
+            PRIMARY KEY (bucket, flashcard_id)
+        ) WITHOUT ROWID
+    """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_flashcard_lsh_flashcard_id ON flashcard_lsh(flashcard_id)")
+    signatures = [
+        (flashcard_id, card_signature(question, answer))
+        for flashcard_id, question, answer in conn.execute("SELECT id, question, answer FROM flashcards")
+    ]
+    conn.executemany(
+        "INSERT INTO flashcard_minhash(flashcard_id, signature) VALUES (?, ?)",
+        ((flashcard_id, pack_signature(signature)) for flashcard_id, signature in signatures),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO flashcard_lsh(bucket, flashcard_id) VALUES (?, ?)",
+        ((bucket, flashcard_id) for flashcard_id, signature in signatures for bucket in lsh_buckets(signature)),
+    )
+
+
+def _defer_similarity_index(conn):
+    """Запоминает ревизию журнала изменений, до которой индекс похожих карточек актуален
+
+    До этой версии индекс LSH обновлялся при каждой записи карточки, поэтому он соответствует всему журналу
+    changes. Дальше SimpleDB дописывает в индекс карточки из журнала перед поиском похожих, а ревизию,
+    до которой они проиндексированы, хранит в resource_versions под именем SIMILARITY_INDEX_SCOPE.
+    """
+    conn.execute(
+        "INSERT OR REPLACE INTO resource_versions(scope, version) SELECT ?, COALESCE(MAX(rev), 0) FROM changes",
+        (SIMILARITY_INDEX_SCOPE,),
+    )
+
+
+def _store_timestamps_as_integers(conn):
+    """Переводит метки времени тем, карточек и счетчиков тем из ISO-строк в числа микросекунд (см. timestamps)
+
+    Таблицы пересоздаются с колонками типа TIMESTAMP_US, а строки переводятся в числа функцией Python,
+    поэтому микросекунды и часовые пояса обрабатываются так же, как при записи из приложения.
+    Нераспознанные строки заменяются на NULL. Триггеры счетчиков ссылаются на topic_stats, которая
+    тоже пересоздается, поэтому они удаляются и создаются заново.
+    """
+    invalid = []
+
+    def convert(value):
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return to_timestamp(value)
+        except (TypeError, ValueError):
+            invalid.append(value)
+            return None
+
+    conn.create_function("timestamp_us", 1, convert, deterministic=True)
+    for (trigger,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%topic_stats%'"
+    ).fetchall():
+        conn.execute(f"DROP TRIGGER {trigger}")
+
+    _rebuild_table(
+        conn,
+        "topics",
+        f"""
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            description TEXT,
+            created_at {TIMESTAMP_TYPE},
+            updated_at {TIMESTAMP_TYPE}
+        """,
+        convert={column: f"timestamp_us({column})" for column in ("created_at", "updated_at")},
+    )
+    _rebuild_table(
+        conn,
+        "flashcards",
+        f"""
+            id INTEGER PRIMARY KEY,
+            topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
+            question TEXT,
+            answer TEXT,
+            difficulty_level INTEGER,
+            last_reviewed_at {TIMESTAMP_TYPE},
+            created_at {TIMESTAMP_TYPE},
+            updated_at {TIMESTAMP_TYPE},
+            due_at {TIMESTAMP_TYPE},
+            ease_factor REAL NOT NULL DEFAULT 2.5,
+            interval_days REAL NOT NULL DEFAULT 0,
+            repetitions INTEGER NOT NULL DEFAULT 0
+        """,
+        convert={
+            column: f"timestamp_us({column})"
+            for column in ("last_reviewed_at", "created_at", "updated_at", "due_at")
+        },
+    )
+    _rebuild_table(
+        conn,
+        "topic_stats",
+        f"""
+            topic_id INTEGER PRIMARY KEY REFERENCES topics(id) ON DELETE CASCADE,
+            card_count INTEGER NOT NULL DEFAULT 0,
+            last_reviewed_at {TIMESTAMP_TYPE}
+        """,
+        convert={"last_reviewed_at": "timestamp_us(last_reviewed_at)"},
+    )
+    _create_topic_stats_triggers(conn)
+    if invalid:
+        logger.warning("Нераспознанные метки времени заменены на NULL: %d, например %r", len(invalid), invalid[:5])
+    violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        raise RuntimeError(f"После пересоздания таблиц нарушены внешние ключи: {violations[:5]}")
+
+
+# Список миграций в порядке применения: (версия, описание, функция)
+MIGRATIONS = [
+    (1, "Таблицы тем и карточек", _create_base_tables),
+    (2, "Индексы для поиска по имени темы, вопросу и теме карточки", _add_lookup_indexes),
+    (3, "Расписание интервального повторения карточек", _add_review_schedule),
+    (4, "Полнотекстовый поиск по карточкам", _add_full_text_search),
+    (5, "Версии списков тем и карточек для ETag", _add_resource_versions),
+    (6, "Журнал изменений для синхронизации", _add_change_log),
+    (7, "Каскадное удаление карточек вместе с темой", _add_cascade_delete),
+    (8, "Сводные счетчики карточек по темам", _add_topic_stats),
+    (9, "Индекс LSH для поиска похожих карточек", _add_similarity_index),
+    (10, "Метки времени в виде чисел микросекунд", _store_timestamps_as_integers),
+    (11, "Отложенное обновление индекса похожих карточек", _defer_similarity_index),
+]
+
+
+def schema_version(conn):
+    """Возвращает текущую версию схемы базы данных
+
+    Args:
+        conn (sqlite3.Connection): соединение с базой данных
+
+    Returns:
+        int: номер последней примененной миграции
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=None):
+    """Применяет все еще не примененные миграции
+
+    Args:
+        conn (sqlite3.Connection): пишущее соединение с базой данных
+        target (int, optional): версия, до которой нужно обновить схему. По умолчанию последняя
+
+    Returns:
+        int: версия схемы после применения миграций
+    """
+    current = schema_version(conn)
+    # Пересоздание таблиц требует отключенных внешних ключей, а PRAGMA foreign_keys
+    # не действует внутри транзакции, поэтому отключаем их на время всех миграций
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for version, _, apply in MIGRATIONS:
+            if version <= current or (target is not None and version > target):
+                continue
+            # BEGIN IMMEDIATE сразу берет блокировку записи. Если несколько процессов запускаются
+            # одновременно, миграцию применяет первый, а остальные после ожидания видят новую версию
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = schema_version(conn)
+                if version <= current:
+                    conn.rollback()
+                    continue
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            current = version
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+    # Если миграции применил другой процесс, соединение может помнить схему, прочитанную до них. Запросы
+    # с ON CONFLICT проверяют ограничения по этой схеме при разборе и завершаются ошибкой, а не перечитывают
+    # ее. Чтение из sqlite_master сверяет версию схемы в файле и перечитывает схему, если она устарела
+    conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+    return current
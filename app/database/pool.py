@@ -0,0 +1,157 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(RuntimeError):
+    """Ошибка, возникающая, если свободное соединение не удалось получить за отведенное время"""
+
+
+class ConnectionPool:
+    """Пул соединений с SQLite.
+
+    Соединения создаются лениво (не больше size штук) и выдаются потокам во временное пользование.
+    Повторный запрос соединения из того же потока возвращает уже выданное соединение, поэтому
+    вложенные вызовы методов SimpleDB работают в рамках одного соединения и одной транзакции.
+    """
+
+    def __init__(self, factory, size=5, timeout=30.0):
+        """
+        Args:
+            factory (callable): функция без аргументов, создающая новое соединение sqlite3
+            size (int): максимальное количество соединений в пуле
+            timeout (float): сколько секунд ждать свободное соединение
+        """
+        if size < 1:
+            raise ValueError("Размер пула должен быть не меньше 1")
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "created": 0,
+        }
+
+    def _acquire(self):
+        """Берет свободное соединение из пула или создает новое, если лимит не исчерпан"""
+        if self._closed:
+            raise RuntimeError("Пул соединений закрыт")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self.factory()
+                self._all.append(conn)
+                self._stats["created"] += 1
+                return conn
+
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeoutError(f"Не удалось получить соединение с базой данных за {self.timeout} с")
+        with self._lock:
+            self._stats["waits"] += 1
+            self._stats["wait_time"] += time.perf_counter() - started
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер, выдающий соединение текущему потоку
+
+        Yields:
+            sqlite3.Connection: соединение, закрепленное за потоком до выхода из самого внешнего блока
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        with self._lock:
+            self._stats["checkouts"] += 1
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            if conn.in_transaction:
+                # Соединение не должно возвращаться в пул с незавершенной транзакцией
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Контекстный менеджер транзакции на соединении из пула.
+
+        Фиксирует изменения только при выходе из самого внешнего блока, при ошибке откатывает их.
+
+        Yields:
+            sqlite3.Connection: соединение, в котором выполняется транзакция
+        """
+        with self.connection() as conn:
+            outermost = self._local.depth == 1
+            try:
+                yield conn
+            except BaseException:
+                if outermost:
+                    conn.rollback()
+                raise
+            if outermost:
+                conn.commit()
+
+    def held(self):
+        """Проверяет, удерживает ли текущий поток соединение из этого пула
+
+        Returns:
+            bool: True, если поток сейчас работает с соединением пула
+        """
+        return getattr(self._local, "conn", None) is not None
+
+    def stats(self):
+        """Возвращает метрики использования пула
+
+        Returns:
+            dict: размер пула, количество созданных, занятых и свободных соединений, счетчики выдачи и ожидания
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = len(self._all)
+        stats["idle"] = self._idle.qsize()
+        stats["in_use"] = stats["open"] - stats["idle"]
+        return stats
+
+    def close(self):
+        """Закрывает все соединения пула"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            connections, self._all = self._all, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
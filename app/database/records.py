@@ -0,0 +1,46 @@
+"""Компактные записи строк таблиц topics и flashcards.
+
+Записи - именованные кортежи: у них нет __dict__ (__slots__ пуст), поэтому они занимают столько же
+памяти, сколько обычный кортеж sqlite3, и по-прежнему доступны по индексу (row[0]). Кроме того, поля
+можно читать по имени (row.question). Записи создаются фабрикой строк курсора прямо при чтении, без
+промежуточного кортежа.
+
+Запросы перечисляют колонки в порядке полей записи (см. select_columns), поэтому соответствие полей
+не зависит от порядка колонок в таблице после миграций.
+"""
+
+from collections import namedtuple
+
+
+TopicRecord = namedtuple("TopicRecord", "id name description created_at updated_at")
+
+FlashcardRecord = namedtuple(
+    "FlashcardRecord",
+    "id topic_id question answer difficulty_level last_reviewed_at created_at updated_at due_at "
+    "ease_factor interval_days repetitions",
+)
+
+
+def select_columns(record):
+    """Возвращает список колонок для SELECT в порядке полей записи
+
+    Args:
+        record (type): класс записи, например FlashcardRecord
+
+    Returns:
+        str: имена колонок через запятую
+    """
+    return ", ".join(record._fields)
+
+
+def row_factory(record):
+    """Возвращает фабрику строк курсора sqlite3, создающую записи record
+
+    Args:
+        record (type): класс записи, например FlashcardRecord
+
+    Returns:
+        callable: функция (cursor, row) -> record
+    """
+    new = tuple.__new__
+    return lambda cursor, row: new(record, row)
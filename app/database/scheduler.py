@@ -0,0 +1,70 @@
+"""Планировщик интервального повторения по алгоритму SM-2.
+
+Оценка ответа grade задается от 0 до 5: 0-2 - карточка не вспомнена и начинает цикл заново,
+3 - вспомнена с трудом, 5 - вспомнена легко.
+"""
+
+from dataclasses import dataclass
+from datetime import timedelta
+
+
+MIN_GRADE = 0
+MAX_GRADE = 5
+# Минимальная оценка, при которой ответ считается правильным
+PASSING_GRADE = 3
+MIN_EASE_FACTOR = 1.3
+
+
+@dataclass(frozen=True)
+class ReviewState:
+    """Состояние карточки в расписании повторений"""
+
+    ease_factor: float = 2.5
+    interval_days: float = 0
+    repetitions: int = 0
+
+
+def schedule(state, grade, reviewed_at):
+    """Вычисляет новое состояние карточки и время следующего повторения
+
+    Args:
+        state (ReviewState): текущее состояние карточки
+        grade (int): оценка ответа от 0 до 5
+        reviewed_at (datetime): время повторения
+
+    Returns:
+        tuple: (новое ReviewState, время следующего повторения datetime)
+    """
+    if not MIN_GRADE <= grade <= MAX_GRADE:
+        raise ValueError(f"Оценка должна быть от {MIN_GRADE} до {MAX_GRADE}")
+
+    if grade < PASSING_GRADE:
+        repetitions = 0
+        interval_days = 1
+    else:
+        repetitions = state.repetitions + 1
+        if repetitions == 1:
+            interval_days = 1
+        elif repetitions == 2:
+            interval_days = 6
+        else:
+            interval_days = round(state.interval_days * state.ease_factor)
+
+    penalty = MAX_GRADE - grade
+    ease_factor = max(MIN_EASE_FACTOR, state.ease_factor + 0.1 - penalty * (0.08 + penalty * 0.02))
+    new_state = ReviewState(ease_factor=ease_factor, interval_days=interval_days, repetitions=repetitions)
+    return new_state, reviewed_at + timedelta(days=interval_days)
+
+
+def to_local_naive(moment):
+    """Приводит время к локальному времени без часового пояса, в котором хранятся даты в базе
+
+    Args:
+        moment (datetime): время с часовым поясом или без
+
+    Returns:
+        datetime: локальное время без часового пояса
+    """
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
@@ -0,0 +1,129 @@
+"""Поиск похожих карточек: шинглы, MinHash и LSH.
+
+Текст карточки (вопрос и ответ) нормализуется и разбивается на шинглы - перекрывающиеся
+последовательности из SHINGLE_SIZE символов. Сходство двух карточек - коэффициент Жаккара их
+множеств шинглов. MinHash сжимает множество шинглов в сигнатуру из NUM_PERM чисел, у которой доля
+совпадающих позиций приближает коэффициент Жаккара. Сигнатура делится на BANDS полос по ROWS чисел,
+и каждая полоса превращается в ключ корзины LSH. Карточки, попавшие хотя бы в одну общую корзину,
+становятся кандидатами, поэтому поиск похожих читает только корзины карточки, а не сравнивает ее со
+всеми остальными. Сигнатуры хранятся в базе: кандидаты сначала отсеиваются по оценке похожести из
+сигнатур, а оставшиеся проверяются точным коэффициентом Жаккара.
+
+При 20 полосах по 3 числа карточка с похожестью 0.5 становится кандидатом с вероятностью около 93%,
+с похожестью 0.7 - почти наверняка, а с похожестью 0.2 - лишь в 15% случаев.
+"""
+
+import hashlib
+import operator
+import re
+import struct
+
+
+SHINGLE_SIZE = 3
+BANDS = 20
+ROWS = 3
+NUM_PERM = BANDS * ROWS
+
+_MAX_HASH = (1 << 32) - 1
+# Нечетная константа для сдвига значений, перенесенных в пустые корзины
+_GOLDEN = 0x9E3779B1
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}I")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    """Приводит текст к нижнему регистру и заменяет знаки препинания и пробелы одним пробелом"""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def shingles(question, answer=""):
+    """Возвращает множество шинглов текста карточки
+
+    Args:
+        question (str): вопрос
+        answer (str, optional): ответ
+
+    Returns:
+        set: шинглы - строки из SHINGLE_SIZE символов
+    """
+    text = normalize(f"{question} {answer or ''}")
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(items):
+    """Вычисляет сигнатуру MinHash множества шинглов методом одной перестановки
+
+    Вместо NUM_PERM хеш-функций каждый шингл хешируется один раз, хеш распределяет шингл в одну из
+    NUM_PERM корзин, и в каждой корзине остается минимальное значение. Пустые корзины (у коротких
+    текстов) заполняются значением ближайшей непустой корзины справа со сдвигом на расстояние до нее,
+    поэтому у похожих текстов они совпадают так же, как непустые. Доля совпадающих позиций двух
+    сигнатур по-прежнему приближает коэффициент Жаккара, а вычисление в несколько раз быстрее.
+
+    Returns:
+        list: NUM_PERM 32-битных значений
+    """
+    bins = [None] * NUM_PERM
+    for item in items:
+        value = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "little")
+        index, value = value % NUM_PERM, (value // NUM_PERM) & _MAX_HASH
+        current = bins[index]
+        if current is None or value < current:
+            bins[index] = value
+    if all(value is None for value in bins):
+        return [_MAX_HASH] * NUM_PERM
+    signature = list(bins)
+    for index in range(NUM_PERM):
+        if signature[index] is None:
+            distance = 1
+            while bins[(index + distance) % NUM_PERM] is None:
+                distance += 1
+            signature[index] = (bins[(index + distance) % NUM_PERM] + distance * _GOLDEN) & _MAX_HASH
+    return signature
+
+
+def lsh_buckets(signature):
+    """Разбивает сигнатуру на полосы и возвращает ключ корзины LSH для каждой полосы
+
+    Номер полосы входит в ключ, поэтому совпадение ключей означает совпадение одной и той же полосы.
+
+    Returns:
+        list: BANDS знаковых 64-битных ключей, которые можно хранить в колонке INTEGER
+    """
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS : (band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<I{ROWS}I", band, *rows), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+
+def card_signature(question, answer):
+    """Возвращает сигнатуру MinHash текста карточки"""
+    return minhash(shingles(question, answer))
+
+
+def pack_signature(signature):
+    """Упаковывает сигнатуру в BLOB для хранения в базе"""
+    return _SIGNATURE.pack(*signature)
+
+
+def unpack_signature(blob):
+    """Распаковывает сигнатуру, сохраненную pack_signature"""
+    return _SIGNATURE.unpack(blob)
+
+
+def estimate_similarity(first, second):
+    """Оценивает коэффициент Жаккара по доле совпадающих позиций двух сигнатур
+
+    Стандартное отклонение оценки не больше 0.07, а вычисление в десятки раз дешевле точного сравнения шинглов.
+    """
+    return sum(map(operator.eq, first, second)) / NUM_PERM
+
+
+def jaccard(first, second):
+    """Коэффициент Жаккара двух множеств шинглов"""
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
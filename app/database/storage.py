@@ -0,0 +1,146 @@
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from .timestamps import register as register_timestamps
+
+
+@dataclass(frozen=True)
+class StorageConfig:
+    """Настройки хранилища SQLite, применяемые к каждому новому соединению.
+
+    Attributes:
+        journal_mode (str): режим журнала. WAL позволяет читателям не блокироваться на время записи
+        synchronous (str): уровень синхронизации с диском. NORMAL в режиме WAL не теряет целостность базы
+        cache_size (int): размер страничного кэша. Отрицательное значение задается в килобайтах
+        mmap_size (int): сколько байт файла базы отображать в память
+        temp_store (str): где хранить временные таблицы и индексы
+        busy_timeout (float): сколько секунд ждать снятия блокировки другим соединением
+        busy_retries (int): сколько раз повторить операцию, получившую SQLITE_BUSY и после busy_timeout.
+            Нужно, когда с базой работают несколько процессов (uvicorn --workers)
+        busy_backoff (float): пауза в секундах перед первым повтором, каждая следующая вдвое длиннее
+    """
+
+    journal_mode: str = "wal"
+    synchronous: str = "normal"
+    cache_size: int = -16000
+    mmap_size: int = 128 * 1024 * 1024
+    temp_store: str = "memory"
+    busy_timeout: float = 5.0
+    busy_retries: int = 3
+    busy_backoff: float = 0.05
+
+    def pragmas(self):
+        """Возвращает PRAGMA, которые нужно выполнить на каждом соединении
+
+        Returns:
+            list: список пар (имя, значение)
+        """
+        return [
+            ("synchronous", self.synchronous),
+            ("cache_size", self.cache_size),
+            ("mmap_size", self.mmap_size),
+            ("temp_store", self.temp_store),
+        ]
+
+
+class DatabaseBusy(sqlite3.OperationalError):
+    """Ошибка, возникающая, если база осталась заблокированной другим соединением после всех повторов"""
+
+
+def is_busy(exc):
+    """Проверяет, вызвана ли ошибка SQLite блокировкой базы другим соединением (SQLITE_BUSY или SQLITE_LOCKED)"""
+    # Расширенные коды (например, SQLITE_BUSY_SNAPSHOT) хранят основной код в младшем байте
+    return isinstance(exc, sqlite3.OperationalError) and (getattr(exc, "sqlite_errorcode", 0) & 0xFF) in (
+        sqlite3.SQLITE_BUSY,
+        sqlite3.SQLITE_LOCKED,
+    )
+
+
+def retry_busy(action, config, on_retry=None):
+    """Выполняет действие, повторяя его, пока база заблокирована другим соединением
+
+    Повторять можно только действие, которое при ошибке ничего не меняет: начало транзакции или
+    отдельную команду вне транзакции. Ожидание внутри SQLite (busy_timeout) покрывает обычные случаи,
+    а повторы - те, в которых SQLite возвращает SQLITE_BUSY сразу, например при восстановлении WAL
+    другим процессом или смене режима журнала.
+
+    Args:
+        action (callable): функция без аргументов
+        config (StorageConfig): настройки с количеством повторов и паузой между ними
+        on_retry (callable, optional): вызывается перед каждым повтором
+
+    Returns:
+        object: результат действия
+
+    Raises:
+        DatabaseBusy: если база осталась заблокированной после всех повторов
+    """
+    delay = config.busy_backoff
+    for attempt in range(config.busy_retries + 1):
+        try:
+            return action()
+        except sqlite3.OperationalError as exc:
+            if not is_busy(exc):
+                raise
+            if attempt == config.busy_retries:
+                raise DatabaseBusy(f"База данных заблокирована другим соединением: {exc}") from exc
+        if on_retry is not None:
+            on_retry()
+        time.sleep(delay)
+        delay *= 2
+
+
+# Метки времени хранятся числами и читаются как datetime (см. timestamps)
+register_timestamps()
+
+
+def is_memory(db_file):
+    """Проверяет, указывает ли путь на базу данных в памяти"""
+    return db_file == ":memory:"
+
+
+def connect(db_file, config, read_only=False, factory=sqlite3.Connection):
+    """Открывает соединение с базой данных и настраивает его согласно конфигурации
+
+    Args:
+        db_file (str): путь к файлу базы данных или ":memory:"
+        config (StorageConfig): настройки хранилища
+        read_only (bool): открыть соединение только для чтения
+        factory (type): класс соединения, подкласс sqlite3.Connection
+
+    Returns:
+        sqlite3.Connection: настроенное соединение
+    """
+    if read_only and not is_memory(db_file):
+        uri = f"{Path(db_file).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            timeout=config.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            factory=factory,
+        )
+    else:
+        conn = sqlite3.connect(
+            db_file,
+            timeout=config.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            factory=factory,
+        )
+        # Режим auto_vacuum можно выбрать только для новой базы до первой записи в файл (в том числе
+        # до перехода в WAL). У существующих баз эта настройка ничего не меняет
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # Режим журнала хранится в самом файле, поэтому его достаточно выставить пишущему соединению.
+        # Смена режима требует монопольной блокировки, и при одновременном запуске нескольких
+        # процессов ее может держать другой процесс
+        retry_busy(lambda: conn.execute(f"PRAGMA journal_mode = {config.journal_mode}").fetchall(), config)
+    for name, value in config.pragmas():
+        conn.execute(f"PRAGMA {name} = {value}")
+    # Внешние ключи в SQLite по умолчанию выключены для каждого соединения. Без них не работает
+    # каскадное удаление карточек вместе с темой
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
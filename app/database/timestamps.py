@@ -0,0 +1,78 @@
+"""Хранение меток времени целыми числами.
+
+Метки времени (created_at, updated_at, last_reviewed_at, due_at) хранятся в колонках типа TIMESTAMP_US
+как количество микросекунд от 1970-01-01T00:00:00 по тем же локальным часам без часового пояса, в
+которых приложение всегда работало с датами. Целое число занимает в записи до 8 байт вместо 19-26
+символов ISO-строки, а сравнение в индексе и в условиях WHERE - сравнение чисел.
+
+Значения для записи и сравнения передаются в параметры запросов уже числами (to_timestamp): адаптер
+datetime для всего модуля sqlite3 не регистрируется, чтобы не менять поведение других пользователей
+sqlite3 в процессе. Конвертер (соединения открываются с detect_types=PARSE_DECLTYPES) возвращает из
+колонок TIMESTAMP_US объекты datetime. Он срабатывает только для этого объявленного типа, поэтому
+другие базы не затрагивает. Микросекунды сохраняются полностью, поэтому datetime.isoformat(), orjson
+и Pydantic выдают ту же строку, что хранилась раньше.
+
+Время с часовым поясом, как и раньше при записи результата повторения, переводится в локальное время
+сервера, и пояс не сохраняется: "2024-01-01T10:00:00+03:00" при поясе сервера UTC возвращается
+в ответах как "2024-01-01T07:00:00".
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+from .scheduler import to_local_naive
+
+
+# Объявленный тип колонок с метками времени. По нему sqlite3 выбирает конвертер
+TIMESTAMP_TYPE = "TIMESTAMP_US"
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(0, 0, 1)
+
+
+def to_timestamp(value):
+    """Превращает момент времени в число микросекунд для хранения в базе
+
+    Время с часовым поясом сначала переводится в локальное, как при записи результата повторения.
+
+    Args:
+        value (datetime | str): момент времени или его ISO-представление
+
+    Returns:
+        int: микросекунды от 1970-01-01T00:00:00 по локальным часам
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (to_local_naive(value) - _EPOCH) // _MICROSECOND
+
+
+def from_timestamp(value):
+    """Превращает число микросекунд из базы в datetime без часового пояса"""
+    # Позиционные аргументы timedelta заметно быстрее именованного microseconds=, а конвертер
+    # вызывается для каждой метки времени каждой прочитанной строки
+    seconds, microseconds = divmod(value, 1_000_000)
+    return _EPOCH + timedelta(0, seconds, microseconds)
+
+
+def _convert(data):
+    """Конвертер sqlite3 для колонок TIMESTAMP_US
+
+    Строки, записанные до перехода на числа (например, процессом старой версии во время обновления),
+    разбираются как ISO-строки.
+    """
+    try:
+        return from_timestamp(int(data))
+    except ValueError:
+        return datetime.fromisoformat(data.decode())
+
+
+def register():
+    """Регистрирует конвертер TIMESTAMP_US в модуле sqlite3"""
+    sqlite3.register_converter(TIMESTAMP_TYPE, _convert)
+
+
+def json_default(value):
+    """Функция default для json.dumps: записывает datetime в формате isoformat"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Объект типа {type(value).__name__} не сериализуется в JSON")
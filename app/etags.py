@@ -0,0 +1,68 @@
+"""Вычисление ETag и разбор условных заголовков If-None-Match и If-Match.
+
+ETag отдельной записи - хэш ее полей, поэтому он меняется при любом изменении записи.
+ETag списка строится из версии области данных, которую триггеры базы увеличивают при каждой записи,
+и параметров запроса: так проверка актуальности списка не требует ни чтения, ни сериализации строк.
+"""
+
+import hashlib
+
+
+def row_etag(kind, row):
+    """Возвращает ETag отдельной записи
+
+    Args:
+        kind (str): тип записи, например "topic" или "flashcard"
+        row (tuple): строка из базы данных
+
+    Returns:
+        str: строгий ETag в кавычках
+    """
+    digest = hashlib.sha1(repr((kind, tuple(row))).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def collection_etag(scope, version, *params):
+    """Возвращает ETag списка записей
+
+    Args:
+        scope (str): область данных, версия которой определяет актуальность списка
+        version (int): текущая версия области
+        *params: параметры запроса, от которых зависит содержимое ответа (размер страницы, курсор)
+
+    Returns:
+        str: строгий ETag в кавычках
+    """
+    suffix = "-".join("" if param is None else str(param) for param in params)
+    return f'"{scope}-{version}-{suffix}"'
+
+
+def _opaque(tag):
+    """Отбрасывает признак слабого ETag W/ для слабого сравнения"""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(header, etag, strong=False):
+    """Проверяет, совпадает ли ETag с одним из перечисленных в заголовке If-None-Match или If-Match
+
+    If-None-Match использует слабое сравнение: признак W/ не учитывается. If-Match по RFC 9110
+    требует строгого сравнения: слабый ETag не совпадает ни с каким, в том числе с самим собой.
+
+    Args:
+        header (str | None): значение заголовка: "*" или список ETag через запятую
+        etag (str): текущий ETag ресурса
+        strong (bool, optional): использовать строгое сравнение (для If-Match). Defaults to False.
+
+    Returns:
+        bool: True, если заголовок содержит "*" или совпадающий ETag
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    if strong:
+        return not etag.startswith("W/") and any(tag == etag for tag in tags)
+    current = _opaque(etag)
+    return any(_opaque(tag) == current for tag in tags)
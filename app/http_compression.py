@@ -0,0 +1,410 @@
+"""Сжатие ответов: выбор кодировки по Accept-Encoding, промежуточный слой и кэш сжатых выгрузок.
+
+Списки карточек - однообразный JSON, который сжимается в несколько раз. CompressionMiddleware сжимает
+ответы с текстовыми типами (JSON, NDJSON, CSV) кодировкой, которую выбрал клиент: zstd или br, если
+установлены пакеты zstandard или brotli, иначе gzip из стандартной библиотеки. Ответы меньше
+минимального размера отправляются как есть: на них сжатие тратит время процессора, почти не сокращая
+передачу.
+
+Потоковые ответы (StreamingResponse) сжимаются по мере формирования. Сжатый поток сбрасывается в сеть
+каждые FLUSH_SIZE байт исходных данных, поэтому клиент получает данные частями, а степень сжатия почти
+не отличается от сжатия всего ответа сразу.
+
+Сжатый ответ - другое представление ресурса, поэтому его ETag становится слабым (W/"..."). Сравнение
+ETag в If-None-Match слабое, так что условные запросы продолжают работать, а ответ 304 возвращает
+клиенту слабый ETag, если тот подтверждает сохраненное сжатое представление.
+
+Выгрузки с одной и той же версией данных неизменны, поэтому PrecompressedCache хранит их сжатые тела
+по ETag и кодировке: повторная выгрузка не читает базу и не сжимает данные заново.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - необязательная зависимость
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - необязательная зависимость
+    brotli = None
+
+
+# Ответы меньше этого размера (в байтах) не сжимаются
+MINIMUM_SIZE = 1024
+# Сколько байт исходных данных потокового ответа сжимать перед сбросом сжатого потока в сеть
+FLUSH_SIZE = 64 * 1024
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class GzipEncoder:
+    """Потоковое сжатие gzip"""
+
+    name = "gzip"
+
+    def __init__(self, level=6):
+        # wbits=31 - формат gzip с заголовком и контрольной суммой
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=False):
+        """Сжимает очередную часть данных
+
+        Args:
+            data (bytes): исходные данные
+            flush (bool): сбросить сжатый поток, чтобы клиент мог разобрать все переданное до сих пор
+
+        Returns:
+            bytes: готовая часть сжатого потока, возможно пустая
+        """
+        output = self._compressor.compress(data)
+        if flush:
+            output += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return output
+
+    def finish(self):
+        """Завершает сжатый поток и возвращает его окончание"""
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class ZstdEncoder:
+    """Потоковое сжатие zstd (пакет zstandard)"""
+
+    name = "zstd"
+
+    def __init__(self, level=3):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data, flush=False):
+        """Сжимает очередную часть данных
+
+        Args:
+            data (bytes): исходные данные
+            flush (bool): сбросить сжатый поток, чтобы клиент мог разобрать все переданное до сих пор
+
+        Returns:
+            bytes: готовая часть сжатого потока, возможно пустая
+        """
+        output = self._compressor.compress(data)
+        if flush:
+            output += self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return output
+
+    def finish(self):
+        """Завершает сжатый поток и возвращает его окончание"""
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    """Потоковое сжатие brotli (пакет brotli)"""
+
+    name = "br"
+
+    def __init__(self, level=4):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data, flush=False):
+        """Сжимает очередную часть данных
+
+        Args:
+            data (bytes): исходные данные
+            flush (bool): сбросить сжатый поток, чтобы клиент мог разобрать все переданное до сих пор
+
+        Returns:
+            bytes: готовая часть сжатого потока, возможно пустая
+        """
+        output = self._compressor.process(data)
+        if flush:
+            output += self._compressor.flush()
+        return output
+
+    def finish(self):
+        """Завершает сжатый поток и возвращает его окончание"""
+        return self._compressor.finish()
+
+
+def available_encoders():
+    """Возвращает доступные кодировки в порядке предпочтения сервера
+
+    Returns:
+        dict: {название кодировки: класс кодировщика}
+    """
+    encoders = {}
+    if zstandard is not None:
+        encoders[ZstdEncoder.name] = ZstdEncoder
+    if brotli is not None:
+        encoders[BrotliEncoder.name] = BrotliEncoder
+    encoders[GzipEncoder.name] = GzipEncoder
+    return encoders
+
+
+ENCODERS = available_encoders()
+
+
+def negotiate(accept_encoding, encoders=ENCODERS):
+    """Выбирает кодировку ответа по заголовку Accept-Encoding
+
+    Выбирается кодировка с наибольшим весом q, при равных весах - первая в порядке предпочтения сервера.
+    Кодировки с q=0 запрещены, "*" задает вес для не перечисленных явно.
+
+    Args:
+        accept_encoding (str | None): значение заголовка Accept-Encoding
+        encoders (dict, optional): доступные кодировки в порядке предпочтения
+
+    Returns:
+        str | None: название кодировки или None, если ответ нужно отправить без сжатия
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name:
+            weights[name] = weight
+    default = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for name in encoders:
+        weight = weights.get(name, default)
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+def weak_etag(etag):
+    """Превращает ETag в слабый, если он еще не слабый"""
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+def is_compressible(headers):
+    """Проверяет, имеет ли смысл сжимать ответ с такими заголовками"""
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI-промежуточный слой, сжимающий ответы кодировкой, выбранной по Accept-Encoding"""
+
+    def __init__(self, app, minimum_size=MINIMUM_SIZE, encoders=ENCODERS):
+        """
+        Args:
+            app: следующее ASGI-приложение
+            minimum_size (int): ответы меньше этого размера не сжимаются
+            encoders (dict): доступные кодировки в порядке предпочтения
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = encoders
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"), self.encoders)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingSender(send, self.encoders[encoding], self.minimum_size, Headers(scope=scope))
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingSender:
+    """Функция send одного ответа: откладывает начало ответа, пока не станет ясно, нужно ли сжатие"""
+
+    def __init__(self, send, encoder, minimum_size, request_headers):
+        self._send = send
+        self._request_headers = request_headers
+        self._encoder_class = encoder
+        self._minimum_size = minimum_size
+        self._start = None
+        self._buffer = []
+        self._buffered = 0
+        # None - решение еще не принято, False - ответ идет без сжатия, иначе кодировщик
+        self._encoder = None
+        self._unflushed = 0
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            status = message["status"]
+            if status == 304:
+                await self._send_not_modified(message)
+                return
+            if status < 200 or status == 204 or not is_compressible(headers):
+                self._encoder = False
+                await self._send(message)
+                return
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._encoder is False:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._encoder is None:
+            self._buffer.append(body)
+            self._buffered += len(body)
+            if more_body and self._buffered < self._minimum_size:
+                return
+            body, self._buffer = b"".join(self._buffer), []
+            if self._buffered < self._minimum_size:
+                await self._start_plain()
+                await self._send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+            self._encoder = self._encoder_class()
+            if not more_body:
+                # Ответ целиком уже в памяти: сжимается сразу и отправляется с длиной
+                output = self._encoder.compress(body) + self._encoder.finish()
+                await self._start_compressed(len(output))
+                await self._send({"type": "http.response.body", "body": output, "more_body": False})
+                return
+            await self._start_compressed()
+
+        self._unflushed += len(body)
+        flush = more_body and self._unflushed >= FLUSH_SIZE
+        output = self._encoder.compress(body, flush=flush)
+        if flush:
+            self._unflushed = 0
+        if not more_body:
+            output += self._encoder.finish()
+        if output or not more_body:
+            await self._send({"type": "http.response.body", "body": output, "more_body": more_body})
+
+    async def _send_not_modified(self, message):
+        # У 304 нет тела, поэтому по нему не понять, было ли сжато подтверждаемое представление. Если клиент
+        # прислал слабый ETag, он сохранил сжатый ответ 200, и 304 возвращает ему тот же слабый валидатор.
+        # Ответы меньше порога сжатия уходили со строгим ETag, и он остается строгим.
+        self._encoder = False
+        headers = MutableHeaders(scope=message)
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag is not None:
+            sent = [tag.strip() for tag in self._request_headers.get("if-none-match", "").split(",")]
+            if weak_etag(etag) in sent:
+                headers["ETag"] = weak_etag(etag)
+        await self._send(message)
+
+    async def _start_plain(self):
+        self._encoder = False
+        headers = MutableHeaders(scope=self._start)
+        headers.add_vary_header("Accept-Encoding")
+        await self._send(self._start)
+
+    async def _start_compressed(self, content_length=None):
+        headers = MutableHeaders(scope=self._start)
+        headers["Content-Encoding"] = self._encoder.name
+        headers.add_vary_header("Accept-Encoding")
+        if "etag" in headers:
+            headers["ETag"] = weak_etag(headers["etag"])
+        if content_length is None:
+            # Длина сжатого тела заранее неизвестна: ответ идет частями без Content-Length
+            if "content-length" in headers:
+                del headers["content-length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        await self._send(self._start)
+
+
+class PrecompressedCache:
+    """Кэш сжатых тел неизменных ответов по ключу (ETag, кодировка) с вытеснением давно не использованных
+
+    Методы потокобезопасны: потоковые ответы заполняют кэш из пула потоков.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, encoders=ENCODERS):
+        """
+        Args:
+            max_bytes (int): суммарный размер хранимых тел. Тело больше max_bytes не кэшируется
+            encoders (dict): доступные кодировки
+        """
+        self.max_bytes = max_bytes
+        self.encoders = encoders
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, etag, encoding):
+        """Возвращает сжатое тело или None, если его нет в кэше"""
+        with self._lock:
+            body = self._entries.get((etag, encoding))
+            if body is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end((etag, encoding))
+            self._stats["hits"] += 1
+            return body
+
+    def put(self, etag, encoding, body):
+        """Сохраняет сжатое тело, вытесняя давно не использованные, если кэш переполнен"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop((etag, encoding), None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[(etag, encoding)] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def compress_stream(self, etag, encoding, chunks):
+        """Генератор сжатого потока, который после отправки целиком сохраняет его в кэш
+
+        Args:
+            etag (str): ETag неизменного ответа
+            encoding (str): кодировка из encoders
+            chunks (iterable): части исходного ответа, str или bytes
+
+        Yields:
+            bytes: части сжатого потока
+        """
+        encoder = self.encoders[encoding]()
+        parts, size, unflushed = [], 0, 0
+        for chunk in chunks:
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            unflushed += len(data)
+            flush = unflushed >= FLUSH_SIZE
+            output = encoder.compress(data, flush=flush)
+            if flush:
+                unflushed = 0
+            if output:
+                # Тело, которое все равно не поместится в кэш, не накапливается
+                if parts is not None:
+                    parts.append(output)
+                    size += len(output)
+                    if size > self.max_bytes:
+                        parts = None
+                yield output
+        output = encoder.finish()
+        yield output
+        if parts is not None:
+            parts.append(output)
+            self.put(etag, encoding, b"".join(parts))
+
+    def stats(self):
+        """Возвращает счетчики кэша
+
+        Returns:
+            dict: количество попаданий, промахов, вытеснений, записей и их суммарный размер в байтах
+        """
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._size}
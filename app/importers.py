@@ -0,0 +1,131 @@
+import csv
+import json
+from collections import deque
+
+from pydantic import ValidationError
+from schemas import FlashcardCreate
+
+
+class ImportDataError(ValueError):
+    """Ошибка разбора загружаемых данных с указанием номера записи"""
+
+    def __init__(self, position, detail):
+        super().__init__(f"Запись {position}: {detail}")
+        self.position = position
+        self.detail = detail
+
+
+def _decode(line_number, line):
+    """Декодирует строку тела запроса из UTF-8"""
+    try:
+        return line.rstrip(b"\r").decode("utf-8")
+    except UnicodeDecodeError as exc:
+        raise ImportDataError(line_number, f"строка не в кодировке UTF-8 (байт {exc.start + 1})") from exc
+
+
+async def iter_lines(stream):
+    """Асинхронно разбивает поток байтов тела запроса на строки, не загружая тело целиком
+
+    Перевод строки в UTF-8 не может оказаться внутри многобайтового символа, поэтому каждая строка
+    декодируется отдельно.
+
+    Args:
+        stream (AsyncIterator[bytes]): поток тела запроса (request.stream())
+
+    Raises:
+        ImportDataError: строка не в кодировке UTF-8. Позиция - номер строки
+
+    Yields:
+        str: очередная строка без символа перевода строки
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield _decode(line_number, line)
+    if buffer:
+        yield _decode(line_number + 1, buffer)
+
+
+def _validate(position, data):
+    """Проверяет одну запись по схеме FlashcardCreate"""
+    try:
+        flashcard = FlashcardCreate.model_validate(data)
+    except ValidationError as exc:
+        raise ImportDataError(position, exc.errors(include_url=False)) from exc
+    return flashcard.question, flashcard.answer, flashcard.difficulty_level
+
+
+async def parse_ndjson(lines):
+    """Разбирает JSON Lines: по одной карточке FlashcardCreate на строку
+
+    Yields:
+        tuple: (question, answer, difficulty_level)
+    """
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            flashcard = FlashcardCreate.model_validate_json(line)
+        except ValidationError as exc:
+            raise ImportDataError(line_number, exc.errors(include_url=False)) from exc
+        yield flashcard.question, flashcard.answer, flashcard.difficulty_level
+
+
+async def parse_csv(lines):
+    """Разбирает CSV с заголовком question,answer[,difficulty_level]
+
+    Строки передаются одному csv.reader, поэтому значения в кавычках могут содержать переводы строк.
+    Запись разбирается, когда в накопленных строках закрыты все кавычки: экранированная кавычка ""
+    не меняет четность их количества. Позиция ошибки - номер строки, на которой запись закончилась.
+
+    Yields:
+        tuple: (question, answer, difficulty_level)
+    """
+    pending = deque()
+    # Читатель берет строки из очереди по одной и вызывается, только когда в ней есть целая запись
+    reader = csv.reader(iter(pending.popleft, None))
+    header = None
+    quotes = 0
+    async for line in lines:
+        pending.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        quotes = 0
+        try:
+            row = next(reader)
+        except csv.Error as exc:
+            raise ImportDataError(reader.line_num, f"некорректный CSV: {exc}") from exc
+        if len(row) <= 1 and not "".join(row).strip():
+            continue
+        if header is None:
+            header = row
+            if not {"question", "answer"} <= set(header):
+                raise ImportDataError(reader.line_num, "в заголовке CSV должны быть колонки question и answer")
+            continue
+        data = {key: value for key, value in zip(header, row) if value != ""}
+        yield _validate(reader.line_num, data)
+    if pending:
+        raise ImportDataError(reader.line_num + len(pending), "некорректный CSV: не закрыта кавычка")
+
+
+async def parse_json(body):
+    """Разбирает JSON-массив карточек FlashcardCreate
+
+    Yields:
+        tuple: (question, answer, difficulty_level)
+    """
+    try:
+        items = json.loads(body)
+    except ValueError as exc:
+        raise ImportDataError(1, f"некорректный JSON: {exc}") from exc
+    if not isinstance(items, list):
+        raise ImportDataError(1, "ожидался JSON-массив карточек")
+    for index, item in enumerate(items):
+        yield _validate(index + 1, item)
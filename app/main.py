@@ -1,22 +1,226 @@
-from datetime import datetime
-from typing import List
-
-from database.database import SimpleDB
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+import logging
+import os
+import sqlite3
+import tempfile
+from contextlib import asynccontextmanager
+from itertools import islice
+from typing import List, Literal, Optional, Union
+
+from config import Settings
+from database.database import NearDuplicate, PreconditionFailed, SimpleDB, TopicNotFound, empty_topic_stats
+from database.export import EXPORT_FORMATS, export
+from database.lazy import LazySimpleDB
+from database.storage import DatabaseBusy
+from etags import collection_etag, etag_matches, row_etag
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, WebSocket
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from http_compression import CompressionMiddleware, PrecompressedCache, negotiate, weak_etag
+from importers import ImportDataError, iter_lines, parse_csv, parse_json, parse_ndjson
+from metrics import PROMETHEUS_MEDIA_TYPE, HttpMetrics, MetricsMiddleware, render_prometheus
 from schemas import (
+    BatchGetRequest,
+    FlashcardBatchResponse,
+    FlashcardBulkItem,
+    FlashcardBulkResponse,
     FlashcardCreate,
     FlashcardRead,
+    FlashcardSearchHit,
+    FlashcardSimilar,
     FlashcardUpdate,
+    ReviewCreate,
+    SyncResponse,
+    TopicBatchResponse,
     TopicCreate,
     TopicRead,
+    TopicStats,
     TopicUpdate,
+    TopicWithStats,
+)
+from serialization import (
+    dumps,
+    flashcard_dict,
+    json_response,
+    rows_response,
+    rows_stream_response,
+    search_hit_dict,
+    topic_dict,
 )
+from sessions import ReviewSession
 from starlette import status
+from starlette.background import BackgroundTask
+
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+# База открывается не при импорте, а при запуске каждого рабочего процесса (см. lifespan)
+db = LazySimpleDB(lambda: SimpleDB(**settings.database_options()))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Открывает соединения и применяет миграции при запуске процесса и закрывает базу при остановке
 
+    Если db заменен уже открытой базой (например, в тестах), ею управляет тот, кто ее создал.
+    """
+    lazy = isinstance(db, LazySimpleDB)
+    if lazy:
+        db.open()
+    try:
+        yield
+    finally:
+        if lazy:
+            db.close()
+
+
+app = FastAPI(lifespan=lifespan)
+metrics = HttpMetrics()
+# Сжатие добавляется первым и оказывается внутри слоя метрик: его время входит в длительность запроса
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+# Сжатые тела выгрузок по ETag: выгрузка одной версии данных не меняется
+export_cache = PrecompressedCache()
+
+# Максимальный размер страницы при постраничном чтении списков
+MAX_PAGE_SIZE = 1000
+# Сколько строк читать из базы за один запрос при потоковой выдаче
+STREAM_BATCH_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Максимальное количество карточек в очереди повторения за один запрос
+MAX_REVIEW_BATCH = 200
+# Через сколько секунд без сообщений сессия повторения записывает накопленные оценки
+SESSION_FLUSH_INTERVAL = 1.0
+# Код закрытия WebSocket, если тема сессии не найдена (коды 4000-4999 отведены приложениям)
+WS_TOPIC_NOT_FOUND = 4404
+# Сколько карточек накапливать перед записью в базу при массовой загрузке
+BULK_CHUNK_SIZE = 500
+# Сколько изменений отдавать за один запрос синхронизации по умолчанию
+SYNC_PAGE_SIZE = 500
+# Максимальное количество id в одном запросе нескольких записей
+MAX_BATCH_IDS = 1000
+# Список id через запятую в параметре ids
+IDS_PATTERN = r"^\d+(,\d+)*$"
+
+
+def wants_stream(request: Request, stream: bool):
+    """Проверяет, запросил ли клиент потоковую выдачу в формате NDJSON"""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_stream(rows, to_dict, limit=None):
+    """Генератор строк NDJSON: по одному JSON-объекту на строку
+
+    Строки отправляются пачками по STREAM_BATCH_SIZE: каждая часть ответа проходит через пул потоков
+    и цикл событий, поэтому отправка по одной строке многократно медленнее.
+
+    Args:
+        rows (iterable): ленивый итератор записей из базы
+        to_dict (callable): функция преобразования записи в словарь, например flashcard_dict
+        limit (int, optional): максимальное количество записей
+    """
+    rows = islice(rows, limit)
+    while True:
+        lines = [dumps(to_dict(row)) + b"\n" for row in islice(rows, STREAM_BATCH_SIZE)]
+        if not lines:
+            return
+        yield b"".join(lines)
 
-db = SimpleDB()
-app = FastAPI()
+
+async def export_response(request: Request, export_format, filename, topic_id=None):
+    """Формирует потоковый ответ с выгрузкой карточек в виде файла
+
+    ETag выгрузки строится из версии карточек, поэтому повторный запрос с If-None-Match получает 304,
+    а сжатое тело берется из export_cache без чтения базы. Выгрузка сжимается здесь, а не в
+    CompressionMiddleware, чтобы сжатый поток можно было сохранить в кэш.
+    """
+    scope = "flashcards" if topic_id is None else f"topic:{topic_id}"
+    etag = collection_etag(scope, await db.aio.get_version(scope), "export", export_format)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.{export_format}"',
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+    }
+    media_type = EXPORT_FORMATS[export_format]
+    encoding = negotiate(request.headers.get("accept-encoding"), export_cache.encoders)
+    if encoding is None:
+        return StreamingResponse(export(db, export_format, topic_id), media_type=media_type, headers=headers)
+    headers.update({"Content-Encoding": encoding, "ETag": weak_etag(etag)})
+    body = export_cache.get(etag, encoding)
+    if body is not None:
+        return Response(body, media_type=media_type, headers=headers)
+    chunks = export_cache.compress_stream(etag, encoding, export(db, export_format, topic_id))
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+def set_next_cursor(response: Response, page, limit):
+    """Добавляет заголовок X-Next-Cursor, если после текущей страницы могут быть еще записи"""
+    if len(page) == limit:
+        response.headers["X-Next-Cursor"] = str(page[-1][0])
+
+
+def batch_ids(ids):
+    """Проверяет количество id в запросе нескольких записей
+
+    Args:
+        ids (str | list): список id или строка id через запятую из параметра запроса
+
+    Raises:
+        HTTPException: генерируется, если запрошено больше MAX_BATCH_IDS id
+
+    Returns:
+        list: id в порядке запроса
+    """
+    if isinstance(ids, str):
+        ids = [int(record_id) for record_id in ids.split(",")]
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"За один запрос можно получить не больше {MAX_BATCH_IDS} записей",
+        )
+    return ids
+
+
+def batch_response(ids, rows, kind, to_dict):
+    """Формирует ответ на запрос нескольких записей по id
+
+    Каждому запрошенному id соответствует элемент ответа в том же порядке: найденная запись с ее ETag
+    или статус not_found. Отсутствие части записей не делает ошибочным весь запрос.
+
+    Args:
+        ids (list): запрошенные id
+        rows (dict): найденные записи {id: запись}
+        kind (str): тип записи ("topic" или "flashcard"), он же ключ записи в элементе ответа
+        to_dict (callable): функция преобразования записи в словарь, например flashcard_dict
+
+    Returns:
+        Response: JSON-ответ в формате TopicBatchResponse или FlashcardBatchResponse
+    """
+    items = []
+    for record_id in ids:
+        row = rows.get(record_id)
+        if row is None:
+            items.append({"id": record_id, "status": "not_found", "etag": None, kind: None})
+        else:
+            items.append({"id": record_id, "status": "found", "etag": row_etag(kind, row), kind: to_dict(row)})
+    found = sum(item["status"] == "found" for item in items)
+    return json_response({"found": found, "missing": len(items) - found, "items": items})
+
+
+def not_modified(request: Request, etag):
+    """Возвращает ответ 304, если у клиента уже есть актуальная версия ресурса, иначе None"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
+def if_match_precondition(kind, if_match):
+    """Возвращает проверку текущей записи на совпадение с ETag из заголовка If-Match или None без заголовка"""
+    if if_match is None:
+        return None
+    return lambda row: etag_matches(if_match, row_etag(kind, row), strong=True)
 
 
 # -- Обработка исключений --
@@ -26,6 +230,8 @@ async def general_exception_handler(request: Request, exc: Exception):
     Обработчик для всех остальных необработанных исключений (например, ZeroDivisionError, ValueError).
     Возвращает 500 с кастомным JSON-форматом.
     """
+    metrics.count_exception(exc)
+    logger.error("Необработанное исключение при обработке %s %s", request.method, request.url.path, exc_info=exc)
     reason_detail = str(exc)
 
     if not reason_detail:
@@ -36,21 +242,139 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 
-@app.get("/topics", response_model=List[TopicRead])
-async def read_topics():
+@app.exception_handler(sqlite3.IntegrityError)
+async def integrity_error_handler(request: Request, exc: sqlite3.IntegrityError):
+    """
+    Обработчик нарушений ограничений базы данных (например, попытки переименовать тему в уже существующую).
+    Возвращает 409 в том же JSON-формате, что и общий обработчик.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"status": 409, "reason": f"Нарушено ограничение целостности данных: {exc}"},
+    )
+
+
+@app.exception_handler(DatabaseBusy)
+async def database_busy_handler(request: Request, exc: DatabaseBusy):
+    """
+    Обработчик записей, не дождавшихся блокировки базы, которую держит другой процесс.
+    Возвращает 503 с заголовком Retry-After: запрос можно безопасно повторить, изменения не применены.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": 503, "reason": f"База данных занята, повторите запрос позже: {exc}"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(PreconditionFailed)
+async def precondition_failed_handler(request: Request, exc: PreconditionFailed):
+    """
+    Обработчик условных запросов, ETag из If-Match которых не совпал с текущей версией записи.
+    Возвращает 412 в том же JSON-формате, что и общий обработчик.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        content={"status": 412, "reason": f"Запись была изменена другим запросом: {exc}"},
+    )
+
+
+@app.exception_handler(TopicNotFound)
+async def topic_not_found_handler(request: Request, exc: TopicNotFound):
+    """
+    Обработчик изменений, ссылающихся на несуществующую тему (например, переноса карточки в удаленную тему).
+    Возвращает 422 в том же JSON-формате, что и общий обработчик.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+        content={"status": 422, "reason": str(exc)},
+    )
+
+
+@app.exception_handler(NearDuplicate)
+async def near_duplicate_handler(request: Request, exc: NearDuplicate):
+    """
+    Обработчик попыток создать карточку, слишком похожую на уже существующую.
+    Возвращает 409 в том же JSON-формате, что и общий обработчик, с id и похожестью найденной карточки.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"status": 409, "reason": str(exc), "flashcard_id": exc.flashcard[0], "similarity": exc.similarity},
+    )
+
+
+@app.get("/topics", response_model=Union[TopicBatchResponse, List[Union[TopicWithStats, TopicRead]]])
+async def read_topics(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    stream: bool = False,
+    include: Optional[Literal["stats"]] = None,
+    ids: Optional[str] = Query(None, pattern=IDS_PATTERN),
+):
     """Функция для чтения всех существующих тем
+
+    Args:
+        limit (int, optional): размер страницы. Без limit и after возвращаются все темы
+        after (int, optional): курсор - id последней темы предыдущей страницы
+        stream (bool, optional): отдавать темы потоком в формате NDJSON
+        include (str, optional): "stats" - добавить к каждой теме статистику ее карточек. Не применяется
+            к потоковой выдаче
+        ids (str, optional): id тем через запятую. Если задан, возвращаются только эти темы в формате
+            TopicBatchResponse, а остальные параметры не применяются
+
     Returns:
         List[TopicBase]: Pydantic-модель, представляющая все существующие темы
     """
-    topics = db.get_all_topics()
-    return [
-        TopicRead(id=topic[0], name=topic[1], description=topic[2], created_at=topic[3], updated_at=topic[4])
-        for topic in topics
-    ]
+    if ids is not None:
+        return await read_topics_batch(BatchGetRequest(ids=batch_ids(ids)))
+    if wants_stream(request, stream):
+        rows = db.iter_topics(batch_size=STREAM_BATCH_SIZE, after=after)
+        return StreamingResponse(ndjson_stream(rows, topic_dict, limit), media_type=NDJSON_MEDIA_TYPE)
+    # Статистика зависит от карточек и текущего времени (карточки к повторению), поэтому ответ с ней без ETag
+    if include is None:
+        # Версия читается до данных: если запись произойдет между ними, клиент получит новые данные со старым ETag
+        # и просто перечитает их при следующем запросе
+        etag = collection_etag("topics", await db.aio.get_version("topics"), limit, after)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        response.headers["ETag"] = etag
+    if limit is None and after is None:
+        if include is None:
+            return rows_stream_response(db.iter_topics(batch_size=STREAM_BATCH_SIZE), topic_dict, response)
+        topics = await db.aio.get_all_topics()
+    else:
+        limit = limit or MAX_PAGE_SIZE
+        topics = await db.aio.get_topics_page(after, limit)
+        set_next_cursor(response, topics, limit)
+    if include == "stats":
+        stats = await db.aio.get_topics_stats([topic[0] for topic in topics])
+        # Темы и статистика читаются разными запросами: тема, удаленная между ними, получает пустую статистику
+        return json_response(
+            [{**topic_dict(topic), "stats": stats.get(topic[0]) or empty_topic_stats(topic[0])} for topic in topics],
+            response,
+        )
+    return rows_response(topics, topic_dict, response)
+
+
+@app.post("/topics/batch-get", response_model=TopicBatchResponse)
+async def read_topics_batch(batch: BatchGetRequest):
+    """Функция для чтения нескольких тем по id одним запросом
+
+    Args:
+        batch (BatchGetRequest): id тем
+
+    Returns:
+        TopicBatchResponse: темы в порядке запрошенных id, для отсутствующих - статус not_found
+    """
+    ids = batch_ids(batch.ids)
+    return batch_response(ids, await db.aio.get_topics_by_ids(ids), "topic", topic_dict)
 
 
 @app.get("/topics/{topic_id}", response_model=TopicRead)
-async def read_topic(topic_id: int):
+async def read_topic(topic_id: int, request: Request, response: Response):
     """Функция возвращающая тему по его id номеру
 
     Args:
@@ -62,10 +386,35 @@ async def read_topic(topic_id: int):
     Returns:
         TopicRead: Pydantic-модель, представляющая тему с указанным id
     """
-    topic = db.get_topic(topic_id)
+    topic = await db.aio.get_topic(topic_id)
     if not topic:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
-    return TopicRead(id=topic[0], name=topic[1], description=topic[2], created_at=topic[3], updated_at=topic[4])
+    etag = row_etag("topic", topic)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    return TopicRead.from_row(topic)
+
+
+@app.get("/topics/{topic_id}/stats", response_model=TopicStats)
+async def read_topic_stats(topic_id: int):
+    """Функция, возвращающая статистику карточек темы без чтения самих карточек
+
+    Args:
+        topic_id (int): id темы
+
+    Raises:
+        HTTPException: 404, если тема не найдена
+
+    Returns:
+        TopicStats: количество карточек, распределение по сложности, карточки к повторению
+            и время последнего повторения
+    """
+    stats = await db.aio.get_topic_stats(topic_id)
+    if stats is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
+    return stats
 
 
 @app.post("/topics", response_model=TopicRead, status_code=201)
@@ -78,30 +427,38 @@ async def create_topics(topic: TopicCreate):
     Returns:
         TopicRead: Pydantic-модель, представляющая созданную тему.
     """
-    new_topic = db.create_topic(topic.name, topic.description)
-    return TopicRead(
-        id=new_topic[0], name=new_topic[1], description=new_topic[2], created_at=new_topic[3], updated_at=new_topic[4]
-    )
+    new_topic = await db.aio.create_topic(topic.name, topic.description)
+    return TopicRead.from_row(new_topic)
 
 
 @app.patch("/topics/{topic_id}", response_model=TopicRead)
-async def update_topic(topic_id: int, topic_update: TopicUpdate):
+async def update_topic(
+    topic_id: int, topic_update: TopicUpdate, response: Response, if_match: Optional[str] = Header(None)
+):
     """Функция, обновляющая существующую тему
 
     Args:
         topic_id (int): id темы
         topic_update (TopicUpdate): Pydantic-модель, содержащая новые данные для темы
+        if_match (str, optional): ETag, который должен быть у темы, чтобы обновление было применено
 
     Raises:
         HTTPException: генерирует ошибку, если такой темы не существует
+        PreconditionFailed: если тема изменилась и ETag из If-Match устарел
 
     Returns:
         TopicRead: Pydantic-модель, представляющая обновленную тему
     """
-    topic = db.update_topic(topic_id, topic_update.name, topic_update.description)
+    topic = await db.aio.update_topic(
+        topic_id,
+        topic_update.name,
+        topic_update.description,
+        precondition=if_match_precondition("topic", if_match),
+    )
     if not topic:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
-    return TopicRead(id=topic[0], name=topic[1], description=topic[2], created_at=topic[3], updated_at=topic[4])
+    response.headers["ETag"] = row_etag("topic", topic)
+    return TopicRead.from_row(topic)
 
 
 @app.delete("/topics/{topic_id}", status_code=202)
@@ -117,36 +474,167 @@ async def delete_topic(topic_id: int):
     Returns:
         object: информирование о успешном удалении
     """
-    if not db.delete_topic(topic_id):
+    if not await db.aio.delete_topic(topic_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
     return {"status": "accepted"}
 
 
-@app.get("/flashcards", response_model=List[FlashcardRead])
-async def read_flashcards():
+@app.get("/flashcards", response_model=Union[FlashcardBatchResponse, List[FlashcardRead]])
+async def read_flashcards(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    stream: bool = False,
+    ids: Optional[str] = Query(None, pattern=IDS_PATTERN),
+):
     """Функция для чтения всех существующих карточек
 
+    Args:
+        limit (int, optional): размер страницы. Без limit и after возвращаются все карточки
+        after (int, optional): курсор - id последней карточки предыдущей страницы
+        stream (bool, optional): отдавать карточки потоком в формате NDJSON
+        ids (str, optional): id карточек через запятую. Если задан, возвращаются только эти карточки в формате
+            FlashcardBatchResponse, а остальные параметры не применяются
+
     Returns:
         List[FlashcardRead]: Pydantic модель со списком всех существующих карточек
     """
-    flashcards = db.get_all_flashcards()
-    return [
-        FlashcardRead(
-            id=flashcard[0],
-            topic_id=flashcard[1],
-            question=flashcard[2],
-            answer=flashcard[3],
-            difficulty_level=flashcard[4],
-            last_reviewed_at=flashcard[5],
-            created_at=flashcard[6],
-            updated_at=flashcard[7],
-        )
-        for flashcard in flashcards
-    ]
+    if ids is not None:
+        return await read_flashcards_batch(BatchGetRequest(ids=batch_ids(ids)))
+    if wants_stream(request, stream):
+        rows = db.iter_flashcards(batch_size=STREAM_BATCH_SIZE, after=after)
+        return StreamingResponse(ndjson_stream(rows, flashcard_dict, limit), media_type=NDJSON_MEDIA_TYPE)
+    etag = collection_etag("flashcards", await db.aio.get_version("flashcards"), limit, after)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    if limit is None and after is None:
+        # Полный список отдается по мере чтения страницами: память не растет с числом карточек
+        return rows_stream_response(db.iter_flashcards(batch_size=STREAM_BATCH_SIZE), flashcard_dict, response)
+    limit = limit or MAX_PAGE_SIZE
+    flashcards = await db.aio.get_flashcards_page(after, limit)
+    set_next_cursor(response, flashcards, limit)
+    return rows_response(flashcards, flashcard_dict, response)
+
+
+@app.get("/flashcards/export")
+async def export_flashcards(request: Request, export_format: Literal["jsonl", "csv"] = Query("jsonl", alias="format")):
+    """Функция для потоковой выгрузки всех карточек
+
+    Args:
+        export_format (str): формат выгрузки: jsonl или csv
+
+    Returns:
+        StreamingResponse: файл с карточками, формируемый по мере чтения из базы
+    """
+    return await export_response(request, export_format, "flashcards")
+
+
+@app.get("/flashcards/search", response_model=List[FlashcardSearchHit])
+async def search_flashcards(
+    q: str = Query(..., min_length=1, max_length=500),
+    topic_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """Функция полнотекстового поиска карточек по вопросу и ответу
+
+    Args:
+        q (str): поисковый запрос. Карточка должна содержать все слова запроса
+        topic_id (int, optional): искать только в этой теме
+        limit (int): количество результатов на странице
+        offset (int): сколько результатов пропустить
+
+    Returns:
+        List[FlashcardSearchHit]: найденные карточки, от самых релевантных, с фрагментами текста,
+            в которых совпадения выделены тегом <mark>
+    """
+    hits = await db.aio.search_flashcards(q, topic_id=topic_id, limit=limit, offset=offset)
+    return rows_response(hits, search_hit_dict)
+
+
+@app.get("/export/snapshot")
+async def export_snapshot():
+    """Функция, возвращающая согласованный снимок всей базы данных в виде файла SQLite
+
+    Снимок создается online backup API SQLite во временном файле, который удаляется после отправки.
+
+    Returns:
+        FileResponse: файл снимка базы данных
+    """
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        await db.aio.backup(path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return FileResponse(
+        path,
+        media_type="application/vnd.sqlite3",
+        filename="flashcards-snapshot.db",
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+@app.get("/sync", response_model=SyncResponse)
+async def sync(since: int = Query(0, ge=0), limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """Функция, возвращающая темы и карточки, измененные после ревизии since, и id удаленных записей
+
+    Клиент начинает с since=0, получая все записи, и сохраняет next_since. Пока has_more равно True,
+    следующие изменения запрашиваются с since=next_since. Каждая запись попадает в ответ один раз,
+    в последнем состоянии.
+
+    Args:
+        since (int): последняя ревизия, которую клиент уже применил
+        limit (int): максимальное количество изменений в ответе
+
+    Returns:
+        SyncResponse: измененные записи, удаленные id и курсор для следующего запроса
+    """
+    changes = await db.aio.get_changes(since, limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    result = {
+        "since": since,
+        "next_since": changes[-1][0] if changes else since,
+        "has_more": has_more,
+        "topics": [],
+        "flashcards": [],
+        "deleted_topics": [],
+        "deleted_flashcards": [],
+    }
+    for _, entity, entity_id, deleted, row in changes:
+        if entity == "topic":
+            if deleted:
+                result["deleted_topics"].append(entity_id)
+            else:
+                result["topics"].append(topic_dict(row))
+        elif deleted:
+            result["deleted_flashcards"].append(entity_id)
+        else:
+            result["flashcards"].append(flashcard_dict(row))
+    return json_response(result)
+
+
+@app.post("/flashcards/batch-get", response_model=FlashcardBatchResponse)
+async def read_flashcards_batch(batch: BatchGetRequest):
+    """Функция для чтения нескольких карточек по id одним запросом
+
+    Args:
+        batch (BatchGetRequest): id карточек
+
+    Returns:
+        FlashcardBatchResponse: карточки в порядке запрошенных id, для отсутствующих - статус not_found
+    """
+    ids = batch_ids(batch.ids)
+    return batch_response(ids, await db.aio.get_flashcards_by_ids(ids), "flashcard", flashcard_dict)
 
 
 @app.get("/flashcards/{flashcard_id}", response_model=FlashcardRead)
-async def read_flashcard(flashcard_id: int):
+async def read_flashcard(flashcard_id: int, request: Request, response: Response):
     """Функция для чтения карточки по id
 
     Args:
@@ -158,28 +646,53 @@ async def read_flashcard(flashcard_id: int):
     Returns:
         FlashcardRead: Pydantic модель с карточкой
     """
-    flashcard = db.get_flashcard_by_id(flashcard_id)
+    flashcard = await db.aio.get_flashcard_by_id(flashcard_id)
     if not flashcard:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Карточка не найдена")
-    return FlashcardRead(
-        id=flashcard_id,
-        topic_id=flashcard[1],
-        question=flashcard[2],
-        answer=flashcard[3],
-        difficulty_level=flashcard[4],
-        last_reviewed_at=flashcard[5],
-        created_at=flashcard[6],
-        updated_at=flashcard[7],
-    )
+    etag = row_etag("flashcard", flashcard)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    return FlashcardRead.from_row(flashcard)
+
+
+@app.get("/flashcards/{flashcard_id}/similar", response_model=List[FlashcardSimilar])
+async def read_similar_flashcards(
+    flashcard_id: int,
+    threshold: float = Query(0.5, ge=0, le=1),
+    limit: int = Query(10, ge=1, le=100),
+):
+    """Функция, возвращающая карточки, похожие на карточку с указанным id
+
+    Args:
+        flashcard_id (int): id карточки
+        threshold (float, optional): минимальная похожесть текста от 0 до 1
+        limit (int, optional): максимальное количество карточек в ответе
+
+    Raises:
+        HTTPException: генерируется в случае, если карточка не найдена
+
+    Returns:
+        List[FlashcardSimilar]: похожие карточки по убыванию похожести
+    """
+    similar = await db.aio.get_similar_flashcards(flashcard_id, threshold, limit)
+    if similar is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Карточка не найдена")
+    return [FlashcardSimilar.from_pair(pair) for pair in similar]
 
 
 @app.post("/topics/{topic_id}/flashcards", response_model=FlashcardRead, status_code=201)
-async def create_flashcard(topic_id: int, flashcard: FlashcardCreate):
+async def create_flashcard(
+    topic_id: int, flashcard: FlashcardCreate, max_similarity: Optional[float] = Query(None, gt=0, le=1)
+):
     """Функция для создания новой карточки по определенной теме
 
     Args:
         topic_id (int): id темы карточки
         flashcard (FlashcardCreate): данные для новой карточки
+        max_similarity (float, optional): отклонить карточку, если уже есть карточка с похожестью текста
+            не меньше этого значения
 
     Raises:
         HTTPException: генерируется в случае, если тема не найдена
@@ -187,28 +700,97 @@ async def create_flashcard(topic_id: int, flashcard: FlashcardCreate):
     Returns:
         FlashcardRead: Pydantic модель с карточкой
     """
-    topic = db.get_topic(topic_id)
+    topic = await db.aio.get_topic(topic_id)
+    if not topic:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
+    new_flashcard = await db.aio.create_flashcard(
+        topic_id, flashcard.question, flashcard.answer, flashcard.difficulty_level, max_similarity
+    )
+    return FlashcardRead.from_row(new_flashcard)
+
+
+@app.post("/topics/{topic_id}/flashcards/bulk", response_model=FlashcardBulkResponse)
+async def create_flashcards_bulk(
+    topic_id: int, request: Request, max_similarity: Optional[float] = Query(None, gt=0, le=1)
+):
+    """Функция для массового создания карточек по определенной теме
+
+    Принимает JSON-массив карточек (application/json), JSON Lines (application/x-ndjson) или CSV
+    с заголовком question,answer[,difficulty_level] (text/csv). JSON Lines и CSV читаются из тела
+    запроса потоком и записываются в базу пачками по BULK_CHUNK_SIZE карточек, каждая пачка - одной
+    транзакцией. Если в данных встретится некорректная запись, уже записанные пачки сохраняются.
+
+    Args:
+        topic_id (int): id темы карточек
+        request (Request): запрос с карточками в теле
+        max_similarity (float, optional): не создавать карточки, похожесть текста которых на уже
+            существующие или загруженные раньше не меньше этого значения (статус "similar")
+
+    Raises:
+        HTTPException: 404, если тема не найдена, 415 для неподдерживаемого формата,
+            422 при ошибке в данных
+
+    Returns:
+        FlashcardBulkResponse: результат для каждой карточки в порядке загрузки и итоговые счетчики
+    """
+    topic = await db.aio.get_topic(topic_id)
     if not topic:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
-    new_flashcard = db.create_flashcard(topic_id, flashcard.question, flashcard.answer, flashcard.difficulty_level)
-    return FlashcardRead(
-        id=new_flashcard[0],
-        topic_id=new_flashcard[1],
-        question=new_flashcard[2],
-        answer=new_flashcard[3],
-        difficulty_level=new_flashcard[4],
-        last_reviewed_at=new_flashcard[5],
-        created_at=new_flashcard[6],
-        updated_at=new_flashcard[7],
+
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    if content_type in (NDJSON_MEDIA_TYPE, "application/jsonl"):
+        flashcards = parse_ndjson(iter_lines(request.stream()))
+    elif content_type == "text/csv":
+        flashcards = parse_csv(iter_lines(request.stream()))
+    elif content_type == "application/json":
+        flashcards = parse_json(await request.body())
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Неподдерживаемый формат данных"
+        )
+
+    results = []
+    chunk = []
+    try:
+        async for flashcard in flashcards:
+            chunk.append(flashcard)
+            if len(chunk) == BULK_CHUNK_SIZE:
+                results.extend(await db.aio.create_flashcards_bulk(topic_id, chunk, BULK_CHUNK_SIZE, max_similarity))
+                chunk = []
+        if chunk:
+            results.extend(await db.aio.create_flashcards_bulk(topic_id, chunk, BULK_CHUNK_SIZE, max_similarity))
+    except ImportDataError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail={"reason": str(exc), "position": exc.position, "imported": len(results)},
+        )
+
+    items = [FlashcardBulkItem(index=index, status=item[0], id=item[1]) for index, item in enumerate(results)]
+    return FlashcardBulkResponse(
+        created=sum(item.status == "created" for item in items),
+        existing=sum(item.status == "exists" for item in items),
+        duplicates=sum(item.status == "duplicate" for item in items),
+        similar=sum(item.status == "similar" for item in items),
+        items=items,
     )
 
 
 @app.get("/topics/{topic_id}/flashcards", response_model=List[FlashcardRead])
-async def read_flashcards_by_topic_id(topic_id: int):
+async def read_flashcards_by_topic_id(
+    topic_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    stream: bool = False,
+):
     """Функция для получения всех карточек по определенной теме
 
     Args:
         topic_id (int): id темы
+        limit (int, optional): размер страницы. Без limit и after возвращаются все карточки темы
+        after (int, optional): курсор - id последней карточки предыдущей страницы
+        stream (bool, optional): отдавать карточки потоком в формате NDJSON
 
     Raises:
         HTTPException: генерируется в случае, если тема не найдена
@@ -216,56 +798,143 @@ async def read_flashcards_by_topic_id(topic_id: int):
     Returns:
         List[FlashcardRead]: Pydantic модель со всеми карточками по запрошенной теме
     """
-    topic = db.get_topic(topic_id)
+    topic = await db.aio.get_topic(topic_id)
     if not topic:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
-    flashcards = db.get_flashcards_by_topic(topic_id)
-    return [
-        FlashcardRead(
-            id=flashcard[0],
-            topic_id=flashcard[1],
-            question=flashcard[2],
-            answer=flashcard[3],
-            difficulty_level=flashcard[4],
-            last_reviewed_at=flashcard[5],
-            created_at=flashcard[6],
-            updated_at=flashcard[7],
-        )
-        for flashcard in flashcards
-    ]
+    if wants_stream(request, stream):
+        rows = db.iter_flashcards(batch_size=STREAM_BATCH_SIZE, topic_id=topic_id, after=after)
+        return StreamingResponse(ndjson_stream(rows, flashcard_dict, limit), media_type=NDJSON_MEDIA_TYPE)
+    scope = f"topic:{topic_id}"
+    etag = collection_etag(scope, await db.aio.get_version(scope), limit, after)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    if limit is None and after is None:
+        rows = db.iter_flashcards(batch_size=STREAM_BATCH_SIZE, topic_id=topic_id)
+        return rows_stream_response(rows, flashcard_dict, response)
+    limit = limit or MAX_PAGE_SIZE
+    flashcards = await db.aio.get_flashcards_page(after, limit, topic_id)
+    set_next_cursor(response, flashcards, limit)
+    return rows_response(flashcards, flashcard_dict, response)
+
+
+@app.get("/topics/{topic_id}/export")
+async def export_topic(
+    topic_id: int, request: Request, export_format: Literal["jsonl", "csv"] = Query("jsonl", alias="format")
+):
+    """Функция для потоковой выгрузки карточек определенной темы
+
+    Args:
+        topic_id (int): id темы
+        export_format (str): формат выгрузки: jsonl или csv
+
+    Raises:
+        HTTPException: генерируется в случае, если тема не найдена
+
+    Returns:
+        StreamingResponse: файл с карточками темы, формируемый по мере чтения из базы
+    """
+    topic = await db.aio.get_topic(topic_id)
+    if not topic:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
+    return await export_response(request, export_format, f"topic-{topic_id}", topic_id)
+
+
+@app.get("/topics/{topic_id}/review", response_model=List[FlashcardRead])
+async def read_review_queue(topic_id: int, limit: int = Query(20, ge=1, le=MAX_REVIEW_BATCH)):
+    """Функция, возвращающая следующие карточки темы, которые пора повторить
+
+    Args:
+        topic_id (int): id темы
+        limit (int): максимальное количество карточек
+
+    Raises:
+        HTTPException: генерируется в случае, если тема не найдена
+
+    Returns:
+        List[FlashcardRead]: карточки, упорядоченные по времени повторения, начиная с самых просроченных
+    """
+    topic = await db.aio.get_topic(topic_id)
+    if not topic:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тема не найдена")
+    flashcards = await db.aio.get_due_flashcards(topic_id, limit)
+    return rows_response(flashcards, flashcard_dict)
+
+
+@app.websocket("/topics/{topic_id}/session")
+async def review_session(
+    websocket: WebSocket,
+    topic_id: int,
+    prefetch: int = Query(10, ge=1, le=MAX_REVIEW_BATCH),
+    batch_size: int = Query(20, ge=1, le=MAX_REVIEW_BATCH),
+):
+    """Сессия повторения карточек темы через WebSocket (протокол описан в модуле sessions)
+
+    Args:
+        topic_id (int): id темы
+        prefetch (int): сколько карточек держать у клиента заранее
+        batch_size (int): сколько оценок накапливать перед записью одной транзакцией
+    """
+    await websocket.accept()
+    if not await db.aio.get_topic(topic_id):
+        await websocket.close(code=WS_TOPIC_NOT_FOUND, reason="Тема не найдена")
+        return
+    await ReviewSession(db, topic_id, prefetch, batch_size, SESSION_FLUSH_INTERVAL).run(websocket)
+
+
+@app.post("/flashcards/{flashcard_id}/review", response_model=FlashcardRead)
+async def review_flashcard(flashcard_id: int, review: ReviewCreate):
+    """Функция для записи результата повторения карточки
+
+    Args:
+        flashcard_id (int): id карточки
+        review (ReviewCreate): оценка ответа и время повторения
+
+    Raises:
+        HTTPException: генерируется, если карточка не найдена
+
+    Returns:
+        FlashcardRead: карточка с новым временем следующего повторения
+    """
+    flashcard = await db.aio.review_flashcard(flashcard_id, review.grade, review.reviewed_at)
+    if not flashcard:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Карточка не найдена")
+    return FlashcardRead.from_row(flashcard)
 
 
 @app.patch("/flashcards/{flashcard_id}", response_model=FlashcardRead)
-async def update_flashcard(flashcard_id: int, flashcard_update: FlashcardUpdate):
-    flashcard = db.update_flashcard(
+async def update_flashcard(
+    flashcard_id: int, flashcard_update: FlashcardUpdate, response: Response, if_match: Optional[str] = Header(None)
+):
+    """Функция для обновления карточки
+
+    Args:
+        flashcard_id (int): id карточки
+        flashcard_update (FlashcardUpdate): новые данные карточки
+        if_match (str, optional): ETag, который должен быть у карточки, чтобы обновление было применено
+
+    Raises:
+        HTTPException: генерируется, если карточка не найдена
+        PreconditionFailed: если карточка изменилась и ETag из If-Match устарел
+        TopicNotFound: если темы topic_id не существует
+
+    Returns:
+        FlashcardRead: обновленная карточка
+    """
+    flashcard = await db.aio.update_flashcard(
         flashcard_id,
         topic_id=flashcard_update.topic_id,
         question=flashcard_update.question,
         answer=flashcard_update.answer,
         difficulty_level=flashcard_update.difficulty_level,
         last_reviewed_at=flashcard_update.last_reviewed_at,
+        precondition=if_match_precondition("flashcard", if_match),
     )
     if not flashcard:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Карточка с указанным id не найдена")
-
-    last_reviewed_at_val = None
-    if flashcard[5]:
-        try:
-            last_reviewed_at_val = datetime.fromisoformat(flashcard[5])
-        except ValueError:
-            print(f"Warning: Could not parse last_reviewed_at: {flashcard[5]} for flashcard ID {flashcard[0]}")
-            last_reviewed_at_val = None
-
-    return FlashcardRead(
-        id=flashcard[0],
-        topic_id=flashcard[1],
-        question=flashcard[2],
-        answer=flashcard[3],
-        difficulty_level=flashcard[4],
-        last_reviewed_at=last_reviewed_at_val,
-        created_at=flashcard[6],
-        updated_at=flashcard[7],
-    )
+    response.headers["ETag"] = row_etag("flashcard", flashcard)
+    return FlashcardRead.from_row(flashcard)
 
 
 @app.delete("/flashcards/{flashcard_id}", status_code=202)
@@ -281,6 +950,17 @@ async def delete_flashcard(flashcard_id: int):
     Returns:
         object: сообщение об успехе удаления карточки
     """
-    if not db.delete_flashcard(flashcard_id):
+    if not await db.aio.delete_flashcard(flashcard_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Карточка не найдена")
     return {"status": "accepted"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Функция, возвращающая метрики API, запросов к базе данных, пулов соединений и кэша
+
+    Returns:
+        Response: метрики в текстовом формате Prometheus
+    """
+    # Метрики базы читаются запросами PRAGMA и COUNT, поэтому формируются на потоке базы данных
+    return Response(await db.aio.run(render_prometheus, metrics, db), media_type=PROMETHEUS_MEDIA_TYPE)
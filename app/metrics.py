@@ -0,0 +1,247 @@
+"""Метрики API и базы данных в текстовом формате Prometheus.
+
+MetricsMiddleware измеряет каждый запрос к API: общую длительность до отправки последнего фрагмента
+тела и время, которое заняли запросы к SQLite, выполненные при его обработке. Разница между ними -
+время построения ответа (модели, сериализация) и ожидания в очередях. Оба значения также
+возвращаются клиенту в заголовке Server-Timing.
+"""
+
+import threading
+import time
+
+from database.instrumentation import Histogram, request_timer
+from starlette.datastructures import MutableHeaders
+
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class HttpMetrics:
+    """Потокобезопасные счетчики и гистограммы запросов к API"""
+
+    def __init__(self):
+        self._durations = {}
+        self._db_durations = {}
+        self._db_queries = {}
+        self._exceptions = {}
+        self._in_progress = 0
+        self._lock = threading.Lock()
+
+    def start_request(self):
+        """Учитывает начало обработки запроса"""
+        with self._lock:
+            self._in_progress += 1
+
+    def finish_request(self, method, route, status_code, seconds, db_seconds, db_queries):
+        """Учитывает завершенный запрос
+
+        Args:
+            method (str): HTTP-метод
+            route (str): шаблон пути маршрута, например /topics/{topic_id}
+            status_code (int): код ответа
+            seconds (float): общая длительность обработки
+            db_seconds (float): суммарное время запросов к базе данных
+            db_queries (int): количество запросов к базе данных
+        """
+        with self._lock:
+            self._in_progress -= 1
+            key = (method, route, str(status_code))
+            self._durations.setdefault(key, Histogram()).observe(seconds)
+            self._db_durations.setdefault((method, route), Histogram()).observe(db_seconds)
+            self._db_queries[(method, route)] = self._db_queries.get((method, route), 0) + db_queries
+
+    def count_exception(self, exc):
+        """Учитывает необработанное исключение по имени его класса"""
+        name = type(exc).__name__
+        with self._lock:
+            self._exceptions[name] = self._exceptions.get(name, 0) + 1
+
+    def snapshot(self):
+        """Возвращает копию всех метрик
+
+        Returns:
+            dict: гистограммы длительности и времени базы по маршрутам, количество запросов к базе,
+                счетчики исключений и количество запросов в обработке
+        """
+        with self._lock:
+            return {
+                "durations": {key: (h.cumulative(), h.sum, h.count) for key, h in self._durations.items()},
+                "db_durations": {key: (h.cumulative(), h.sum, h.count) for key, h in self._db_durations.items()},
+                "db_queries": dict(self._db_queries),
+                "exceptions": dict(self._exceptions),
+                "in_progress": self._in_progress,
+            }
+
+
+class MetricsMiddleware:
+    """ASGI-промежуточный слой, измеряющий длительность запросов и время, проведенное в базе данных"""
+
+    def __init__(self, app, metrics):
+        """
+        Args:
+            app: следующее ASGI-приложение
+            metrics (HttpMetrics): куда записывать измерения
+        """
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = [0.0, 0]
+        token = request_timer.set(timer)
+        started = time.perf_counter()
+        status_code = 500
+        self.metrics.start_request()
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={timer[0] * 1000:.2f};desc="{timer[1]} queries", '
+                    f"total;dur={(time.perf_counter() - started) * 1000:.2f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timer.reset(token)
+            route = scope.get("route")
+            # Для путей без маршрута не используем сам путь, чтобы не плодить метки
+            path = getattr(route, "path", "unmatched")
+            self.metrics.finish_request(
+                scope["method"], path, status_code, time.perf_counter() - started, timer[0], timer[1]
+            )
+
+
+def _escape(value):
+    """Экранирует значение метки Prometheus"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    """Форматирует набор меток Prometheus"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+class _Writer:
+    """Собирает текст в формате Prometheus"""
+
+    def __init__(self):
+        self.lines = []
+
+    def header(self, name, kind, help_text):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name, value, **labels):
+        self.lines.append(f"{name}{_labels(**labels)} {value}")
+
+    def histogram(self, name, buckets, total, count, **labels):
+        for bound, cumulative in buckets:
+            self.sample(f"{name}_bucket", cumulative, **labels, le=_format_bound(bound))
+        self.sample(f"{name}_sum", total, **labels)
+        self.sample(f"{name}_count", count, **labels)
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_prometheus(http_metrics, db):
+    """Формирует текст всех метрик в формате Prometheus
+
+    Args:
+        http_metrics (HttpMetrics): метрики запросов к API
+        db (SimpleDB): база данных, метрики запросов, пулов соединений и кэша которой нужно выгрузить
+
+    Returns:
+        str: текст для ответа эндпоинта /metrics
+    """
+    http = http_metrics.snapshot()
+    out = _Writer()
+
+    out.header("flashmind_http_request_duration_seconds", "histogram", "Длительность обработки запросов к API")
+    for (method, route, status_code), (buckets, total, count) in sorted(http["durations"].items()):
+        labels = {"method": method, "route": route, "status": status_code}
+        out.histogram("flashmind_http_request_duration_seconds", buckets, total, count, **labels)
+    out.header("flashmind_http_request_db_seconds", "histogram", "Время запросов к базе данных за один запрос к API")
+    for (method, route), (buckets, total, count) in sorted(http["db_durations"].items()):
+        out.histogram("flashmind_http_request_db_seconds", buckets, total, count, method=method, route=route)
+    out.header("flashmind_http_request_db_queries_total", "counter", "Количество запросов к базе данных по маршрутам")
+    for (method, route), value in sorted(http["db_queries"].items()):
+        out.sample("flashmind_http_request_db_queries_total", value, method=method, route=route)
+    out.header("flashmind_http_requests_in_progress", "gauge", "Запросы к API, обрабатываемые в данный момент")
+    out.sample("flashmind_http_requests_in_progress", http["in_progress"])
+    out.header("flashmind_http_exceptions_total", "counter", "Необработанные исключения по типам")
+    for name, value in sorted(http["exceptions"].items()):
+        out.sample("flashmind_http_exceptions_total", value, type=name)
+
+    # Метка query - короткий ключ запроса, полный текст медленных запросов хранится в журнале QueryStats
+    queries = sorted(db.query_stats.snapshot().values(), key=lambda entry: entry["label"])
+    out.header("flashmind_db_query_duration_seconds", "histogram", "Длительность запросов к SQLite вместе с чтением")
+    for entry in queries:
+        out.histogram(
+            "flashmind_db_query_duration_seconds", entry["buckets"], entry["sum"], entry["count"], query=entry["label"]
+        )
+    out.header("flashmind_db_query_rows_total", "counter", "Строки, прочитанные или измененные запросами")
+    for entry in queries:
+        out.sample("flashmind_db_query_rows_total", entry["rows"], query=entry["label"])
+    out.header("flashmind_db_query_errors_total", "counter", "Запросы, завершившиеся ошибкой SQLite")
+    for entry in queries:
+        out.sample("flashmind_db_query_errors_total", entry["errors"], query=entry["label"])
+    out.header("flashmind_db_slow_queries_total", "counter", "Запросы дольше порога медленного запроса")
+    out.sample("flashmind_db_slow_queries_total", db.query_stats.slow_count)
+
+    pools = db.pool_stats()
+    for metric, key, kind, help_text in (
+        ("flashmind_db_pool_checkouts_total", "checkouts", "counter", "Выдачи соединений из пула"),
+        ("flashmind_db_pool_waits_total", "waits", "counter", "Ожидания свободного соединения"),
+        ("flashmind_db_pool_wait_seconds_total", "wait_time", "counter", "Суммарное время ожидания соединения"),
+        ("flashmind_db_pool_timeouts_total", "timeouts", "counter", "Ожидания, завершившиеся таймаутом"),
+        ("flashmind_db_pool_connections_open", "open", "gauge", "Открытые соединения"),
+        ("flashmind_db_pool_connections_in_use", "in_use", "gauge", "Соединения, выданные потокам"),
+    ):
+        out.header(metric, kind, help_text)
+        for pool, stats in pools.items():
+            out.sample(metric, stats[key], pool=pool)
+
+    out.header("flashmind_db_busy_retries_total", "counter", "Повторы записи из-за блокировки другим процессом")
+    out.sample("flashmind_db_busy_retries_total", db.busy_stats()["retries"])
+
+    if db.group_commit is not None:
+        group = db.group_commit.stats()
+        for metric, key, kind, help_text in (
+            ("flashmind_db_group_commit_batches_total", "batches", "counter", "Зафиксированные пачки изменений"),
+            ("flashmind_db_group_commit_operations_total", "operations", "counter", "Изменения в пачках"),
+            ("flashmind_db_group_commit_failed_batches_total", "failed_batches", "counter", "Незафиксированные пачки"),
+            ("flashmind_db_group_commit_seconds_total", "commit_time", "counter", "Суммарное время выполнения пачек"),
+            ("flashmind_db_group_commit_queued", "queued", "gauge", "Изменения, ожидающие фиксации"),
+        ):
+            out.header(metric, kind, help_text)
+            out.sample(metric, group[key])
+
+    storage = db.storage_stats()
+    out.header("flashmind_db_pages", "gauge", "Страницы файла базы данных")
+    out.sample("flashmind_db_pages", storage["page_count"])
+    out.header("flashmind_db_free_pages", "gauge", "Свободные страницы, которые может вернуть сжатие")
+    out.sample("flashmind_db_free_pages", storage["freelist_count"])
+
+    cache = db.cache_stats()
+    for key in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        out.header(f"flashmind_cache_{key}_total", "counter", f"Кэш чтения: {key}")
+        out.sample(f"flashmind_cache_{key}_total", cache[key])
+    out.header("flashmind_cache_size", "gauge", "Кэш чтения: количество записей")
+    out.sample("flashmind_cache_size", cache["size"])
+    return out.text()
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, List, Literal, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class TopicBase(BaseModel):
@@ -34,6 +34,36 @@ class TopicRead(TopicBase):
     class Config:
         orm_mode = True
 
+    @classmethod
+    def from_row(cls, row):
+        """Создает схему из записи таблицы topics"""
+        return cls(id=row[0], name=row[1], description=row[2], created_at=row[3], updated_at=row[4])
+
+
+class DifficultyBucket(BaseModel):
+    """Количество карточек темы на одном уровне сложности"""
+
+    difficulty_level: int
+    card_count: int
+
+
+class TopicStats(BaseModel):
+    """Схема сводной статистики карточек темы"""
+
+    topic_id: int
+    card_count: int
+    average_difficulty: Optional[float] = None
+    difficulty_histogram: List[DifficultyBucket]
+    due_count: int = Field(description="Карточки, которые пора повторить")
+    overdue_count: int = Field(description="Карточки, которые нужно было повторить до начала текущего дня")
+    last_reviewed_at: Optional[datetime] = None
+
+
+class TopicWithStats(TopicRead):
+    """Схема темы вместе со статистикой ее карточек"""
+
+    stats: TopicStats
+
 
 class FlashcardBase(BaseModel):
     """Базовая схема для карточки"""
@@ -56,7 +86,9 @@ class FlashcardUpdate(BaseModel):
     question: Optional[str] = None
     answer: Optional[str] = None
     difficulty_level: Optional[int] = None
-    last_reviewed_at: Optional[datetime] = None
+    last_reviewed_at: Optional[datetime] = Field(
+        None, description="Время с часовым поясом сохраняется как локальное время сервера без пояса"
+    )
 
 
 class FlashcardRead(FlashcardBase):
@@ -67,6 +99,141 @@ class FlashcardRead(FlashcardBase):
     last_reviewed_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
+    due_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
+
+    @classmethod
+    def from_row(cls, row):
+        """Создает схему из записи таблицы flashcards"""
+        return cls(
+            id=row[0],
+            topic_id=row[1],
+            question=row[2],
+            answer=row[3],
+            difficulty_level=row[4],
+            last_reviewed_at=row[5],
+            created_at=row[6],
+            updated_at=row[7],
+            due_at=row[8],
+        )
+
+
+class FlashcardSearchHit(FlashcardRead):
+    """Схема результата полнотекстового поиска карточек"""
+
+    rank: float
+    snippet: str
+
+    @classmethod
+    def from_row(cls, row):
+        """Создает схему из записи карточки с добавленными в конце релевантностью и фрагментом текста"""
+        return cls(**FlashcardRead.from_row(row).model_dump(), rank=row[-2], snippet=row[-1])
+
+
+class FlashcardSimilar(FlashcardRead):
+    """Схема карточки, похожей на заданную"""
+
+    similarity: float = Field(description="Коэффициент Жаккара трехсимвольных шинглов вопроса и ответа")
+
+    @classmethod
+    def from_pair(cls, pair):
+        """Создает схему из пары (запись карточки, похожесть)"""
+        flashcard, similarity = pair
+        return cls(**FlashcardRead.from_row(flashcard).model_dump(), similarity=similarity)
+
+
+class ReviewCreate(BaseModel):
+    """Схема для записи результата повторения карточки"""
+
+    grade: int = Field(ge=0, le=5, description="Оценка ответа: 0-2 - не вспомнил, 3 - с трудом, 5 - легко")
+    reviewed_at: Optional[datetime] = None
+
+
+class FlashcardBulkItem(BaseModel):
+    """Результат массового создания для одной карточки"""
+
+    index: int
+    status: Literal["created", "exists", "duplicate", "similar"]
+    id: int
+
+
+class FlashcardBulkResponse(BaseModel):
+    """Схема ответа на массовое создание карточек"""
+
+    created: int
+    existing: int
+    duplicates: int
+    similar: int = 0
+    items: List[FlashcardBulkItem]
+
+
+class BatchGetRequest(BaseModel):
+    """Схема запроса нескольких записей по id"""
+
+    ids: List[int] = Field(min_length=1, description="id записей. Порядок ответа совпадает с порядком id")
+
+
+class TopicBatchItem(BaseModel):
+    """Результат чтения одной темы из запроса нескольких тем"""
+
+    id: int
+    status: Literal["found", "not_found"]
+    etag: Optional[str] = None
+    topic: Optional[TopicRead] = None
+
+
+class TopicBatchResponse(BaseModel):
+    """Схема ответа на запрос нескольких тем по id"""
+
+    found: int
+    missing: int
+    items: List[TopicBatchItem]
+
+
+class FlashcardBatchItem(BaseModel):
+    """Результат чтения одной карточки из запроса нескольких карточек"""
+
+    id: int
+    status: Literal["found", "not_found"]
+    etag: Optional[str] = None
+    flashcard: Optional[FlashcardRead] = None
+
+
+class FlashcardBatchResponse(BaseModel):
+    """Схема ответа на запрос нескольких карточек по id"""
+
+    found: int
+    missing: int
+    items: List[FlashcardBatchItem]
+
+
+class SyncResponse(BaseModel):
+    """Схема ответа на запрос изменений для синхронизации клиента"""
+
+    since: int
+    next_since: int = Field(description="Ревизия, которую нужно передать в since при следующем запросе")
+    has_more: bool = Field(description="Есть ли еще изменения после next_since")
+    topics: List[TopicRead]
+    flashcards: List[FlashcardRead]
+    deleted_topics: List[int]
+    deleted_flashcards: List[int]
+
+
+class SessionGrade(BaseModel):
+    """Сообщение сессии повторения с оценкой карточки"""
+
+    type: Literal["grade"]
+    id: int
+    grade: int = Field(ge=0, le=5, description="Оценка ответа: 0-2 - не вспомнил, 3 - с трудом, 5 - легко")
+    reviewed_at: Optional[datetime] = Field(None, description="Время ответа. По умолчанию - время получения оценки")
+
+
+class SessionCommand(BaseModel):
+    """Сообщение сессии повторения: записать накопленные оценки (flush) или завершить сессию (end)"""
+
+    type: Literal["flush", "end"]
+
+
+SessionMessage = Annotated[Union[SessionGrade, SessionCommand], Field(discriminator="type")]
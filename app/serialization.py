@@ -0,0 +1,139 @@
+"""Быстрая сериализация строк базы данных в JSON для списков.
+
+Строки таблиц отображаются в словари с теми же полями и в том же порядке, что и у схем TopicRead и
+FlashcardRead, и сразу превращаются в байты, минуя создание и повторную проверку Pydantic-моделей.
+Метки времени приходят из базы объектами datetime (см. database.timestamps). orjson записывает их
+в том же формате, что datetime.isoformat() и Pydantic-модель, поэтому ответы не отличаются.
+"""
+
+import json
+from itertools import islice
+
+from database.timestamps import json_default
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson указан в requirements.txt
+    orjson = None
+
+
+def dumps(content):
+    """Сериализует объект в компактный JSON в кодировке UTF-8
+
+    Args:
+        content (object): словари, списки и скалярные значения
+
+    Returns:
+        bytes: JSON-представление объекта
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=json_default).encode("utf-8")
+
+
+def topic_dict(row):
+    """Преобразует запись таблицы topics в словарь в формате схемы TopicRead"""
+    return {"name": row[1], "description": row[2], "id": row[0], "created_at": row[3], "updated_at": row[4]}
+
+
+def flashcard_dict(row):
+    """Преобразует запись таблицы flashcards в словарь в формате схемы FlashcardRead"""
+    return {
+        "question": row[2],
+        "answer": row[3],
+        "difficulty_level": row[4],
+        "id": row[0],
+        "topic_id": row[1],
+        "last_reviewed_at": row[5],
+        "created_at": row[6],
+        "updated_at": row[7],
+        "due_at": row[8],
+    }
+
+
+def search_hit_dict(row):
+    """Преобразует результат полнотекстового поиска в словарь в формате схемы FlashcardSearchHit"""
+    hit = flashcard_dict(row)
+    hit["rank"] = row[-2]
+    hit["snippet"] = row[-1]
+    return hit
+
+
+def json_response(content, response=None, status_code=200):
+    """Формирует JSON-ответ из уже подготовленных словарей
+
+    Args:
+        content (object): содержимое ответа
+        response (Response, optional): ответ, переданный в обработчик FastAPI. Его заголовки (например, ETag
+            и X-Next-Cursor) переносятся в итоговый ответ
+        status_code (int, optional): код ответа. Defaults to 200.
+
+    Returns:
+        Response: ответ с телом в формате JSON
+    """
+    headers = dict(response.headers) if response is not None else None
+    return Response(dumps(content), status_code=status_code, headers=headers, media_type="application/json")
+
+
+def rows_response(rows, to_dict, response=None):
+    """Формирует JSON-ответ со списком записей базы данных
+
+    Args:
+        rows (iterable): строки из базы данных
+        to_dict (callable): функция преобразования строки в словарь, например flashcard_dict
+        response (Response, optional): ответ, переданный в обработчик FastAPI, заголовки которого нужно сохранить
+
+    Returns:
+        Response: ответ с JSON-массивом записей
+    """
+    return json_response([to_dict(row) for row in rows], response)
+
+
+def iter_json_array(rows, to_dict, batch_size=500):
+    """Генератор частей JSON-массива записей
+
+    Записи сериализуются пачками по batch_size, поэтому в памяти одновременно находятся не больше
+    batch_size словарей и байты одной пачки, а не весь ответ.
+
+    Args:
+        rows (iterable): записи из базы данных, например ленивый SimpleDB.iter_flashcards
+        to_dict (callable): функция преобразования записи в словарь, например flashcard_dict
+        batch_size (int, optional): сколько записей сериализовать за раз. Defaults to 500.
+
+    Yields:
+        bytes: части массива, которые вместе образуют тот же JSON, что и rows_response
+    """
+    rows = iter(rows)
+    separator = b"["
+    while True:
+        batch = [to_dict(row) for row in islice(rows, batch_size)]
+        if not batch:
+            break
+        # Сериализуется список пачки целиком, а его скобки отбрасываются
+        yield separator + dumps(batch)[1:-1]
+        separator = b","
+    yield b"]" if separator == b"," else b"[]"
+
+
+def rows_stream_response(rows, to_dict, response=None, batch_size=500):
+    """Формирует потоковый JSON-ответ со списком записей базы данных
+
+    Тело совпадает с rows_response, но формируется по мере чтения rows. Синхронный итератор
+    Starlette перебирает в пуле потоков, поэтому чтение из базы не блокирует цикл событий.
+
+    Args:
+        rows (iterable): записи из базы данных
+        to_dict (callable): функция преобразования записи в словарь
+        response (Response, optional): ответ, переданный в обработчик FastAPI, заголовки которого нужно сохранить
+        batch_size (int, optional): сколько записей сериализовать за раз. Defaults to 500.
+
+    Returns:
+        StreamingResponse: ответ с JSON-массивом записей
+    """
+    headers = dict(response.headers) if response is not None else None
+    return StreamingResponse(
+        iter_json_array(rows, to_dict, batch_size), headers=headers, media_type="application/json"
+    )
@@ -0,0 +1,205 @@
+"""Сессия повторения карточек темы через WebSocket.
+
+Вместо цикла "GET карточки - POST оценки" клиент открывает одно соединение. Сервер сразу отправляет
+prefetch карточек, которые пора повторить, и по мере оценок досылает следующие, поэтому у клиента
+всегда есть карточка для показа, а задержка на карточку - один обмен сообщениями. Оценки копятся
+в памяти и записываются одной транзакцией по batch_size штук, через flush_interval секунд без новых
+оценок, по команде клиента и при закрытии соединения.
+
+Сообщения - JSON-объекты с полем type.
+
+От клиента:
+    {"type": "grade", "id": 1, "grade": 4, "reviewed_at": "..."} - оценка карточки, reviewed_at необязателен
+    {"type": "flush"} - записать накопленные оценки сейчас
+    {"type": "end"} - записать оценки и завершить сессию
+
+От сервера:
+    {"type": "cards", "cards": [...]} - первые карточки сессии
+    {"type": "graded", "id": 1, "pending": 3, "cards": [...]} - оценка принята, cards - досланные карточки
+    {"type": "saved", "flashcards": [...]} - оценки записаны, карточки с новым временем повторения
+    {"type": "error", "detail": "..."} - сообщение отклонено, сессия продолжается
+    {"type": "summary", "reviewed": 10} - ответ на end, после него сервер закрывает соединение
+
+Карточки, отправленные клиенту или оцененные, но еще не записанные, повторно не отправляются.
+
+Оценка сохранена только после сообщения saved. Если запись не удалась, оценки остаются в очереди
+и записываются при следующей попытке, а клиент получает error с id еще не записанных карточек.
+Если не удалась запись при закрытии соединения, оценки записываются в журнал: карточки остаются
+к повторению, и клиент может отправить их оценки в новой сессии. Бинарные сообщения не
+поддерживаются: сессия закрывается с кодом 1003.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+import anyio
+from pydantic import TypeAdapter, ValidationError
+from schemas import SessionGrade, SessionMessage
+from serialization import dumps, flashcard_dict
+from starlette.websockets import WebSocketDisconnect
+
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE = TypeAdapter(SessionMessage)
+
+# Код закрытия WebSocket для сообщений неподдерживаемого типа (RFC 6455)
+WS_UNSUPPORTED_DATA = 1003
+
+
+class ReviewSession:
+    """Состояние одной сессии повторения: отправленные карточки и накопленные оценки"""
+
+    def __init__(self, db, topic_id, prefetch=10, batch_size=20, flush_interval=1.0):
+        """
+        Args:
+            db (SimpleDB): база данных
+            topic_id (int): id темы
+            prefetch (int): сколько неоцененных карточек держать у клиента
+            batch_size (int): сколько оценок копить перед записью
+            flush_interval (float): через сколько секунд без сообщений записывать накопленные оценки
+        """
+        self.db = db
+        self.topic_id = topic_id
+        self.prefetch = prefetch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sent = set()
+        self.pending = []
+        self.reviewed = 0
+
+    async def refill(self):
+        """Читает карточки к повторению, чтобы у клиента снова было prefetch неоцененных
+
+        Returns:
+            list: новые карточки, которые нужно отправить клиенту
+        """
+        needed = self.prefetch - len(self.sent)
+        if needed <= 0:
+            return []
+        # Отправленные и еще не записанные карточки по-прежнему числятся к повторению, поэтому
+        # читается с запасом на них, а сами они отбрасываются
+        skip = self.sent | {review[0] for review in self.pending}
+        due = await self.db.aio.get_due_flashcards(self.topic_id, needed + len(skip))
+        cards = [card for card in due if card[0] not in skip][:needed]
+        self.sent.update(card[0] for card in cards)
+        return cards
+
+    def grade(self, message):
+        """Принимает оценку карточки в очередь записи
+
+        Args:
+            message (SessionGrade): сообщение с оценкой
+
+        Returns:
+            str | None: причина отказа или None, если оценка принята
+        """
+        if message.id not in self.sent:
+            return "Карточка не была отправлена в этой сессии или уже оценена"
+        self.sent.discard(message.id)
+        self.pending.append((message.id, message.grade, message.reviewed_at or datetime.now()))
+        return None
+
+    async def flush(self):
+        """Записывает накопленные оценки одной транзакцией
+
+        Если запись не удалась, оценки возвращаются в начало очереди и исключение передается дальше.
+
+        Returns:
+            list: обновленные карточки. Удаленные за время сессии карточки пропускаются
+        """
+        if not self.pending:
+            return []
+        pending, self.pending = self.pending, []
+        try:
+            reviewed = await self.db.aio.review_flashcards(pending)
+        except BaseException:
+            self.pending = pending + self.pending
+            raise
+        flashcards = [card for card in reviewed if card is not None]
+        self.reviewed += len(flashcards)
+        return flashcards
+
+    async def run(self, websocket):
+        """Обслуживает соединение до команды end или отключения клиента
+
+        Оценки, принятые до отключения, записываются и в случае разрыва соединения.
+
+        Args:
+            websocket (WebSocket): принятое соединение
+        """
+
+        async def send(message):
+            await websocket.send_text(dumps(message).decode())
+
+        async def save():
+            try:
+                flashcards = await self.flush()
+            except Exception:
+                logger.exception("Не удалось записать оценки сессии темы %s", self.topic_id)
+                ids = [review[0] for review in self.pending]
+                await send({"type": "error", "detail": "Оценки не записаны и будут записаны повторно", "pending": ids})
+                return
+            if flashcards:
+                await send({"type": "saved", "flashcards": [flashcard_dict(card) for card in flashcards]})
+
+        try:
+            await send({"type": "cards", "cards": [flashcard_dict(card) for card in await self.refill()]})
+            while True:
+                timeout = self.flush_interval if self.pending else None
+                try:
+                    received = await asyncio.wait_for(websocket.receive(), timeout)
+                except asyncio.TimeoutError:
+                    await save()
+                    continue
+                if received["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(received.get("code", 1000), received.get("reason"))
+                text = received.get("text")
+                if text is None:
+                    await websocket.close(code=WS_UNSUPPORTED_DATA, reason="Поддерживаются только текстовые сообщения")
+                    return
+                try:
+                    message = _MESSAGE.validate_json(text)
+                except ValidationError as exc:
+                    await send({"type": "error", "detail": exc.errors(include_url=False, include_context=False)})
+                    continue
+
+                if isinstance(message, SessionGrade):
+                    error = self.grade(message)
+                    if error:
+                        await send({"type": "error", "id": message.id, "detail": error})
+                        continue
+                    if len(self.pending) >= self.batch_size:
+                        await save()
+                    cards = await self.refill()
+                    await send(
+                        {
+                            "type": "graded",
+                            "id": message.id,
+                            "pending": len(self.pending),
+                            "cards": [flashcard_dict(card) for card in cards],
+                        }
+                    )
+                elif message.type == "flush":
+                    await save()
+                else:
+                    await save()
+                    await send({"type": "summary", "reviewed": self.reviewed})
+                    await websocket.close()
+                    return
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if self.pending:
+                try:
+                    # Сервер может отменить обработчик после отключения клиента, а принятые оценки
+                    # все равно должны быть записаны
+                    with anyio.CancelScope(shield=True):
+                        await self.flush()
+                except Exception:
+                    logger.exception(
+                        "Не удалось записать оценки закрытой сессии темы %s, оценки (id, оценка, время): %s",
+                        self.topic_id,
+                        self.pending,
+                    )
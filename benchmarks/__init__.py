@@ -0,0 +1,13 @@
+"""Бенчмарки FlashMind.
+
+Модули приложения импортируют друг друга как модули верхнего уровня (config, database, serialization),
+как при запуске сервера из каталога app, поэтому он добавляется в sys.path.
+"""
+
+import os
+import sys
+
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
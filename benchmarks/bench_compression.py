@@ -0,0 +1,93 @@
+"""Бенчмарк сжатия ответов: время процессора против сэкономленной передачи.
+
+Для колод типичных размеров строит тело ответа GET /topics/{topic_id}/flashcards (rows_response) и
+сжимает его каждой доступной кодировкой на нескольких уровнях. Печатает степень сжатия, время
+сжатия на сервере и распаковки на клиенте, а также полное время доставки ответа (сжатие, передача
+и распаковка) при разной пропускной способности канала в сравнении с передачей без сжатия.
+Строка "поток" - сжатие частями по FLUSH_SIZE со сбросом, как у потоковых ответов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_compression --sizes 50 200 1000 5000 --bandwidths 2 10 100
+"""
+
+import argparse
+import gzip
+import os
+import tempfile
+import time
+
+from app.database.database import SimpleDB
+from app.http_compression import FLUSH_SIZE, BrotliEncoder, GzipEncoder, ZstdEncoder, brotli, zstandard
+from app.serialization import flashcard_dict, rows_response
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, stopwatch
+
+
+def variants():
+    """Кодировки и уровни, которые сравниваются: (название, класс кодировщика, уровень, распаковка)"""
+    result = [(f"gzip-{level}", GzipEncoder, level, gzip.decompress) for level in (1, 6, 9)]
+    if zstandard is not None:
+        decompressor = zstandard.ZstdDecompressor()
+        decompress = lambda data: decompressor.decompressobj().decompress(data)  # noqa: E731
+        result += [(f"zstd-{level}", ZstdEncoder, level, decompress) for level in (1, 3, 9)]
+    if brotli is not None:
+        result += [(f"br-{level}", BrotliEncoder, level, brotli.decompress) for level in (1, 4, 11)]
+    return result
+
+
+def compress(encoder_class, level, body, streaming=False):
+    """Сжимает тело целиком или частями по FLUSH_SIZE со сбросом после каждой части"""
+    encoder = encoder_class(level)
+    if not streaming:
+        return encoder.compress(body) + encoder.finish()
+    parts = [encoder.compress(body[i : i + FLUSH_SIZE], flush=True) for i in range(0, len(body), FLUSH_SIZE)]
+    return b"".join(parts) + encoder.finish()
+
+
+def timed(func, *args, repeat=5):
+    """Возвращает результат функции и минимальное время выполнения из repeat запусков в секундах"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1_000, 5_000])
+    parser.add_argument("--bandwidths", type=float, nargs="+", default=[2, 10, 100], help="Мбит/с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SimpleDB(db_file=os.path.join(tmp, "bench.db"))
+        with stopwatch(f"Заполнение {max(args.sizes)} карточек"):
+            populate(db, 1, max(args.sizes), make_rng())
+        rows = db.get_flashcards_page(None, max(args.sizes))
+        db.close()
+
+    header = f"{'вариант':<12} {'размер, КБ':>11} {'степень':>8} {'сжатие, мс':>11} {'распаковка, мс':>15}"
+    header += "".join(f" {f'{bandwidth:g} Мбит/с, мс':>16}" for bandwidth in args.bandwidths)
+    for size in args.sizes:
+        body = rows_response(rows[:size], flashcard_dict).body
+        print(f"\nколода {size} карточек, JSON {len(body) / 1024:.1f} КБ")
+        print(header)
+        plain = f"{'без сжатия':<12} {len(body) / 1024:>11.1f} {1:>8.1f} {0:>11.2f} {0:>15.2f}"
+        print(plain + "".join(f" {len(body) * 8 / (bw * 1e6) * 1000:>16.1f}" for bw in args.bandwidths))
+        for name, encoder_class, level, decompress in variants():
+            for streaming in (False, True) if name == "gzip-6" else (False,):
+                label = f"{name} поток" if streaming else name
+                data, compress_time = timed(compress, encoder_class, level, body, streaming)
+                restored, decompress_time = timed(decompress, data)
+                assert restored == body
+                cpu = (compress_time + decompress_time) * 1000
+                line = (
+                    f"{label:<12} {len(data) / 1024:>11.1f} {len(body) / len(data):>8.1f} "
+                    f"{compress_time * 1000:>11.2f} {decompress_time * 1000:>15.2f}"
+                )
+                print(line + "".join(f" {cpu + len(data) * 8 / (bw * 1e6) * 1000:>16.1f}" for bw in args.bandwidths))
+
+
+if __name__ == "__main__":
+    main()
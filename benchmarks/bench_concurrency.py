@@ -0,0 +1,71 @@
+"""Бенчмарк задержек API под нагрузкой множества одновременных клиентов.
+
+Поднимает приложение под uvicorn поверх заранее заполненной базы и запускает конкурентных клиентов,
+которые вперемешку читают карточку по id (легкий запрос) и все карточки темы (тяжелый запрос).
+Если запросы к SQLite выполняются прямо в цикле событий, легкие запросы ждут окончания тяжелых,
+и это видно по p99.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_concurrency --clients 200 --requests 20
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from app.database.database import SimpleDB
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, print_table, spawn_server, summarize
+
+
+async def client_loop(client, rng, topics, cards, requests, samples):
+    """Один клиент: последовательно выполняет запросы и записывает их задержки"""
+    for _ in range(requests):
+        if rng.random() < 0.2:
+            kind, path = "heavy", f"/topics/{rng.randint(1, topics)}/flashcards"
+        else:
+            kind, path = "light", f"/flashcards/{rng.randint(1, cards)}"
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples[kind].append(time.perf_counter() - started)
+
+
+async def run_load(url, clients, requests, topics, cards):
+    rng = make_rng()
+    samples = {"light": [], "heavy": []}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(client_loop(client, make_rng(rng.random()), topics, cards, requests, samples) for _ in range(clients))
+        )
+        elapsed = time.perf_counter() - started
+    total = len(samples["light"]) + len(samples["heavy"])
+    print(f"{total} запросов за {elapsed:.2f} с, {total / elapsed:.0f} запросов/с")
+    print_table([(f"GET ({kind})", summarize(values)) for kind, values in samples.items()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20, help="запросов на одного клиента")
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--cards", type=int, default=20_000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SimpleDB(db_file=os.path.join(tmp, "flashcards.db"))
+        populate(db, args.topics, args.cards, make_rng())
+        db.close()
+        with spawn_server(tmp, port=args.port) as (url, _):
+            asyncio.run(run_load(url, args.clients, args.requests, args.topics, args.cards))
+
+
+if __name__ == "__main__":
+    main()
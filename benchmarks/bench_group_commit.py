@@ -0,0 +1,105 @@
+"""Бенчмарк групповой фиксации при большом потоке результатов повторения карточек.
+
+Открытая нагрузка: вызовы review_flashcard через асинхронный интерфейс поступают с заданной частотой
+независимо от того, успевает ли база их обрабатывать, а задержка считается от запланированного
+момента поступления. Поэтому, если база не справляется с частотой, очередь растет, и это видно
+по p99 и достигнутой пропускной способности, а не скрывается замедлением клиентов.
+
+Сравниваются обычная запись (транзакция на каждое изменение) и групповая фиксация при
+synchronous=NORMAL и synchronous=FULL (fsync при каждой фиксации).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_group_commit --rates 1000 10000 --seconds 3
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from app.database.database import SimpleDB
+from app.database.storage import StorageConfig
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, summarize
+
+
+async def offered_load(db, rate, seconds, cards, rng):
+    """Подает вызовы review_flashcard с частотой rate в секунду и возвращает задержки и время работы"""
+    total = int(rate * seconds)
+    samples = []
+    tasks = []
+
+    async def review(scheduled, flashcard_id, grade):
+        await db.aio.review_flashcard(flashcard_id, grade)
+        samples.append(time.perf_counter() - scheduled)
+
+    started = time.perf_counter()
+    sent = 0
+    while sent < total:
+        now = time.perf_counter()
+        # Запускаем все вызовы, время поступления которых уже наступило
+        due = min(total, int((now - started) * rate) + 1)
+        for i in range(sent, due):
+            tasks.append(asyncio.create_task(review(started + i / rate, rng.randint(1, cards), rng.randint(0, 5))))
+        sent = due
+        await asyncio.sleep(0.0005)
+    await asyncio.gather(*tasks)
+    return samples, time.perf_counter() - started
+
+
+def run_case(seed, path, synchronous, group_commit, rate, seconds, cards):
+    # Каждый случай начинается с одинаковой базы, чтобы интервалы повторения не накапливались между ними
+    shutil.copyfile(seed, path)
+    storage = StorageConfig(synchronous=synchronous)
+    db = SimpleDB(db_file=path, storage=storage, group_commit=group_commit, slow_query_ms=None)
+    try:
+        samples, elapsed = asyncio.run(offered_load(db, rate, seconds, cards, make_rng(rate)))
+        batches = db.group_commit.stats()["batches"] if group_commit else len(samples)
+    finally:
+        db.close()
+    summary = summarize(samples)
+    return {
+        "mode": "group" if group_commit else "default",
+        "synchronous": synchronous,
+        "rate": rate,
+        "achieved": len(samples) / elapsed,
+        "p50_ms": summary["p50_ms"],
+        "p99_ms": summary["p99_ms"],
+        "avg_batch": len(samples) / max(batches, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--cards", type=int, default=10_000)
+    parser.add_argument("--synchronous", nargs="+", default=["normal", "full"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        seed = os.path.join(workdir, "seed.db")
+        path = os.path.join(workdir, "flashcards.db")
+        seed_db = SimpleDB(db_file=seed)
+        populate(seed_db, 100, args.cards, make_rng())
+        seed_db.close()
+
+        print(
+            f"{'режим':<8} {'sync':<7} {'подано/с':>9} {'выполнено/с':>12} "
+            f"{'p50, мс':>9} {'p99, мс':>9} {'пачка':>7}"
+        )
+        for synchronous in args.synchronous:
+            for rate in args.rates:
+                for group_commit in (False, True):
+                    result = run_case(seed, path, synchronous, group_commit, rate, args.seconds, args.cards)
+                    print(
+                        f"{result['mode']:<8} {result['synchronous']:<7} {result['rate']:>9} "
+                        f"{result['achieved']:>12.0f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                        f"{result['avg_batch']:>7.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
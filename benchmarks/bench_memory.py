@@ -0,0 +1,63 @@
+"""Бенчмарк пиковой памяти сервера при выдаче полного списка карточек.
+
+Заполняет базу заданным количеством карточек, для каждого маршрута поднимает отдельный процесс uvicorn
+(пиковый RSS процесса только растет, поэтому маршруты не должны влиять друг на друга), выполняет один
+запрос, дочитывая ответ потоком без сохранения, и печатает пиковый RSS сервера до и после запроса,
+время ответа и его размер.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_memory --cards 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import httpx
+
+from app.database.database import SimpleDB
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, peak_rss_mb, spawn_server, stopwatch
+
+
+PATHS = ["/flashcards", "/flashcards?stream=true", "/flashcards?limit=1000"]
+
+
+def fetch(url):
+    """Выполняет GET-запрос и возвращает время ответа в секундах и размер тела в байтах"""
+    size = 0
+    started = time.perf_counter()
+    with httpx.stream("GET", url, timeout=600) as response:
+        response.raise_for_status()
+        for chunk in response.iter_raw():
+            size += len(chunk)
+    return time.perf_counter() - started, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=1_000_000)
+    parser.add_argument("--topics", type=int, default=1_000)
+    parser.add_argument("--paths", nargs="+", default=PATHS)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "flashcards.db")
+        db = SimpleDB(db_file=path)
+        with stopwatch(f"Заполнение {args.cards} карточек"):
+            populate(db, args.topics, args.cards, make_rng())
+        db.close()
+
+        print(f"{'маршрут':<28} {'RSS до, МБ':>11} {'пик RSS, МБ':>12} {'время, с':>9} {'ответ, МБ':>10}")
+        for route in args.paths:
+            with spawn_server(workdir, port=args.port, env={"FLASHMIND_DB_PATH": path}) as (url, process):
+                before = peak_rss_mb(process.pid)
+                elapsed, size = fetch(url + route)
+                peak = peak_rss_mb(process.pid)
+            print(f"{route:<28} {before:>11.0f} {peak:>12.0f} {elapsed:>9.2f} {size / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Бенчмарк вставки и поиска карточек с индексами и без них.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_schema --cards 1000000
+    python -m benchmarks.bench_schema --cards 1000000 --without-indexes
+
+Режим --without-indexes удаляет индексы после миграций и показывает стоимость полного перебора
+таблицы при поиске дубликатов, который раньше выполнялся при каждом создании темы и карточки.
+"""
+
+import argparse
+import os
+import tempfile
+from datetime import datetime
+
+from app.database.database import SimpleDB
+from app.database.timestamps import to_timestamp
+from benchmarks.common import make_rng, measure, print_table, random_text, stopwatch, summarize
+
+
+def populate(db, topics, cards, rng):
+    """Заполняет базу темами и карточками пачками через executemany"""
+    now = to_timestamp(datetime.now())
+    with db._write() as conn:
+        conn.executemany(
+            "INSERT INTO topics(name, description, created_at, updated_at) VALUES(?, NULL, ?, ?)",
+            ((f"topic-{i}", now, now) for i in range(topics)),
+        )
+    batch = 50_000
+    for start in range(0, cards, batch):
+        rows = [
+            (i % topics + 1, f"question-{i} {random_text(rng, 4)}", random_text(rng), 1, now, now)
+            for i in range(start, min(cards, start + batch))
+        ]
+        with db._write() as conn:
+            conn.executemany(
+                "INSERT INTO flashcards(topic_id, question, answer, difficulty_level, last_reviewed_at, created_at, updated_at) "
+                "VALUES(?, ?, ?, ?, NULL, ?, ?)",
+                rows,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=1_000_000)
+    parser.add_argument("--topics", type=int, default=1_000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--without-indexes", action="store_true", help="удалить индексы и измерить полный перебор")
+    args = parser.parse_args()
+
+    rng = make_rng()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SimpleDB(db_file=os.path.join(tmp, "bench.db"))
+        if args.without_indexes:
+            with db._write() as conn:
+                for index in ("ux_topics_name", "ux_flashcards_question", "ix_flashcards_topic_id"):
+                    conn.execute(f"DROP INDEX {index}")
+        with stopwatch(f"Заполнение {args.cards} карточек"):
+            populate(db, args.topics, args.cards, rng)
+
+        existing = [rng.randrange(args.cards) for _ in range(args.samples)]
+        with db._read() as conn:
+            questions = [
+                (conn.execute("SELECT question FROM flashcards WHERE id = ?", (i + 1,)).fetchone()[0],)
+                for i in existing
+            ]
+        topic_ids = [(rng.randint(1, args.topics),) for _ in range(args.samples)]
+        topic_names = [(f"topic-{rng.randrange(args.topics)}",) for _ in range(args.samples)]
+        new_cards = [(1, f"new-question-{i}", "answer") for i in range(args.samples)]
+        duplicate_cards = [(1, question, "answer") for (question,) in questions]
+
+        rows = []
+        if not args.without_indexes:
+            # Без уникальных индексов upsert невозможен, поэтому вставка измеряется только с индексами
+            rows += [
+                ("create_flashcard (новая)", summarize(measure(db.create_flashcard, new_cards))),
+                ("create_flashcard (дубликат)", summarize(measure(db.create_flashcard, duplicate_cards))),
+            ]
+        rows += [
+            ("get_flashcard_by_question", summarize(measure(db.get_flashcard_by_question, questions))),
+            ("get_topic_by_name", summarize(measure(db.get_topic_by_name, topic_names))),
+            ("get_flashcards_by_topic", summarize(measure(db.get_flashcards_by_topic, topic_ids))),
+        ]
+        print_table(rows)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Бенчмарк задержки полнотекстового поиска в зависимости от размера корпуса.
+
+Для каждого размера корпуса заполняет новую базу карточками со случайным текстом и измеряет
+поиск по одному слову, по двум словам и по одному слову внутри темы.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import tempfile
+
+from app.database.database import SimpleDB
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, measure, print_table, stopwatch, summarize
+
+
+def sample_words(db, rng, count):
+    """Выбирает слова из ответов случайных карточек, чтобы запросы гарантированно что-то находили"""
+    with db._read() as conn:
+        total = conn.execute("SELECT MAX(id) FROM flashcards").fetchone()[0]
+        answers = [
+            conn.execute("SELECT answer FROM flashcards WHERE id = ?", (rng.randint(1, total),)).fetchone()[0]
+            for _ in range(count)
+        ]
+    return [rng.choice(answer.split()) for answer in answers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rng = make_rng()
+        with tempfile.TemporaryDirectory() as tmp:
+            db = SimpleDB(db_file=os.path.join(tmp, "bench.db"))
+            with stopwatch(f"Заполнение {size} карточек"):
+                populate(db, args.topics, size, rng)
+            words = sample_words(db, rng, args.samples * 2)
+            single = [(word,) for word in words[: args.samples]]
+            pairs = [(f"{a} {b}",) for a, b in zip(words[::2], words[1::2])]
+            in_topic = [(word, rng.randint(1, args.topics)) for word in words[: args.samples]]
+            print_table(
+                [
+                    (f"{size}: одно слово", summarize(measure(db.search_flashcards, single))),
+                    (f"{size}: два слова", summarize(measure(db.search_flashcards, pairs))),
+                    (f"{size}: слово в теме", summarize(measure(db.search_flashcards, in_topic))),
+                ]
+            )
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Бенчмарк сериализации списков карточек: Pydantic-модели против прямого преобразования строк в JSON.
+
+Поднимает в памяти приложение FastAPI с двумя одинаковыми по ответу маршрутами над одним и тем же
+списком строк: первый строит FlashcardRead.from_row для каждой строки и отдает список FastAPI
+(проверка по response_model и стандартный JSON-кодировщик), второй использует serialization.rows_response.
+Чтение из базы не измеряется, чтобы сравнивалась только сериализация.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_serialization --sizes 1000 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database.database import SimpleDB
+from app.schemas import FlashcardRead
+from app.serialization import flashcard_dict, orjson, rows_response
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, measure, print_table, stopwatch, summarize
+
+
+def build_app(rows):
+    """Создает приложение с маршрутами /pydantic и /fast, возвращающими одни и те же строки"""
+    app = FastAPI()
+
+    @app.get("/pydantic", response_model=List[FlashcardRead])
+    def pydantic_rows():
+        return [FlashcardRead.from_row(row) for row in rows]
+
+    @app.get("/fast", response_model=List[FlashcardRead])
+    def fast_rows():
+        return rows_response(rows, flashcard_dict)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"orjson: {'да' if orjson is not None else 'нет, используется json'}")
+    rng = make_rng()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SimpleDB(db_file=os.path.join(tmp, "bench.db"))
+        with stopwatch(f"Заполнение {max(args.sizes)} карточек"):
+            populate(db, 10, max(args.sizes), rng)
+        for size in args.sizes:
+            rows = db.get_flashcards_page(None, size)
+            client = TestClient(build_app(rows))
+            if client.get("/pydantic").content != client.get("/fast").content:
+                sys.exit("Ответы маршрутов различаются")
+            samples = max(3, args.samples * 1000 // size)
+            print_table(
+                [
+                    (f"{size}: Pydantic + response_model", summarize(measure(client.get, [("/pydantic",)] * samples))),
+                    (f"{size}: rows_response", summarize(measure(client.get, [("/fast",)] * samples))),
+                ]
+            )
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Бенчмарк поиска похожих карточек по индексу LSH в сравнении с попарным сравнением.
+
+Для каждого размера базы измеряет задержку GET /flashcards/{id}/similar на уровне SimpleDB
+(get_similar_flashcards), время полного перебора всех карточек с точным коэффициентом Жаккара
+и стоимость массовой загрузки с проверкой похожести и без нее.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_similarity --sizes 10000 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from app.database.database import SimpleDB
+from app.database.similarity import jaccard, shingles
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, measure, print_table, random_text, summarize
+
+
+def build_index(db):
+    """Заполняет индекс LSH для карточек, вставленных populate: иначе его построит первый поиск"""
+    db._refresh_similarity_index()
+
+
+def brute_force(db, flashcard_id, threshold):
+    """Находит похожие карточки сравнением со всеми карточками базы"""
+    with db._read() as conn:
+        target = conn.execute("SELECT question, answer FROM flashcards WHERE id = ?", (flashcard_id,)).fetchone()
+        target = shingles(*target)
+        return [
+            card_id
+            for card_id, question, answer in conn.execute("SELECT id, question, answer FROM flashcards")
+            if card_id != flashcard_id and jaccard(target, shingles(question, answer)) >= threshold
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--bulk", type=int, default=5_000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            db = SimpleDB(db_file=os.path.join(workdir, "flashcards.db"), slow_query_ms=None, cache_size=0)
+            rng = make_rng()
+            populate(db, 100, size, rng)
+            started = time.perf_counter()
+            build_index(db)
+            print(f"{size} карточек: индекс LSH построен за {time.perf_counter() - started:.1f} с")
+
+            ids = [(rng.randint(1, size), 0.5) for _ in range(args.queries)]
+            rows = [("get_similar_flashcards", summarize(measure(db.get_similar_flashcards, ids)))]
+            rows.append(("полный перебор", summarize(measure(lambda i, t: brute_force(db, i, t), ids[:3]))))
+
+            topic = db.create_topic("bulk")[0]
+            for label, threshold in (("без проверки похожести", None), ("max_similarity=0.8", 0.8)):
+                cards = [(f"bulk {label} {i} {random_text(rng, 4)}", random_text(rng), 1) for i in range(args.bulk)]
+                started = time.perf_counter()
+                db.create_flashcards_bulk(topic, cards, max_similarity=threshold)
+                elapsed = time.perf_counter() - started
+                print(f"массовая загрузка {args.bulk} карточек {label}: {args.bulk / elapsed:.0f} карточек/с")
+            print_table(rows)
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
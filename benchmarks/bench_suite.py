@@ -0,0 +1,369 @@
+"""Воспроизводимый набор бенчмарков SimpleDB и API со сравнением с сохраненным базовым результатом.
+
+Для выбранного размера набора данных (10k, 100k или 1m карточек) один раз генерирует базу с фиксированным
+зерном генератора и кэширует ее в --data-dir. Каждый прогон работает с копией этой базы, поэтому
+пишущие операции не влияют на следующие прогоны. Измеряются:
+
+- методы SimpleDB, вызываемые напрямую;
+- эндпоинты API через ASGI-клиент в том же процессе (без сети);
+- эндпоинты API через настоящий сервер uvicorn.
+
+Для каждого случая сохраняются количество запросов, пропускная способность, p50/p95/p99 и максимум,
+для каждой группы - пиковый RSS (для групп db и asgi это RSS процесса бенчмарка, накопленный к концу группы,
+для uvicorn - RSS процесса сервера). Результаты записываются в JSON. Если передан --baseline, результаты
+сравниваются с ним, и при замедлении больше допустимого скрипт завершается с кодом 1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_suite --dataset 10k --baseline benchmarks/baseline-10k.json
+    python -m benchmarks.bench_suite --dataset 100k --output results.json --save-baseline baseline-100k.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from app.database.database import SimpleDB
+from app.database.migrations import MIGRATIONS, schema_version
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, peak_rss_mb, random_text, spawn_server, stopwatch, summarize
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "app")
+
+# Размеры наборов данных: (количество тем, количество карточек)
+DATASETS = {
+    "10k": (100, 10_000),
+    "100k": (1_000, 100_000),
+    "1m": (1_000, 1_000_000),
+}
+
+# Метрики, которые выводятся при сравнении с базовым результатом
+COMPARED_METRICS = ("p50_ms", "p99_ms", "throughput_rps")
+# Метрики, ухудшение которых считается регрессией. p99 на паре сотен вызовов слишком шумит,
+# чтобы на нем останавливать проверку, поэтому он только выводится
+GATED_METRICS = ("p50_ms", "throughput_rps")
+
+
+def dataset_path(data_dir, name):
+    """Возвращает путь к кэшированной базе набора данных, при необходимости создавая ее"""
+    topics, cards = DATASETS[name]
+    path = os.path.join(data_dir, f"dataset-{name}.db")
+    if os.path.exists(path):
+        with sqlite3.connect(path) as conn:
+            if schema_version(conn) == MIGRATIONS[-1][0]:
+                return path
+        # База создана старой версией схемы: генерируем заново, чтобы не измерять время миграции
+        os.remove(path)
+    os.makedirs(data_dir, exist_ok=True)
+    db = SimpleDB(db_file=path)
+    with stopwatch(f"Генерация набора {name}: {topics} тем, {cards} карточек"):
+        populate(db, topics, cards, make_rng())
+    db.close()
+    # Контрольная точка переносит журнал WAL в файл базы, чтобы копии набора не тянули за собой журнал.
+    # Она выполняется вне транзакции и после закрытия соединений пула, иначе таблицы заняты
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return path
+
+
+def db_cases(topics, cards, max_rev):
+    """Случаи для методов SimpleDB: (имя, имя метода, функция генерации аргументов от rng и номера вызова)"""
+    return [
+        ("get_topic", "get_topic", lambda rng, i: (rng.randint(1, topics),)),
+        ("get_topics_page", "get_topics_page", lambda rng, i: (rng.randint(0, topics), 100)),
+        ("get_flashcard_by_id", "get_flashcard_by_id", lambda rng, i: (rng.randint(1, cards),)),
+        ("get_flashcards_by_ids(50)", "get_flashcards_by_ids", lambda rng, i: (rng.sample(range(1, cards + 1), 50),)),
+        ("get_flashcards_by_topic", "get_flashcards_by_topic", lambda rng, i: (rng.randint(1, topics),)),
+        ("get_flashcards_page", "get_flashcards_page", lambda rng, i: (rng.randint(0, cards), 100)),
+        ("get_due_flashcards", "get_due_flashcards", lambda rng, i: (rng.randint(1, topics), 20)),
+        ("search_flashcards", "search_flashcards", lambda rng, i: (random_text(rng, 1),)),
+        ("get_changes", "get_changes", lambda rng, i: (max_rev - rng.randint(1, 500), 500)),
+        ("create_flashcard", "create_flashcard", lambda rng, i: (rng.randint(1, topics), f"bench-{i}", "answer")),
+        ("update_flashcard", "update_flashcard", lambda rng, i: (rng.randint(1, cards), None, None, f"answer {i}")),
+        ("review_flashcard", "review_flashcard", lambda rng, i: (rng.randint(1, cards), rng.randint(0, 5))),
+    ]
+
+
+def http_cases(topics, cards, max_rev):
+    """Случаи для эндпоинтов: (имя, HTTP-метод, функция генерации (путь, тело) от rng и номера запроса)"""
+    return [
+        ("GET /topics?limit=100", "GET", lambda rng, i: ("/topics?limit=100", None)),
+        ("GET /topics/{id}", "GET", lambda rng, i: (f"/topics/{rng.randint(1, topics)}", None)),
+        (
+            "GET /flashcards?limit=100",
+            "GET",
+            lambda rng, i: (f"/flashcards?limit=100&after={rng.randint(0, cards)}", None),
+        ),
+        ("GET /flashcards/{id}", "GET", lambda rng, i: (f"/flashcards/{rng.randint(1, cards)}", None)),
+        (
+            "GET /flashcards?ids=(50)",
+            "GET",
+            lambda rng, i: ("/flashcards?ids=" + ",".join(map(str, rng.sample(range(1, cards + 1), 50))), None),
+        ),
+        ("GET /topics/{id}/flashcards", "GET", lambda rng, i: (f"/topics/{rng.randint(1, topics)}/flashcards", None)),
+        ("GET /topics/{id}/review", "GET", lambda rng, i: (f"/topics/{rng.randint(1, topics)}/review", None)),
+        ("GET /flashcards/search", "GET", lambda rng, i: (f"/flashcards/search?q={random_text(rng, 1)}", None)),
+        ("GET /sync", "GET", lambda rng, i: (f"/sync?since={max_rev - rng.randint(1, 500)}", None)),
+        (
+            "POST /topics/{id}/flashcards",
+            "POST",
+            lambda rng, i: (f"/topics/{rng.randint(1, topics)}/flashcards", {"question": f"http-{i}", "answer": "a"}),
+        ),
+        (
+            "PATCH /flashcards/{id}",
+            "PATCH",
+            lambda rng, i: (f"/flashcards/{rng.randint(1, cards)}", {"answer": f"answer {i}"}),
+        ),
+        (
+            "POST /flashcards/{id}/review",
+            "POST",
+            lambda rng, i: (f"/flashcards/{rng.randint(1, cards)}/review", {"grade": rng.randint(0, 5)}),
+        ),
+    ]
+
+
+def with_throughput(samples, elapsed):
+    """Дополняет сводку задержек пропускной способностью"""
+    summary = summarize(samples)
+    summary["throughput_rps"] = len(samples) / elapsed if elapsed else 0.0
+    return summary
+
+
+def merge_rounds(summaries):
+    """Объединяет сводки нескольких раундов: медиана каждой метрики и общее количество вызовов"""
+    merged = {key: statistics.median(summary[key] for summary in summaries) for key in summaries[0]}
+    merged["count"] = sum(summary["count"] for summary in summaries)
+    merged["rounds"] = len(summaries)
+    return merged
+
+
+def run_db_cases(path, cases, samples, rounds):
+    """Измеряет методы SimpleDB на базе path. Первый раунд каждого случая - прогрев, он не учитывается"""
+    db = SimpleDB(db_file=path)
+    results = {}
+    for name, method, make_args in cases:
+        rng = make_rng()
+        func = getattr(db, method)
+        summaries = []
+        for round_number in range(rounds + 1):
+            calls = [make_args(rng, round_number * samples + i) for i in range(samples)]
+            latencies = []
+            started = time.perf_counter()
+            for args in calls:
+                call_started = time.perf_counter()
+                func(*args)
+                latencies.append(time.perf_counter() - call_started)
+            summaries.append(with_throughput(latencies, time.perf_counter() - started))
+        results[f"db:{name}"] = merge_rounds(summaries[1:])
+    db.close()
+    return results
+
+
+async def run_http_round(client, method, requests, concurrency):
+    """Выполняет запросы из concurrency одновременных клиентов и возвращает сводку"""
+    pending = list(reversed(requests))
+    latencies = []
+
+    async def worker():
+        while pending:
+            path, body = pending.pop()
+            call_started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - call_started)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{method} {path}: {response.status_code} {response.text}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return with_throughput(latencies, time.perf_counter() - started)
+
+
+async def run_http_cases(client, prefix, cases, samples, rounds, concurrency):
+    """Измеряет эндпоинты. Первый раунд каждого случая - прогрев, он не учитывается"""
+    results = {}
+    for name, method, make_request in cases:
+        rng = make_rng()
+        summaries = []
+        for round_number in range(rounds + 1):
+            requests = [make_request(rng, round_number * samples + i) for i in range(samples)]
+            summaries.append(await run_http_round(client, method, requests, concurrency))
+        results[f"{prefix}:{name}"] = merge_rounds(summaries[1:])
+    return results
+
+
+def run_asgi(workdir, cases, samples, rounds, concurrency):
+    """Измеряет эндпоинты через ASGI-клиент в том же процессе. Приложение открывает flashcards.db из workdir"""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.path.insert(0, APP_DIR)
+    try:
+        import main
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await run_http_cases(client, "asgi", cases, samples, rounds, concurrency)
+
+        return asyncio.run(scenario())
+    finally:
+        os.chdir(cwd)
+
+
+def run_uvicorn(workdir, cases, samples, rounds, concurrency, port):
+    """Измеряет эндпоинты через сервер uvicorn и возвращает результаты и пиковый RSS сервера"""
+    with spawn_server(workdir, port=port) as (url, process):
+
+        async def scenario():
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+                return await run_http_cases(client, "uvicorn", cases, samples, rounds, concurrency)
+
+        results = asyncio.run(scenario())
+        return results, peak_rss_mb(process.pid)
+
+
+def environment():
+    """Описание окружения, в котором получены результаты"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCH_DIR
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Сравнивает результаты с базовыми и возвращает список регрессий
+
+    Задержка считается ухудшившейся, если выросла больше чем в (1 + tolerance) раз,
+    пропускная способность - если упала больше чем в (1 + tolerance) раз. Проверяются только GATED_METRICS,
+    а изменения задержки меньше min_delta_ms не учитываются: на микросекундных операциях они - шум таймера.
+    """
+    regressions = []
+    print(f"\n{'случай':<48} {'метрика':<15} {'база':>10} {'сейчас':>10} {'изменение':>10}")
+    for name, summary in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = base.get(metric), summary.get(metric)
+            if not old or new is None:
+                continue
+            ratio = new / old
+            if metric not in GATED_METRICS:
+                worse = False
+            elif metric == "throughput_rps":
+                worse = ratio < 1 / (1 + tolerance)
+            else:
+                worse = ratio > 1 + tolerance and new - old >= min_delta_ms
+            mark = "  РЕГРЕССИЯ" if worse else ""
+            print(f"{name:<48} {metric:<15} {old:>10.3f} {new:>10.3f} {ratio:>9.2f}x{mark}")
+            if worse:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=DATASETS, default="10k")
+    parser.add_argument("--data-dir", default=os.path.join(BENCH_DIR, ".data"), help="где кэшировать наборы данных")
+    parser.add_argument("--samples", type=int, default=200, help="вызовов на каждый случай в одном раунде")
+    parser.add_argument("--rounds", type=int, default=3, help="раундов на случай, итог - медиана по раундам")
+    parser.add_argument("--concurrency", type=int, default=1, help="одновременных HTTP-клиентов")
+    parser.add_argument("--groups", nargs="+", choices=("db", "asgi", "uvicorn"), default=["db", "asgi", "uvicorn"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="куда записать результаты в формате JSON")
+    parser.add_argument("--baseline", help="JSON с базовыми результатами для сравнения")
+    parser.add_argument("--save-baseline", help="сохранить текущие результаты как базовые")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение, доля")
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=0.05, help="рост задержки меньше этого не считается регрессией"
+    )
+    args = parser.parse_args()
+
+    topics, cards = DATASETS[args.dataset]
+    source = dataset_path(args.data_dir, args.dataset)
+    with sqlite3.connect(source) as conn:
+        max_rev = conn.execute("SELECT MAX(rev) FROM changes").fetchone()[0]
+
+    results = {
+        "environment": environment(),
+        "dataset": args.dataset,
+        "samples": args.samples,
+        "rounds": args.rounds,
+        "concurrency": args.concurrency,
+        "peak_rss_mb": {},
+        "cases": {},
+    }
+    for group in args.groups:
+        with tempfile.TemporaryDirectory() as workdir:
+            # Каждая группа работает со своей копией базы, чтобы записи одной группы не влияли на другие
+            path = os.path.join(workdir, "flashcards.db")
+            shutil.copyfile(source, path)
+            with stopwatch(f"Группа {group}"):
+                if group == "db":
+                    cases = db_cases(topics, cards, max_rev)
+                    results["cases"].update(run_db_cases(path, cases, args.samples, args.rounds))
+                    results["peak_rss_mb"]["db"] = peak_rss_mb()
+                elif group == "asgi":
+                    cases = http_cases(topics, cards, max_rev)
+                    results["cases"].update(run_asgi(workdir, cases, args.samples, args.rounds, args.concurrency))
+                    results["peak_rss_mb"]["asgi"] = peak_rss_mb()
+                else:
+                    cases = http_cases(topics, cards, max_rev)
+                    cases_results, rss = run_uvicorn(
+                        workdir, cases, args.samples, args.rounds, args.concurrency, args.port
+                    )
+                    results["cases"].update(cases_results)
+                    results["peak_rss_mb"]["uvicorn"] = rss
+
+    for name, summary in results["cases"].items():
+        print(
+            f"{name:<48} {summary['throughput_rps']:>9.0f} rps p50={summary['p50_ms']:.3f}ms "
+            f"p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms"
+        )
+    print("Пиковый RSS, МБ: " + ", ".join(f"{group}={rss:.0f}" for group, rss in results["peak_rss_mb"].items()))
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"Результаты записаны в {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("dataset") != args.dataset:
+            print(f"Внимание: базовые результаты получены на наборе {baseline.get('dataset')}")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\nНайдено регрессий: {len(regressions)}")
+            sys.exit(1)
+        print("\nРегрессий не найдено")
+
+
+if __name__ == "__main__":
+    main()
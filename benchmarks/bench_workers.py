@@ -0,0 +1,129 @@
+"""Нагрузочный тест многопроцессного режима: как пропускная способность растет с числом процессов uvicorn.
+
+Для каждого количества процессов поднимает uvicorn --workers N поверх одной и той же заранее заполненной
+базы (путь передается через FLASHMIND_DB_PATH) и нагружает его смесью чтения карточек по id и записи
+результатов повторения. Клиенты работают в нескольких процессах, чтобы генератор нагрузки сам не стал
+узким местом. Кроме пропускной способности и задержек считаются ответы 503 (база осталась занята
+другим процессом после всех повторов) и прочие ошибки.
+
+Рост ограничен числом ядер: на одном ядре процессы только делят его между собой. Запись в SQLite
+всегда идет по одной, поэтому при большой доле записи рост меньше.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_workers --workers 1 2 4 --seconds 10 --write-ratio 0.1
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import httpx
+
+from app.database.database import SimpleDB
+from benchmarks.bench_schema import populate
+from benchmarks.common import make_rng, spawn_server, summarize
+
+
+async def client_loop(client, rng, cards, write_ratio, deadline, result):
+    """Один клиент: до истечения времени последовательно читает карточки и записывает повторения"""
+    while time.perf_counter() < deadline:
+        flashcard_id = rng.randint(1, cards)
+        write = rng.random() < write_ratio
+        started = time.perf_counter()
+        if write:
+            response = await client.post(f"/flashcards/{flashcard_id}/review", json={"grade": rng.randint(0, 5)})
+        else:
+            response = await client.get(f"/flashcards/{flashcard_id}")
+        elapsed = time.perf_counter() - started
+        if response.status_code == 503:
+            result["busy"] += 1
+        elif response.status_code >= 400:
+            result["errors"] += 1
+        else:
+            result["write" if write else "read"].append(elapsed)
+
+
+async def generate_load(url, clients, cards, write_ratio, seconds, seed):
+    result = {"read": [], "write": [], "busy": 0, "errors": 0}
+    rng = make_rng(seed)
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(
+            *(client_loop(client, make_rng(rng.random()), cards, write_ratio, deadline, result) for _ in range(clients))
+        )
+    return result
+
+
+def load_process(args):
+    """Генератор нагрузки в отдельном процессе"""
+    return asyncio.run(generate_load(*args))
+
+
+def run_case(url, workers, args):
+    per_process = max(1, args.clients // args.client_processes)
+    tasks = [
+        (url, per_process, args.cards, args.write_ratio, args.seconds, seed) for seed in range(args.client_processes)
+    ]
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.client_processes) as pool:
+        parts = pool.map(load_process, tasks)
+    elapsed = time.perf_counter() - started
+    reads = [sample for part in parts for sample in part["read"]]
+    writes = [sample for part in parts for sample in part["write"]]
+    return {
+        "workers": workers,
+        "rps": (len(reads) + len(writes)) / elapsed,
+        "read_p50_ms": summarize(reads)["p50_ms"],
+        "read_p99_ms": summarize(reads)["p99_ms"],
+        "write_p50_ms": summarize(writes)["p50_ms"],
+        "write_p99_ms": summarize(writes)["p99_ms"],
+        "busy": sum(part["busy"] for part in parts),
+        "errors": sum(part["errors"] for part in parts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=64, help="одновременных клиентов всего")
+    parser.add_argument("--client-processes", type=int, default=2)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--cards", type=int, default=20_000)
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"ядер: {os.cpu_count()}, доля записи: {args.write_ratio}")
+    print(
+        f"{'процессов':>9} {'запросов/с':>11} {'чтение p50':>11} {'чтение p99':>11} "
+        f"{'запись p50':>11} {'запись p99':>11} {'503':>6} {'ошибки':>7}"
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        seed = os.path.join(workdir, "seed.db")
+        seed_db = SimpleDB(db_file=seed)
+        populate(seed_db, args.topics, args.cards, make_rng())
+        seed_db.close()
+        path = os.path.join(workdir, "flashcards.db")
+        for workers in args.workers:
+            # Каждый случай начинается с одинаковой базы, чтобы повторения не накапливались между ними
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            shutil.copyfile(seed, path)
+            with spawn_server(workdir, port=args.port, workers=workers, env={"FLASHMIND_DB_PATH": path}) as (url, _):
+                result = run_case(url, workers, args)
+            print(
+                f"{result['workers']:>9} {result['rps']:>11.0f} {result['read_p50_ms']:>11.2f} "
+                f"{result['read_p99_ms']:>11.2f} {result['write_p50_ms']:>11.2f} {result['write_p99_ms']:>11.2f} "
+                f"{result['busy']:>6} {result['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
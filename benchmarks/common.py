@@ -0,0 +1,144 @@
+"""Общие помощники для бенчмарков"""
+
+import random
+import string
+import time
+from contextlib import contextmanager
+
+
+def percentile(samples, q):
+    """Возвращает q-й перцентиль выборки (0 <= q <= 100) методом ближайшего ранга"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Сводка по выборке задержек в секундах: количество, p50/p95/p99 и максимум в миллисекундах"""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+    }
+
+
+def measure(func, args_list):
+    """Вызывает func для каждого набора аргументов и возвращает список задержек в секундах"""
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+@contextmanager
+def stopwatch(label):
+    """Печатает время выполнения блока"""
+    started = time.perf_counter()
+    yield
+    print(f"{label}: {time.perf_counter() - started:.2f} с")
+
+
+def _build_vocabulary(size=5000, seed=7):
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(size)]
+    # Частоты слов убывают по закону Ципфа, как в естественном тексте
+    weights = [1 / rank for rank in range(1, size + 1)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return words, cumulative
+
+
+VOCABULARY, VOCABULARY_WEIGHTS = _build_vocabulary()
+
+
+def random_text(rng, words=8):
+    """Генерирует псевдослучайный текст из слов словаря с распределением частот по Ципфу"""
+    return " ".join(rng.choices(VOCABULARY, cum_weights=VOCABULARY_WEIGHTS, k=words))
+
+
+def make_rng(seed=42):
+    """Возвращает генератор случайных чисел с фиксированным зерном для воспроизводимости"""
+    return random.Random(seed)
+
+
+def print_table(rows):
+    """Печатает строки сводок в виде таблицы"""
+    for name, summary in rows:
+        print(
+            f"{name:<40} n={summary['count']:<6} p50={summary['p50_ms']:.3f}ms "
+            f"p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms"
+        )
+
+
+@contextmanager
+def spawn_server(workdir, port=8765, workers=1, env=None):
+    """Запускает приложение под uvicorn в отдельном процессе и ждет, пока оно начнет отвечать
+
+    Args:
+        workdir (str): рабочая директория процесса. В ней лежит база flashcards.db
+        port (int): порт сервера
+        workers (int): количество процессов uvicorn
+        env (dict, optional): дополнительные переменные окружения
+
+    Yields:
+        tuple: базовый URL запущенного сервера и его процесс subprocess.Popen
+    """
+    import os
+    import subprocess
+    import sys
+    import urllib.request
+
+    app_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app", "--app-dir", app_dir,
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--timeout-keep-alive", "120",
+    ]  # fmt: skip
+    process = subprocess.Popen(command, cwd=workdir, env={**os.environ, **(env or {})})
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"{url}/topics?limit=1", timeout=1)
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("Сервер не запустился")
+                time.sleep(0.1)
+        yield url, process
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def peak_rss_mb(pid=None):
+    """Возвращает пиковый объем резидентной памяти процесса в мегабайтах
+
+    Args:
+        pid (int, optional): процесс, по умолчанию текущий. Для другого процесса значение читается из /proc
+
+    Returns:
+        float: пиковый RSS или 0.0, если его не удалось определить
+    """
+    if pid is None:
+        import resource
+
+        # В Linux ru_maxrss задается в килобайтах
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
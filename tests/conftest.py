@@ -1,9 +1,13 @@
 import pytest
 from fastapi.testclient import TestClient
 
-from app.database.database import SimpleDB
+from app.http_compression import PrecompressedCache
 from app.main import app
 
+# main импортирует базу как модуль верхнего уровня database.database, поэтому тестовая база создается
+# тем же классом: иначе исключения базы не совпадут с теми, для которых в приложении зарегистрированы обработчики
+from database.database import SimpleDB  # noqa: E402  isort:skip
+
 
 @pytest.fixture(name="test_db")
 def test_db_fixture():
@@ -26,6 +30,9 @@ def client_fixture(test_db, monkeypatch):
     # Заменяем глобальную переменную 'db' в модуле 'main' на наш тестовый экземпляр БД.
     # Это гарантирует, что все роуты приложения будут использовать нашу тестовую БД.
     monkeypatch.setattr("app.main.db", test_db)
+    # ETag выгрузки строится из версии данных, которая в каждой новой тестовой базе начинается заново,
+    # поэтому сжатые выгрузки других тестов не должны оставаться в кэше
+    monkeypatch.setattr("app.main.export_cache", PrecompressedCache())
 
     with TestClient(app) as test_client:
         yield test_client
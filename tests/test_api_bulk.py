@@ -0,0 +1,113 @@
+from starlette import status
+
+from tests.test_api_flashcards import create_test_flashcard
+from tests.test_api_topics import create_test_topic
+
+
+def test_bulk_create_flashcards_json(client):
+    """Проверяет массовое создание карточек из JSON-массива с отчетом по каждой карточке"""
+    topic = create_test_topic(client)
+    existing = create_test_flashcard(client, topic["id"], "Старый вопрос", "Старый ответ")
+    payload = [
+        {"question": "Вопрос 1", "answer": "Ответ 1"},
+        {"question": "Старый вопрос", "answer": "Другой ответ"},
+        {"question": "Вопрос 2", "answer": "Ответ 2", "difficulty_level": 3},
+        {"question": "Вопрос 1", "answer": "Повтор"},
+    ]
+
+    response = client.post(f"/topics/{topic['id']}/flashcards/bulk", json=payload)
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert (result["created"], result["existing"], result["duplicates"]) == (2, 1, 1)
+    assert [item["status"] for item in result["items"]] == ["created", "exists", "created", "duplicate"]
+    assert result["items"][1]["id"] == existing["id"]
+    assert result["items"][3]["id"] == result["items"][0]["id"]
+
+    flashcards = client.get(f"/topics/{topic['id']}/flashcards").json()
+    assert len(flashcards) == 3
+    assert {f["question"]: f["difficulty_level"] for f in flashcards}["Вопрос 2"] == 3
+
+
+def test_bulk_create_flashcards_ndjson_and_csv(client):
+    """Проверяет потоковую загрузку карточек в форматах JSON Lines и CSV"""
+    topic = create_test_topic(client)
+    ndjson = "\n".join(f'{{"question": "Вопрос {i}", "answer": "Ответ {i}"}}' for i in range(1200))
+    response = client.post(
+        f"/topics/{topic['id']}/flashcards/bulk",
+        content=ndjson.encode(),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["created"] == 1200
+
+    csv_body = "question,answer,difficulty_level\nCSV вопрос,\"Ответ, с запятой\",2\nВопрос 0,Ответ,1\n"
+    response = client.post(
+        f"/topics/{topic['id']}/flashcards/bulk", content=csv_body.encode(), headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["status"] for item in response.json()["items"]] == ["created", "exists"]
+    assert len(client.get(f"/topics/{topic['id']}/flashcards").json()) == 1201
+
+
+def test_bulk_create_flashcards_invalid_item(client):
+    """Проверяет, что некорректная запись возвращает 422 с ее номером"""
+    topic = create_test_topic(client)
+    response = client.post(
+        f"/topics/{topic['id']}/flashcards/bulk",
+        json=[{"question": "Вопрос", "answer": "Ответ"}, {"question": "Без ответа"}],
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert response.json()["detail"]["position"] == 2
+
+
+def test_bulk_create_flashcards_non_existent_topic(client):
+    """Проверяет, что массовая загрузка в несуществующую тему возвращает 404"""
+    response = client.post("/topics/9999/flashcards/bulk", json=[])
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Тема не найдена"
+
+
+def test_bulk_create_rejects_similar_flashcards(client):
+    """Проверяет статус "similar" для карточек, похожих на существующие и на загруженные раньше"""
+    topic = create_test_topic(client)
+    existing = create_test_flashcard(client, topic["id"], "Что такое фотосинтез?", "Образование веществ на свету")
+    payload = [
+        {"question": "Что такое фотосинтез", "answer": "Образование веществ на свету."},
+        {"question": "Кто написал роман Война и мир?", "answer": "Лев Толстой"},
+        {"question": "Кто написал роман «Война и мир»", "answer": "Лев Толстой"},
+        {"question": "Сколько планет в Солнечной системе?", "answer": "Восемь"},
+    ]
+
+    response = client.post(f"/topics/{topic['id']}/flashcards/bulk", params={"max_similarity": 0.8}, json=payload)
+    result = response.json()
+    assert [item["status"] for item in result["items"]] == ["similar", "created", "similar", "created"]
+    assert (result["created"], result["similar"]) == (2, 2)
+    assert result["items"][0]["id"] == existing["id"]
+    assert result["items"][2]["id"] == result["items"][1]["id"]
+
+
+def test_bulk_create_csv_multiline_values_and_invalid_encoding(client):
+    """Проверяет значения CSV с переводами строк и ответ 422 с номером строки для тела не в UTF-8"""
+    topic = create_test_topic(client)
+    url = f"/topics/{topic['id']}/flashcards/bulk"
+    csv_body = 'question,answer\n"Многострочный\nвопрос","Ответ с ""кавычками""\nи второй строкой"\nПростой,Ответ\n'
+    response = client.post(url, content=csv_body.encode(), headers={"Content-Type": "text/csv"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["created"] == 2
+    flashcards = client.get(f"/topics/{topic['id']}/flashcards").json()
+    assert flashcards[0]["question"] == "Многострочный\nвопрос"
+    assert flashcards[0]["answer"] == 'Ответ с "кавычками"\nи второй строкой'
+
+    bodies = {
+        "text/csv": "question,answer\nЕще вопрос,Ответ\n".encode() + b"\xff\xfe,bad\n",
+        "application/x-ndjson": '{"question": "Вопрос NDJSON", "answer": "Ответ"}\n\n'.encode() + b"\xff\n",
+    }
+    for content_type, body in bodies.items():
+        response = client.post(url, content=body, headers={"Content-Type": content_type})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+        assert response.json()["detail"]["position"] == 3
+
+    unclosed = 'question,answer\n"Без конца,Ответ\n'.encode()
+    response = client.post(url, content=unclosed, headers={"Content-Type": "text/csv"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert response.json()["detail"]["position"] == 2
@@ -0,0 +1,178 @@
+import gzip
+import json
+import zlib
+
+import brotli
+import zstandard
+from starlette import status
+
+from app import main
+from app.http_compression import ENCODERS, GzipEncoder, negotiate
+from tests.test_api_flashcards import create_test_flashcard
+from tests.test_api_topics import create_test_topic
+
+
+def zstd_decompress(data):
+    """Распаковывает поток zstd, в заголовке кадров которого нет исходного размера"""
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+# Распаковка каждой кодировки библиотекой, независимой от клиента httpx
+DECOMPRESS = {"zstd": zstd_decompress, "br": brotli.decompress, "gzip": gzip.decompress}
+
+
+def raw_get(client, path, **headers):
+    """Выполняет GET-запрос и возвращает ответ и тело в том виде, в котором его отправил сервер"""
+    with client.stream("GET", path, headers=headers) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def create_deck(client, size=30):
+    """Создает тему с size карточками, список которых заведомо больше порога сжатия"""
+    topic = create_test_topic(client)
+    for i in range(size):
+        create_test_flashcard(client, topic["id"], f"Вопрос номер {i} про тему {i * 7}", f"Подробный ответ {i}")
+    return topic
+
+
+def test_negotiate_encoding():
+    """Проверяет выбор кодировки по весам q, "*" и запрет кодировки через q=0"""
+    encoders = {"zstd": None, "br": None, "gzip": GzipEncoder}
+    assert negotiate(None, encoders) is None
+    assert negotiate("gzip, deflate", encoders) == "gzip"
+    assert negotiate("gzip, br, zstd", encoders) == "zstd"
+    assert negotiate("gzip;q=1.0, br;q=0.5", encoders) == "gzip"
+    assert negotiate("*;q=0.3, zstd;q=0", encoders) == "br"
+    assert negotiate("identity, gzip;q=0", encoders) is None
+    assert negotiate("deflate", encoders) is None
+
+
+def test_list_responses_are_compressed_above_threshold(client):
+    """Проверяет, что большой список сжимается, а маленький ответ и клиент без gzip получают его как есть"""
+    topic = create_deck(client)
+
+    plain = client.get("/flashcards", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    for path in ("/flashcards", f"/topics/{topic['id']}/flashcards", "/flashcards?limit=25"):
+        response = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-encoding"] == "gzip"
+        assert "accept-encoding" in response.headers["vary"].lower()
+        assert response.num_bytes_downloaded < len(response.content)
+    assert client.get("/flashcards", headers={"Accept-Encoding": "gzip"}).content == plain.content
+
+    response = client.get("/flashcards", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == f"W/{plain.headers['etag']}"
+    cached = client.get("/flashcards", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+
+    small = client.get(f"/topics/{topic['id']}", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_not_modified_keeps_weak_etag_of_compressed_response(client):
+    """Проверяет, что 304 на запрос со сжатием возвращает тот же слабый ETag, что и сжатый ответ 200"""
+    create_deck(client)
+    compressed = client.get("/flashcards", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    etag = compressed.headers["etag"]
+    assert etag.startswith("W/")
+
+    cached = client.get("/flashcards", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert cached.headers["etag"] == etag
+    assert "accept-encoding" in cached.headers["vary"].lower()
+
+    plain = client.get("/flashcards", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert plain.status_code == status.HTTP_304_NOT_MODIFIED
+    assert plain.headers["etag"] == etag[2:]
+
+
+def test_streamed_responses_are_compressed(client):
+    """Проверяет сжатие потоковой выдачи NDJSON"""
+    create_deck(client)
+    response = client.get("/flashcards?stream=true", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == list(range(1, 31))
+
+
+def test_export_reuses_precompressed_body(client):
+    """Проверяет, что повторная выгрузка той же версии данных отдается из кэша сжатых тел"""
+    topic = create_deck(client)
+    headers = {"Accept-Encoding": "gzip"}
+
+    first = client.get("/flashcards/export", headers=headers)
+    assert first.headers["content-encoding"] == "gzip"
+    second = client.get("/flashcards/export", headers=headers)
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert main.export_cache.stats()["hits"] == 1
+    cached_body = main.export_cache.get(first.headers["etag"][2:], "gzip")
+    assert gzip.decompress(cached_body) == first.content
+
+    not_modified = client.get("/flashcards/export", headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+
+    create_test_flashcard(client, topic["id"], "Новая карточка после выгрузки", "Ответ")
+    third = client.get("/flashcards/export", headers=headers)
+    assert third.headers["etag"] != first.headers["etag"]
+    assert len(third.text.splitlines()) == 31
+
+
+def test_all_encodings_are_available():
+    """Проверяет, что zstd и br установлены вместе с приложением и предпочитаются gzip"""
+    assert list(ENCODERS) == ["zstd", "br", "gzip"]
+
+
+def test_encoders_flush_decodable_parts():
+    """Проверяет, что после сброса каждой кодировки клиент может распаковать все переданное до сих пор"""
+    parts = [json.dumps({"id": i, "question": f"Вопрос {i}" * 20}).encode() for i in range(5)]
+    for name, encoder_class in ENCODERS.items():
+        encoder = encoder_class()
+        if name == "zstd":
+            decompress = zstandard.ZstdDecompressor().decompressobj().decompress
+        elif name == "br":
+            decompress = brotli.Decompressor().process
+        else:
+            decompress = zlib.decompressobj(31).decompress
+        for part in parts:
+            assert decompress(encoder.compress(part, flush=True)) == part, name
+        assert decompress(encoder.finish()) == b"", name
+
+
+def test_each_encoding_is_negotiated_and_decodes_to_plain_body(client):
+    """Проверяет, что ответы сжимаются каждой кодировкой, а q=0 исключает кодировку"""
+    topic = create_deck(client)
+    for path in ("/flashcards", f"/topics/{topic['id']}/flashcards", "/flashcards?stream=true", "/flashcards?limit=25"):
+        plain = client.get(path, headers={"Accept-Encoding": "identity"}).content
+        for encoding, decompress in DECOMPRESS.items():
+            response, raw = raw_get(client, path, **{"Accept-Encoding": encoding})
+            assert response.headers["content-encoding"] == encoding
+            assert len(raw) < len(plain)
+            assert decompress(raw) == plain, (path, encoding)
+
+    cases = {
+        "zstd;q=0, br;q=0, gzip": "gzip",
+        "zstd;q=0, *": "br",
+        "gzip;q=0.5, br;q=0.9, zstd;q=0.1": "br",
+        "*;q=0": None,
+    }
+    for accept_encoding, expected in cases.items():
+        response = client.get("/flashcards", headers={"Accept-Encoding": accept_encoding})
+        assert response.headers.get("content-encoding") == expected, accept_encoding
+
+
+def test_export_cache_hits_for_each_encoding(client):
+    """Проверяет, что сжатая выгрузка кэшируется отдельно для каждой кодировки и отдается из кэша повторно"""
+    create_deck(client)
+    plain = client.get("/flashcards/export", headers={"Accept-Encoding": "identity"})
+    for encoding, decompress in DECOMPRESS.items():
+        first, first_raw = raw_get(client, "/flashcards/export", **{"Accept-Encoding": encoding})
+        hits = main.export_cache.stats()["hits"]
+        second, second_raw = raw_get(client, "/flashcards/export", **{"Accept-Encoding": encoding})
+        assert main.export_cache.stats()["hits"] == hits + 1
+        assert first.headers["content-encoding"] == second.headers["content-encoding"] == encoding
+        assert second_raw == first_raw
+        assert decompress(second_raw) == plain.content
+    assert main.export_cache.stats()["entries"] == len(DECOMPRESS)
@@ -0,0 +1,121 @@
+from starlette import status
+
+# main импортирует базу как модуль верхнего уровня database.database (см. conftest)
+from database.database import SimpleDB  # noqa: E402  isort:skip
+
+
+def create_test_topic(client, name="Тестовая тема"):
+    """Создает тему и возвращает ее в виде JSON"""
+    response = client.post("/topics", json={"name": name, "description": "Описание"})
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+
+def create_test_flashcard(client, topic_id, question="Вопрос"):
+    """Создает карточку в теме и возвращает ее в виде JSON"""
+    response = client.post(f"/topics/{topic_id}/flashcards", json={"question": question, "answer": "Ответ"})
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+
+def test_read_topic_returns_not_modified_for_current_etag(client):
+    """Проверяет, что повторный запрос темы с актуальным ETag получает 304 без тела"""
+    topic = create_test_topic(client)
+    first = client.get(f"/topics/{topic['id']}")
+    etag = first.headers["etag"]
+
+    second = client.get(f"/topics/{topic['id']}", headers={"If-None-Match": etag})
+    assert second.status_code == status.HTTP_304_NOT_MODIFIED
+    assert second.headers["etag"] == etag
+    assert second.content == b""
+
+    client.patch(f"/topics/{topic['id']}", json={"name": "Новое имя"})
+    third = client.get(f"/topics/{topic['id']}", headers={"If-None-Match": etag})
+    assert third.status_code == status.HTTP_200_OK
+    assert third.headers["etag"] != etag
+
+
+def test_collection_etag_changes_only_when_scope_changes(client):
+    """Проверяет, что ETag списка карточек темы меняется только при изменении карточек этой темы"""
+    topic = create_test_topic(client, "Первая тема")
+    other_topic = create_test_topic(client, "Вторая тема")
+    create_test_flashcard(client, topic["id"])
+    url = f"/topics/{topic['id']}/flashcards"
+    etag = client.get(url).headers["etag"]
+
+    create_test_flashcard(client, other_topic["id"], "Чужой вопрос")
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == status.HTTP_304_NOT_MODIFIED
+    assert client.get("/flashcards", headers={"If-None-Match": etag}).status_code == status.HTTP_200_OK
+
+    create_test_flashcard(client, topic["id"], "Свой вопрос")
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 2
+
+
+def test_collection_etag_matches_body_after_write_of_other_process(client, monkeypatch, tmp_path):
+    """Проверяет, что после записи другим процессом список темы приходит с новым ETag и новыми данными"""
+    path = str(tmp_path / "flashcards.db")
+    app_db = SimpleDB(db_file=path)
+    monkeypatch.setattr("app.main.db", app_db)
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+    url = f"/topics/{topic['id']}/flashcards"
+    etag = client.get(url).headers["etag"]
+    app_db.get_flashcards_by_topic(topic["id"])
+
+    other = SimpleDB(db_file=path)
+    other.update_flashcard(flashcard["id"], answer="Новый ответ")
+    other.close()
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+    assert response.json()[0]["answer"] == "Новый ответ"
+    response = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    app_db.close()
+
+
+def test_collection_etag_depends_on_page(client):
+    """Проверяет, что разные страницы одного списка имеют разные ETag"""
+    for i in range(3):
+        create_test_topic(client, f"Тема {i}")
+    first_page = client.get("/topics", params={"limit": 2})
+    second_page = client.get("/topics", params={"limit": 2, "after": first_page.headers["x-next-cursor"]})
+    assert first_page.headers["etag"] != second_page.headers["etag"]
+    assert client.get("/topics", headers={"If-None-Match": "*"}).status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_patch_with_stale_if_match_is_rejected(client):
+    """Проверяет, что обновление с устаревшим ETag в If-Match отклоняется с 412 и не меняет карточку"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+    etag = client.get(f"/flashcards/{flashcard['id']}").headers["etag"]
+
+    url = f"/flashcards/{flashcard['id']}"
+    updated = client.patch(url, json={"answer": "Первая правка"}, headers={"If-Match": etag})
+    assert updated.status_code == status.HTTP_200_OK
+    assert updated.headers["etag"] != etag
+
+    rejected = client.patch(url, json={"answer": "Вторая правка"}, headers={"If-Match": etag})
+    assert rejected.status_code == status.HTTP_412_PRECONDITION_FAILED
+    assert rejected.json()["status"] == 412
+    assert client.get(url).json()["answer"] == "Первая правка"
+
+    accepted = client.patch(url, json={"answer": "Третья правка"}, headers={"If-Match": updated.headers["etag"]})
+    assert accepted.status_code == status.HTTP_200_OK
+
+
+def test_if_match_uses_strong_comparison(client):
+    """Проверяет, что слабый ETag в If-Match не удовлетворяет условию, а If-None-Match сравнивает слабо"""
+    topic = create_test_topic(client)
+    url = f"/topics/{topic['id']}"
+    etag = client.get(url).headers["etag"]
+
+    assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == status.HTTP_304_NOT_MODIFIED
+    rejected = client.patch(url, json={"name": "Новое имя"}, headers={"If-Match": f"W/{etag}"})
+    assert rejected.status_code == status.HTTP_412_PRECONDITION_FAILED
+    assert client.get(url).json()["name"] == topic["name"]
+    accepted = client.patch(url, json={"name": "Новое имя"}, headers={"If-Match": f'"other", {etag}'})
+    assert accepted.status_code == status.HTTP_200_OK
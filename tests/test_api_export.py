@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+import sqlite3
+
+from starlette import status
+
+from app.database.database import SimpleDB
+from app.database.export import main as export_main
+from tests.test_api_flashcards import create_test_flashcard
+from tests.test_api_topics import create_test_topic
+
+
+def test_export_flashcards_jsonl(client):
+    """Проверяет выгрузку всех карточек в JSON Lines"""
+    topic = create_test_topic(client)
+    created = [create_test_flashcard(client, topic["id"], f"Вопрос {i}", f"Ответ {i}") for i in range(3)]
+
+    response = client.get("/flashcards/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "attachment" in response.headers["content-disposition"]
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [f["id"] for f in created]
+    assert rows[0]["question"] == "Вопрос 0"
+
+
+def test_export_topic_csv(client):
+    """Проверяет выгрузку карточек одной темы в CSV"""
+    topic1 = create_test_topic(client, "Первая тема")
+    topic2 = create_test_topic(client, "Вторая тема")
+    create_test_flashcard(client, topic1["id"], "Вопрос, с запятой", "Ответ")
+    create_test_flashcard(client, topic2["id"], "Чужой вопрос", "Ответ")
+
+    response = client.get(f"/topics/{topic1['id']}/export", params={"format": "csv"})
+    assert response.status_code == status.HTTP_200_OK
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["question"] for row in rows] == ["Вопрос, с запятой"]
+    # Каждое значение стоит под своим заголовком
+    flashcard = client.get(f"/flashcards/{rows[0]['id']}").json()
+    for column in ("topic_id", "answer", "difficulty_level", "created_at", "due_at"):
+        assert rows[0][column] == str(flashcard[column])
+
+    response = client.get("/topics/9999/export")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_export_snapshot(client, tmp_path):
+    """Проверяет, что снимок базы данных - рабочий файл SQLite со всеми карточками"""
+    topic = create_test_topic(client)
+    create_test_flashcard(client, topic["id"], "Вопрос", "Ответ")
+
+    response = client.get("/export/snapshot")
+    assert response.status_code == status.HTTP_200_OK
+    snapshot = tmp_path / "snapshot.db"
+    snapshot.write_bytes(response.content)
+    conn = sqlite3.connect(snapshot)
+    assert conn.execute("SELECT question FROM flashcards").fetchall() == [("Вопрос",)]
+    conn.close()
+
+
+def test_export_cli(tmp_path):
+    """Проверяет утилиту командной строки для выгрузки и снимка"""
+    db_path = str(tmp_path / "flashcards.db")
+    db = SimpleDB(db_file=db_path)
+    topic = db.create_topic("Тема")
+    db.create_flashcard(topic[0], "Вопрос", "Ответ")
+    db.close()
+
+    export_main(["export", "--db", db_path, "--format", "jsonl", "--output", str(tmp_path / "deck.jsonl")])
+    assert json.loads((tmp_path / "deck.jsonl").read_text(encoding="utf-8"))["answer"] == "Ответ"
+
+    export_main(["snapshot", "--db", db_path, "--output", str(tmp_path / "backup.db")])
+    conn = sqlite3.connect(tmp_path / "backup.db")
+    assert conn.execute("SELECT COUNT(*) FROM flashcards").fetchone() == (1,)
+    conn.close()
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 from starlette import status
@@ -95,6 +96,8 @@ def test_read_flashcards_by_topic_id(client):
 
     response = client.get(f"/topics/{topic1['id']}/flashcards")
     assert response.status_code == status.HTTP_200_OK
+    # Полный список темы отдается потоком, без сборки всего тела в памяти
+    assert "content-length" not in response.headers
     flashcards = response.json()
     assert len(flashcards) == 2
     assert any(f["id"] == flashcard1_topic1["id"] for f in flashcards)
@@ -173,6 +176,18 @@ def test_update_flashcard(client):
     )
 
 
+def test_update_flashcard_with_timezone_offset(client):
+    """Проверяет, что время повторения с часовым поясом возвращается как локальное время сервера без пояса"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+    reviewed_at = datetime.fromisoformat("2024-01-01T10:00:00+03:00")
+    response = client.patch(f"/flashcards/{flashcard['id']}", json={"last_reviewed_at": reviewed_at.isoformat()})
+    assert response.status_code == status.HTTP_200_OK
+    expected = reviewed_at.astimezone().replace(tzinfo=None).isoformat()
+    assert response.json()["last_reviewed_at"] == expected
+    assert client.get(f"/flashcards/{flashcard['id']}").json()["last_reviewed_at"] == expected
+
+
 def test_update_flashcard_not_found(client):
     """Проверяет, что PATCH /flashcards/{id} возвращает 404 для несуществующей карточки"""
     update_data = {"question": "Обновление", "answer": "Описание"}
@@ -181,6 +196,16 @@ def test_update_flashcard_not_found(client):
     assert response.json()["detail"] == "Карточка с указанным id не найдена"
 
 
+def test_update_flashcard_to_missing_topic(client):
+    """Проверяет, что перенос карточки в несуществующую тему возвращает 422, а не конфликт, и не меняет карточку"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+    response = client.patch(f"/flashcards/{flashcard['id']}", json={"topic_id": 9999, "question": "Новый вопрос"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert response.json()["reason"] == "Тема 9999 не найдена"
+    assert client.get(f"/flashcards/{flashcard['id']}").json() == flashcard
+
+
 def test_delete_flashcard(client):
     """Проверяет, что DELETE /flashcards/{flashcard_id} удаляет карточку по id"""
     topic = create_test_topic(client)
@@ -201,3 +226,121 @@ def test_delete_flashcard_not_found(client):
     response = client.get("/flashcards/9999")
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json()["detail"] == "Карточка не найдена"
+
+
+def test_read_flashcards_keyset_pagination(client):
+    """Проверяет постраничное чтение GET /flashcards?limit=&after= по курсору"""
+    topic = create_test_topic(client)
+    created_ids = [create_test_flashcard(client, topic["id"], f"Вопрос {i}", f"Ответ {i}")["id"] for i in range(5)]
+
+    response = client.get("/flashcards", params={"limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+    assert [f["id"] for f in response.json()] == created_ids[:2]
+    assert response.headers["X-Next-Cursor"] == str(created_ids[1])
+
+    response = client.get("/flashcards", params={"limit": 2, "after": response.headers["X-Next-Cursor"]})
+    assert [f["id"] for f in response.json()] == created_ids[2:4]
+
+    response = client.get("/flashcards", params={"limit": 2, "after": created_ids[3]})
+    assert [f["id"] for f in response.json()] == created_ids[4:]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_read_flashcards_by_topic_id_pagination(client):
+    """Проверяет, что постраничное чтение карточек темы не захватывает карточки других тем"""
+    topic1 = create_test_topic(client, "Первая тема")
+    topic2 = create_test_topic(client, "Вторая тема")
+    first = create_test_flashcard(client, topic1["id"], "Вопрос 1", "Ответ 1")
+    create_test_flashcard(client, topic2["id"], "Вопрос 2", "Ответ 2")
+    third = create_test_flashcard(client, topic1["id"], "Вопрос 3", "Ответ 3")
+
+    response = client.get(f"/topics/{topic1['id']}/flashcards", params={"limit": 1, "after": first["id"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert [f["id"] for f in response.json()] == [third["id"]]
+
+
+def test_read_flashcards_stream_ndjson(client):
+    """Проверяет потоковую выдачу GET /flashcards в формате NDJSON"""
+    topic = create_test_topic(client)
+    created = [create_test_flashcard(client, topic["id"], f"Вопрос {i}", f"Ответ {i}") for i in range(3)]
+
+    response = client.get("/flashcards", params={"stream": True})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == created
+
+    response = client.get("/flashcards", params={"limit": 1}, headers={"Accept": "application/x-ndjson"})
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [created[0]["id"]]
+
+
+def test_read_flashcards_limit_validation(client):
+    """Проверяет, что слишком большой размер страницы отклоняется"""
+    response = client.get("/flashcards", params={"limit": 100000})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_similar_flashcards_and_reject_mode(client):
+    """Проверяет поиск похожих карточек и отклонение слишком похожей карточки при создании"""
+    topic = create_test_topic(client)
+    original = create_test_flashcard(
+        client, topic["id"], "Какая столица у Франции?", "Столица Франции - город Париж на реке Сена"
+    )
+    near = create_test_flashcard(
+        client, topic["id"], "Какая столица у Франции", "Столица Франции - Париж на реке Сена"
+    )
+    create_test_flashcard(client, topic["id"], "Сколько будет дважды два?", "Четыре")
+
+    response = client.get(f"/flashcards/{original['id']}/similar")
+    assert response.status_code == status.HTTP_200_OK
+    similar = response.json()
+    assert [flashcard["id"] for flashcard in similar] == [near["id"]]
+    assert 0.5 <= similar[0]["similarity"] < 1
+
+    rejected = client.post(
+        f"/topics/{topic['id']}/flashcards",
+        params={"max_similarity": 0.7},
+        json={"question": "Какая столица Франции?", "answer": "Столица Франции - город Париж на реке Сена!"},
+    )
+    assert rejected.status_code == status.HTTP_409_CONFLICT
+    assert rejected.json()["flashcard_id"] == original["id"]
+
+    accepted = client.post(
+        f"/topics/{topic['id']}/flashcards",
+        params={"max_similarity": 0.7},
+        json={"question": "Какая столица Германии?", "answer": "Берлин"},
+    )
+    assert accepted.status_code == status.HTTP_201_CREATED
+    assert client.get("/flashcards/99999/similar").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_batch_get_flashcards_reports_missing_ids(client):
+    """Проверяет, что GET /flashcards?ids= и POST /flashcards/batch-get возвращают карточки в порядке id
+    и отмечают отсутствующие, не превращая весь ответ в ошибку"""
+    topic = create_test_topic(client)
+    first = create_test_flashcard(client, topic["id"], "Первый вопрос")
+    second = create_test_flashcard(client, topic["id"], "Второй вопрос")
+    missing_id = second["id"] + 100
+
+    response = client.get(f"/flashcards?ids={second['id']},{missing_id},{first['id']},{second['id']}")
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert (body["found"], body["missing"]) == (3, 1)
+    assert [(item["id"], item["status"]) for item in body["items"]] == [
+        (second["id"], "found"),
+        (missing_id, "not_found"),
+        (first["id"], "found"),
+        (second["id"], "found"),
+    ]
+    assert body["items"][0]["flashcard"]["question"] == "Второй вопрос"
+    assert body["items"][0]["etag"] == client.get(f"/flashcards/{second['id']}").headers["etag"]
+    assert body["items"][1]["flashcard"] is None
+
+    response = client.post("/flashcards/batch-get", json={"ids": [missing_id, first["id"]]})
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["status"] for item in response.json()["items"]] == ["not_found", "found"]
+
+    assert client.get("/flashcards?ids=1,x").status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert client.post("/flashcards/batch-get", json={"ids": []}).status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    too_many = ",".join(str(i) for i in range(1, 1002))
+    assert client.get(f"/flashcards?ids={too_many}").status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
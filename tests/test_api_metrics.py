@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from starlette import status
+from starlette.requests import Request
+
+from app import main
+from app.database.instrumentation import query_label
+
+
+def metric_value(client, sample):
+    """Возвращает значение метрики из /metrics или 0, если такой строки еще нет
+
+    Метрики API общие для всего приложения, поэтому тесты сравнивают значения до и после действия.
+    """
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+
+def test_metrics_report_route_latency_and_queries(client):
+    """Проверяет, что /metrics содержит гистограммы по шаблонам маршрутов и статистику запросов к базе"""
+    route_count = 'flashmind_http_request_duration_seconds_count{method="GET",route="/topics/{topic_id}",status="200"}'
+    route_queries = 'flashmind_http_request_db_queries_total{method="GET",route="/topics/{topic_id}"}'
+    before = metric_value(client, route_count), metric_value(client, route_queries)
+
+    topic = client.post("/topics", json={"name": "Тема", "description": "Описание"}).json()
+    response = client.get(f"/topics/{topic['id']}")
+    assert 'desc="1 queries"' in response.headers["server-timing"]
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == status.HTTP_200_OK
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert metric_value(client, route_count) == before[0] + 1
+    assert metric_value(client, route_queries) == before[1] + 1
+    label = query_label("SELECT * FROM topics WHERE id = ?")
+    assert label.startswith("select:topics:")
+    assert metric_value(client, f'flashmind_db_query_rows_total{{query="{label}"}}') == 1
+    assert metric_value(client, 'flashmind_db_pool_connections_open{pool="write"}') == 1
+
+
+def test_metrics_are_rendered_off_the_event_loop(client, monkeypatch):
+    """Проверяет, что запросы метрик к базе выполняются на потоке базы данных, а не в цикле событий"""
+    threads = []
+
+    def render(*args):
+        threads.append(threading.current_thread().name)
+        return render_prometheus(*args)
+
+    render_prometheus = main.render_prometheus
+    monkeypatch.setattr(main, "render_prometheus", render)
+    assert client.get("/metrics").status_code == status.HTTP_200_OK
+    assert threads[0].startswith("simpledb")
+
+
+def test_unhandled_exceptions_are_counted(client):
+    """Проверяет, что общий обработчик исключений учитывает их по типу"""
+    sample = 'flashmind_http_exceptions_total{type="ZeroDivisionError"}'
+    before = metric_value(client, sample)
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+    response = asyncio.run(main.general_exception_handler(request, ZeroDivisionError("деление на ноль")))
+    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert metric_value(client, sample) == before + 1
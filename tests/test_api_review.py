@@ -0,0 +1,179 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from starlette import status
+from starlette.websockets import WebSocketDisconnect
+
+from app.database.scheduler import ReviewState, schedule
+from tests.test_api_flashcards import create_test_flashcard
+from tests.test_api_topics import create_test_topic
+
+
+def test_schedule_sm2_intervals():
+    """Проверяет интервалы SM-2: 1 день, 6 дней, затем интервал умножается на коэффициент легкости"""
+    reviewed_at = datetime(2024, 1, 1)
+    state, due_at = schedule(ReviewState(), 5, reviewed_at)
+    assert (state.repetitions, state.interval_days, due_at) == (1, 1, reviewed_at + timedelta(days=1))
+    state, _ = schedule(state, 5, reviewed_at)
+    assert state.interval_days == 6
+    state, _ = schedule(state, 4, reviewed_at)
+    assert state.interval_days == round(6 * 2.7)
+
+    failed, due_at = schedule(state, 1, reviewed_at)
+    assert (failed.repetitions, failed.interval_days) == (0, 1)
+    assert failed.ease_factor < state.ease_factor
+
+
+def test_review_queue_returns_due_cards(client):
+    """Проверяет, что GET /topics/{topic_id}/review возвращает новые карточки темы в порядке повторения"""
+    topic = create_test_topic(client)
+    other_topic = create_test_topic(client, "Другая тема")
+    created = [create_test_flashcard(client, topic["id"], f"Вопрос {i}", f"Ответ {i}") for i in range(3)]
+    create_test_flashcard(client, other_topic["id"], "Чужой вопрос", "Ответ")
+
+    response = client.get(f"/topics/{topic['id']}/review", params={"limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+    assert [f["id"] for f in response.json()] == [created[0]["id"], created[1]["id"]]
+    assert response.json()[0]["due_at"] is not None
+
+
+def test_review_flashcard_reschedules(client):
+    """Проверяет, что POST /flashcards/{id}/review записывает повторение и убирает карточку из очереди"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+    reviewed_at = datetime.now()
+
+    response = client.post(
+        f"/flashcards/{flashcard['id']}/review", json={"grade": 5, "reviewed_at": reviewed_at.isoformat()}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    reviewed = response.json()
+    assert reviewed["last_reviewed_at"] == reviewed_at.isoformat()
+    assert datetime.fromisoformat(reviewed["due_at"]) == reviewed_at + timedelta(days=1)
+
+    response = client.get(f"/topics/{topic['id']}/review")
+    assert response.json() == []
+
+
+def test_review_flashcard_validation(client):
+    """Проверяет ошибки записи повторения: неверная оценка и несуществующая карточка"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+
+    response = client.post(f"/flashcards/{flashcard['id']}/review", json={"grade": 6})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+    response = client.post("/flashcards/9999/review", json={"grade": 3})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Карточка не найдена"
+
+    response = client.get("/topics/9999/review")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_review_session_pushes_cards_and_writes_grades_in_batches(client):
+    """Проверяет, что сессия повторения досылает карточки по мере оценок и записывает оценки пачками"""
+    topic = create_test_topic(client)
+    created = [create_test_flashcard(client, topic["id"], f"Вопрос {i}", f"Ответ {i}") for i in range(5)]
+
+    with client.websocket_connect(f"/topics/{topic['id']}/session?prefetch=2&batch_size=2") as websocket:
+        first = websocket.receive_json()
+        assert first["type"] == "cards"
+        assert [card["id"] for card in first["cards"]] == [created[0]["id"], created[1]["id"]]
+
+        websocket.send_json({"type": "grade", "id": created[0]["id"], "grade": 5})
+        graded = websocket.receive_json()
+        assert (graded["type"], graded["pending"]) == ("graded", 1)
+        assert [card["id"] for card in graded["cards"]] == [created[2]["id"]]
+        # Пока оценка не записана, карточка остается в очереди повторения
+        assert created[0]["id"] in [card["id"] for card in client.get(f"/topics/{topic['id']}/review").json()]
+
+        websocket.send_json({"type": "grade", "id": created[1]["id"], "grade": 4})
+        saved = websocket.receive_json()
+        assert saved["type"] == "saved"
+        assert [card["id"] for card in saved["flashcards"]] == [created[0]["id"], created[1]["id"]]
+        assert all(card["last_reviewed_at"] is not None for card in saved["flashcards"])
+        graded = websocket.receive_json()
+        assert (graded["pending"], [card["id"] for card in graded["cards"]]) == (0, [created[3]["id"]])
+
+        websocket.send_json({"type": "grade", "id": created[0]["id"], "grade": 5})
+        assert websocket.receive_json()["type"] == "error"
+        websocket.send_json({"type": "grade", "id": created[2]["id"], "grade": 9})
+        assert websocket.receive_json()["type"] == "error"
+
+        websocket.send_json({"type": "grade", "id": created[2]["id"], "grade": 3})
+        assert websocket.receive_json()["type"] == "graded"
+        websocket.send_json({"type": "end"})
+        assert websocket.receive_json()["type"] == "saved"
+        assert websocket.receive_json() == {"type": "summary", "reviewed": 3}
+
+    due = [card["id"] for card in client.get(f"/topics/{topic['id']}/review").json()]
+    assert due == [created[3]["id"], created[4]["id"]]
+
+
+def test_review_session_saves_grades_on_disconnect(client):
+    """Проверяет, что оценки, принятые до разрыва соединения, записываются, а для неизвестной темы сессия закрывается"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+
+    with client.websocket_connect(f"/topics/{topic['id']}/session") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "grade", "id": flashcard["id"], "grade": 5})
+        websocket.receive_json()
+    assert client.get(f"/flashcards/{flashcard['id']}").json()["last_reviewed_at"] is not None
+
+    with client.websocket_connect("/topics/999/session") as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 4404
+
+
+def test_review_session_rejects_binary_frames(client):
+    """Проверяет, что бинарное сообщение закрывает сессию с кодом 1003, а принятые оценки записываются"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+
+    with client.websocket_connect(f"/topics/{topic['id']}/session") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "grade", "id": flashcard["id"], "grade": 5})
+        websocket.receive_json()
+        websocket.send_bytes(b"\x00")
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1003
+    assert client.get(f"/flashcards/{flashcard['id']}").json()["last_reviewed_at"] is not None
+
+
+def test_review_session_keeps_grades_when_flush_fails(client, test_db, monkeypatch, caplog):
+    """Проверяет, что оценки неудавшейся записи остаются в очереди, а потерянные при закрытии попадают в журнал"""
+    topic = create_test_topic(client)
+    first, second = (create_test_flashcard(client, topic["id"], f"Вопрос {i}") for i in range(2))
+    failures = []
+
+    async def review_flashcards(reviews):
+        if failures:
+            failures.pop()
+            raise sqlite3.OperationalError("disk I/O error")
+        return await asyncio.to_thread(test_db.review_flashcards, reviews)
+
+    monkeypatch.setattr(test_db.aio, "review_flashcards", review_flashcards)
+    with client.websocket_connect(f"/topics/{topic['id']}/session?batch_size=1") as websocket:
+        websocket.receive_json()
+        failures.append(True)
+        websocket.send_json({"type": "grade", "id": first["id"], "grade": 5})
+        error = websocket.receive_json()
+        assert (error["type"], error["pending"]) == ("error", [first["id"]])
+        assert websocket.receive_json()["type"] == "graded"
+        websocket.send_json({"type": "flush"})
+        saved = websocket.receive_json()
+        assert [card["id"] for card in saved["flashcards"]] == [first["id"]]
+
+    with client.websocket_connect(f"/topics/{topic['id']}/session?batch_size=5") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "grade", "id": second["id"], "grade": 4})
+        websocket.receive_json()
+        failures.append(True)
+    assert f"({second['id']}, 4," in caplog.text
+    assert client.get(f"/flashcards/{second['id']}").json()["last_reviewed_at"] is None
@@ -0,0 +1,55 @@
+from starlette import status
+
+from tests.test_api_flashcards import create_test_flashcard
+from tests.test_api_topics import create_test_topic
+
+
+def test_search_flashcards_ranked_with_snippets(client):
+    """Проверяет поиск по вопросу и ответу с выделением совпадений"""
+    topic = create_test_topic(client)
+    python = create_test_flashcard(client, topic["id"], "Что такое Python?", "Язык программирования")
+    fastapi = create_test_flashcard(client, topic["id"], "Что такое FastAPI?", "Веб-фреймворк на Python")
+    create_test_flashcard(client, topic["id"], "Что такое SQLite?", "Встраиваемая база данных")
+
+    response = client.get("/flashcards/search", params={"q": "python"})
+    assert response.status_code == status.HTTP_200_OK
+    hits = response.json()
+    assert [hit["id"] for hit in hits] == [python["id"], fastapi["id"]]
+    assert "<mark>Python</mark>" in hits[0]["snippet"]
+
+    response = client.get("/flashcards/search", params={"q": "python веб"})
+    assert [hit["id"] for hit in response.json()] == [fastapi["id"]]
+
+
+def test_search_flashcards_follows_updates_and_deletes(client):
+    """Проверяет, что индекс поиска обновляется при изменении и удалении карточек"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"], "Старый вопрос", "Ответ")
+
+    client.patch(f"/flashcards/{flashcard['id']}", json={"question": "Новый вопрос"})
+    assert client.get("/flashcards/search", params={"q": "старый"}).json() == []
+    assert len(client.get("/flashcards/search", params={"q": "новый"}).json()) == 1
+
+    client.delete(f"/flashcards/{flashcard['id']}")
+    assert client.get("/flashcards/search", params={"q": "новый"}).json() == []
+
+
+def test_search_flashcards_topic_filter_and_pagination(client):
+    """Проверяет фильтр по теме, постраничную выдачу и безопасность спецсимволов в запросе"""
+    topic1 = create_test_topic(client, "Первая тема")
+    topic2 = create_test_topic(client, "Вторая тема")
+    for i in range(3):
+        create_test_flashcard(client, topic1["id"], f"Общий вопрос {i}", "Ответ")
+    create_test_flashcard(client, topic2["id"], "Общий вопрос другой темы", "Ответ")
+
+    response = client.get("/flashcards/search", params={"q": "общий", "topic_id": topic1["id"]})
+    assert len(response.json()) == 3
+    assert all(hit["topic_id"] == topic1["id"] for hit in response.json())
+
+    first_page = client.get("/flashcards/search", params={"q": "общий", "limit": 2}).json()
+    second_page = client.get("/flashcards/search", params={"q": "общий", "limit": 2, "offset": 2}).json()
+    assert len(first_page) == 2 and len(second_page) == 2
+    assert not {hit["id"] for hit in first_page} & {hit["id"] for hit in second_page}
+
+    response = client.get("/flashcards/search", params={"q": 'NEAR("общий" AND *'})
+    assert response.status_code == status.HTTP_200_OK
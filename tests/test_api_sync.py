@@ -0,0 +1,68 @@
+from starlette import status
+
+
+def create_test_topic(client, name="Тестовая тема"):
+    """Создает тему и возвращает ее в виде JSON"""
+    response = client.post("/topics", json={"name": name, "description": "Описание"})
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+
+def create_test_flashcard(client, topic_id, question="Вопрос"):
+    """Создает карточку в теме и возвращает ее в виде JSON"""
+    response = client.post(f"/topics/{topic_id}/flashcards", json={"question": question, "answer": "Ответ"})
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+
+def test_sync_from_zero_returns_everything(client):
+    """Проверяет, что синхронизация с since=0 возвращает все темы и карточки"""
+    topic = create_test_topic(client)
+    flashcard = create_test_flashcard(client, topic["id"])
+
+    response = client.get("/sync")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [item["id"] for item in data["topics"]] == [topic["id"]]
+    assert [item["id"] for item in data["flashcards"]] == [flashcard["id"]]
+    assert data["deleted_topics"] == data["deleted_flashcards"] == []
+    assert data["has_more"] is False
+    assert data["next_since"] > 0
+
+
+def test_sync_returns_only_delta_and_tombstones(client):
+    """Проверяет, что после курсора возвращаются только измененные записи и id удаленных"""
+    topic = create_test_topic(client)
+    kept = create_test_flashcard(client, topic["id"], "Оставить")
+    changed = create_test_flashcard(client, topic["id"], "Изменить")
+    removed = create_test_flashcard(client, topic["id"], "Удалить")
+    since = client.get("/sync").json()["next_since"]
+
+    client.patch(f"/flashcards/{changed['id']}", json={"answer": "Новый ответ"})
+    client.delete(f"/flashcards/{removed['id']}")
+
+    data = client.get("/sync", params={"since": since}).json()
+    assert data["topics"] == []
+    assert [(item["id"], item["answer"]) for item in data["flashcards"]] == [(changed["id"], "Новый ответ")]
+    assert data["deleted_flashcards"] == [removed["id"]]
+    assert kept["id"] not in [item["id"] for item in data["flashcards"]]
+
+    assert client.get("/sync", params={"since": data["next_since"]}).json()["flashcards"] == []
+
+
+def test_sync_pages_through_changes(client):
+    """Проверяет, что изменения можно забрать постранично, и каждая запись попадает в ответ один раз"""
+    topic = create_test_topic(client)
+    for i in range(5):
+        create_test_flashcard(client, topic["id"], f"Вопрос {i}")
+
+    seen = []
+    since = 0
+    while True:
+        data = client.get("/sync", params={"since": since, "limit": 2}).json()
+        seen += [("topic", item["id"]) for item in data["topics"]]
+        seen += [("flashcard", item["id"]) for item in data["flashcards"]]
+        since = data["next_since"]
+        if not data["has_more"]:
+            break
+    assert len(seen) == len(set(seen)) == 6
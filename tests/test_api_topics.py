@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 from starlette import status
@@ -121,8 +122,104 @@ def test_delete_topic(client):
     assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
+def test_delete_topic_deletes_its_flashcards(client):
+    """Проверяет, что DELETE /topics/{topic_id} удаляет и карточки темы"""
+    topic_id = create_test_topic(client, "Тема с карточками", "Описание")["id"]
+    flashcard = client.post(f"/topics/{topic_id}/flashcards", json={"question": "Вопрос", "answer": "Ответ"}).json()
+
+    assert client.delete(f"/topics/{topic_id}").status_code == status.HTTP_202_ACCEPTED
+    assert client.get(f"/flashcards/{flashcard['id']}").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/flashcards").json() == []
+
+
 def test_delete_topic_not_found(client):
     """Проверяет, что DELETE /topics/{topic_id} возвращает 404 для несуществующей темы"""
     response = client.delete("/topics/99999")
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json()["detail"] == "Тема не найдена"
+
+
+def test_create_topic_with_existing_name_returns_existing(client):
+    """Проверяет, что POST /topics с уже существующим именем возвращает существующую тему"""
+    created_topic = create_test_topic(client, "Повторяющаяся тема", "Первое описание")
+
+    response = client.post("/topics", json={"name": "Повторяющаяся тема", "description": "Второе описание"})
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["id"] == created_topic["id"]
+    assert response.json()["description"] == "Первое описание"
+
+
+def test_update_topic_to_existing_name_conflict(client):
+    """Проверяет, что PATCH /topics/{id} с именем другой темы возвращает 409"""
+    create_test_topic(client, "Первая тема")
+    second_topic = create_test_topic(client, "Вторая тема")
+
+    response = client.patch(f"/topics/{second_topic['id']}", json={"name": "Первая тема"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["status"] == 409
+
+
+def test_read_topics_pagination_and_stream(client):
+    """Проверяет постраничное и потоковое чтение GET /topics"""
+    topics = [create_test_topic(client, f"Тема {i}") for i in range(3)]
+
+    response = client.get("/topics", params={"limit": 2})
+    assert [t["id"] for t in response.json()] == [topics[0]["id"], topics[1]["id"]]
+    response = client.get("/topics", params={"after": response.headers["X-Next-Cursor"]})
+    assert [t["id"] for t in response.json()] == [topics[2]["id"]]
+
+    response = client.get("/topics", params={"stream": True})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == topics
+
+
+def test_topic_stats(client, monkeypatch):
+    """Проверяет GET /topics/{topic_id}/stats и GET /topics?include=stats"""
+    topic_id = create_test_topic(client, "Тема со статистикой")["id"]
+    empty_topic_id = create_test_topic(client, "Пустая тема")["id"]
+    for question, difficulty_level in (("Вопрос 1", 1), ("Вопрос 2", 4)):
+        client.post(
+            f"/topics/{topic_id}/flashcards",
+            json={"question": question, "answer": "Ответ", "difficulty_level": difficulty_level},
+        )
+
+    response = client.get(f"/topics/{topic_id}/stats")
+    assert response.status_code == status.HTTP_200_OK
+    stats = response.json()
+    assert stats["card_count"] == 2
+    assert stats["average_difficulty"] == 2.5
+    assert stats["difficulty_histogram"] == [
+        {"difficulty_level": 1, "card_count": 1},
+        {"difficulty_level": 4, "card_count": 1},
+    ]
+    assert stats["due_count"] == 2
+    assert stats["last_reviewed_at"] is None
+
+    response = client.get("/topics", params={"include": "stats"})
+    assert response.status_code == status.HTTP_200_OK
+    assert "etag" not in response.headers
+    topics = {topic["id"]: topic for topic in response.json()}
+    assert topics[topic_id]["stats"] == stats
+    assert topics[empty_topic_id]["stats"]["card_count"] == 0
+    assert topics[empty_topic_id]["stats"]["average_difficulty"] is None
+
+    # Тема, удаленная между чтением тем и статистики, не ломает ответ
+    async def no_stats(topic_ids, now=None):
+        return {}
+
+    monkeypatch.setattr("app.main.db.aio.get_topics_stats", no_stats)
+    topics = {topic["id"]: topic for topic in client.get("/topics", params={"include": "stats"}).json()}
+    assert topics[topic_id]["stats"]["card_count"] == 0
+
+    assert client.get("/topics/99999/stats").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/topics", params={"include": "cards"}).status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_batch_get_topics(client):
+    """Проверяет, что GET /topics?ids= и POST /topics/batch-get возвращают найденные темы и отмечают отсутствующие"""
+    topic = create_test_topic(client)
+    body = client.get(f"/topics?ids={topic['id']},{topic['id'] + 1}").json()
+    assert (body["found"], body["missing"]) == (1, 1)
+    assert body["items"][0]["topic"]["name"] == topic["name"]
+    assert body["items"][1] == {"id": topic["id"] + 1, "status": "not_found", "etag": None, "topic": None}
+    assert client.post("/topics/batch-get", json={"ids": [topic["id"]]}).json()["found"] == 1
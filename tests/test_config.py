@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+from app import main
+from app.config import Settings
+
+# main импортирует базу как модули верхнего уровня database.*, поэтому и тест берет классы оттуда
+from database.database import SimpleDB  # noqa: E402  isort:skip
+from database.lazy import LazySimpleDB  # noqa: E402  isort:skip
+
+
+def test_settings_read_environment(monkeypatch, tmp_path):
+    """Проверяет, что настройки читаются из переменных FLASHMIND_ и путь к базе становится абсолютным"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("FLASHMIND_DB_PATH", "data.db")
+    monkeypatch.setenv("FLASHMIND_BUSY_RETRIES", "7")
+    monkeypatch.setenv("FLASHMIND_COMPACTION_INTERVAL", "0")
+    options = Settings().database_options()
+    assert options["db_file"] == str(tmp_path / "data.db")
+    assert options["storage"].busy_retries == 7
+    assert options["compaction_interval"] is None
+
+
+def test_lifespan_opens_and_closes_database(monkeypatch, tmp_path):
+    """Проверяет, что база открывается при запуске приложения, а не при импорте, и закрывается при остановке"""
+    lazy = LazySimpleDB(lambda: SimpleDB(db_file=str(tmp_path / "flashcards.db")))
+    monkeypatch.setattr("app.main.db", lazy)
+    assert not lazy.opened
+    with TestClient(main.app) as client:
+        assert lazy.opened
+        assert client.post("/topics", json={"name": "Тема", "description": "Описание"}).status_code == 201
+    assert not lazy.opened
+    assert (tmp_path / "flashcards.db").exists()
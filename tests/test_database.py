@@ -0,0 +1,642 @@
+import asyncio
+import gc
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from app.database.cache import ReadThroughCache
+from app.database.compaction import Compactor
+from app.database.database import SimpleDB
+from app.database.instrumentation import InstrumentedCursor
+from app.database.migrations import MIGRATIONS, migrate, schema_version
+from app.database.pool import ConnectionPool, PoolTimeoutError
+from app.database.storage import DatabaseBusy, StorageConfig
+from app.database.timestamps import to_timestamp
+from app.serialization import dumps, flashcard_dict
+
+
+@pytest.fixture(name="file_db")
+def file_db_fixture(tmp_path):
+    """Создает SimpleDB поверх файла во временной директории, чтобы пул мог открыть несколько соединений"""
+    db_instance = SimpleDB(db_file=str(tmp_path / "flashcards.db"), pool_size=4)
+    yield db_instance
+    db_instance.close()
+
+
+def test_memory_db_uses_single_connection(test_db):
+    """Проверяет, что для базы в памяти пул состоит из одного соединения"""
+    test_db.create_topic("Тема")
+    test_db.create_topic("Другая тема")
+    assert test_db.pool_stats()["write"]["open"] == 1
+    assert test_db.read_pool is test_db.pool
+    assert len(test_db.get_all_topics()) == 2
+
+
+def test_concurrent_creates_return_own_rows(file_db):
+    """Проверяет, что при параллельной записи каждый поток получает именно свою созданную карточку"""
+    topic = file_db.create_topic("Параллельная тема")
+
+    def create(i):
+        return file_db.create_flashcard(topic[0], f"Вопрос {i}", f"Ответ {i}")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        flashcards = list(executor.map(create, range(50)))
+
+    assert [flashcard[2] for flashcard in flashcards] == [f"Вопрос {i}" for i in range(50)]
+    assert len({flashcard[0] for flashcard in flashcards}) == 50
+    assert len(file_db.get_flashcards_by_topic(topic[0])) == 50
+
+    stats = file_db.pool_stats()
+    assert stats["write"]["open"] == 1
+    assert stats["read"]["open"] <= 4
+    assert stats["read"]["in_use"] == 0
+    assert stats["write"]["checkouts"] >= 50
+
+
+def test_file_db_uses_wal_and_read_only_readers(file_db):
+    """Проверяет, что база работает в режиме WAL, а читающие соединения не могут писать"""
+    with file_db._write() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+    with file_db._read() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO topics(name) VALUES ('Запрещено')")
+
+
+def test_readers_do_not_block_on_open_write(file_db):
+    """Проверяет, что чтение из другого потока не ждет завершения открытой транзакции записи"""
+    file_db.create_topic("Видимая тема")
+    with file_db._write() as conn:
+        conn.execute("INSERT INTO topics(name) VALUES ('Незафиксированная тема')")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            topics = executor.submit(file_db.get_all_topics).result(timeout=1)
+    assert [topic[1] for topic in topics] == ["Видимая тема"]
+
+
+def test_pool_reuses_connection_within_thread(tmp_path):
+    """Проверяет, что вложенный запрос соединения в том же потоке возвращает то же соединение"""
+    pool = ConnectionPool(lambda: sqlite3.connect(str(tmp_path / "x.db"), check_same_thread=False), size=1)
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+    assert pool.stats()["checkouts"] == 1
+    pool.close()
+
+
+def test_pool_timeout(tmp_path):
+    """Проверяет, что при исчерпании пула ожидание соединения завершается ошибкой по таймауту"""
+    pool = ConnectionPool(
+        lambda: sqlite3.connect(str(tmp_path / "x.db"), check_same_thread=False), size=1, timeout=0.05
+    )
+    with pool.connection():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(lambda: pool.connection().__enter__())
+            with pytest.raises(PoolTimeoutError):
+                future.result()
+    assert pool.stats()["timeouts"] == 1
+    pool.close()
+
+
+def test_migrations_create_lookup_indexes(test_db):
+    """Проверяет, что миграции доводят схему до последней версии и создают индексы для поиска"""
+    with test_db._read() as conn:
+        assert schema_version(conn) == MIGRATIONS[-1][0]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM flashcards WHERE question = ?", ("x",)).fetchall()
+    assert {"ux_topics_name", "ux_flashcards_question", "ix_flashcards_topic_id"} <= indexes
+    assert "ux_flashcards_question" in plan[0][-1]
+
+
+def test_migrations_upgrade_existing_database(tmp_path):
+    """Проверяет, что база, созданная до появления миграций, обновляется без потери данных"""
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    migrate(conn, target=1)
+    conn.execute("PRAGMA user_version = 0")
+    conn.execute("INSERT INTO topics(name) VALUES ('Старая тема')")
+    conn.commit()
+    conn.close()
+
+    db_instance = SimpleDB(db_file=path)
+    assert db_instance.get_topic_by_name("Старая тема") is not None
+    assert db_instance.create_topic("Старая тема")[0] == 1
+    db_instance.close()
+
+
+def test_create_flashcard_deduplicates_by_question(test_db):
+    """Проверяет, что повторное создание карточки с тем же вопросом возвращает существующую"""
+    topic = test_db.create_topic("Тема")
+    first = test_db.create_flashcard(topic[0], "Вопрос", "Ответ")
+    second = test_db.create_flashcard(topic[0], "Вопрос", "Другой ответ")
+    assert second == first
+    assert len(test_db.get_all_flashcards()) == 1
+
+
+def test_async_interface_runs_on_db_threads(test_db):
+    """Проверяет, что асинхронный интерфейс возвращает те же данные и выполняет запросы вне цикла событий"""
+    topic = test_db.create_topic("Тема")
+
+    async def scenario():
+        flashcard = await test_db.aio.create_flashcard(topic[0], "Вопрос", "Ответ")
+        topics, flashcards = await asyncio.gather(test_db.aio.get_all_topics(), test_db.aio.get_all_flashcards())
+        thread_name = await test_db.aio.run(lambda: threading.current_thread().name)
+        return flashcard, topics, flashcards, thread_name
+
+    flashcard, topics, flashcards, thread_name = asyncio.run(scenario())
+    assert topics == [topic]
+    assert flashcards == [flashcard]
+    assert thread_name.startswith("simpledb")
+
+
+def test_review_queue_uses_index_range_scan(test_db):
+    """Проверяет, что очередь повторения читается поиском по индексу (topic_id, due_at) без сортировки"""
+    with test_db._read() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM flashcards WHERE topic_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?",
+            (1, "2024-01-01", 10),
+        ).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_flashcards_topic_due" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_cache_serves_hot_reads_and_invalidates_on_write(test_db):
+    """Проверяет, что повторные чтения идут из кэша, а изменения сразу видны после записи"""
+    topic = test_db.create_topic("Тема")
+    flashcard = test_db.create_flashcard(topic[0], "Вопрос", "Ответ")
+    test_db.cache.clear()
+
+    for _ in range(3):
+        assert test_db.get_topic(topic[0]) == topic
+        assert test_db.get_flashcards_by_topic(topic[0]) == [flashcard]
+    stats = test_db.cache_stats()
+    assert (stats["misses"], stats["hits"]) == (2, 4)
+
+    test_db.update_topic(topic[0], name="Новое имя")
+    assert test_db.get_topic(topic[0])[1] == "Новое имя"
+
+    other_topic = test_db.create_topic("Другая тема")
+    test_db.update_flashcard(flashcard[0], topic_id=other_topic[0])
+    assert test_db.get_flashcards_by_topic(topic[0]) == []
+    assert test_db.get_flashcard_by_id(flashcard[0])[1] == other_topic[0]
+
+    test_db.review_flashcard(flashcard[0], 5)
+    assert test_db.get_flashcard_by_id(flashcard[0])[5] is not None
+
+    test_db.delete_flashcard(flashcard[0])
+    assert test_db.get_flashcard_by_id(flashcard[0]) is None
+    assert test_db.get_flashcards_by_topic(other_topic[0]) == []
+
+
+def test_topic_list_cache_follows_writes_of_other_connections(file_db, tmp_path):
+    """Проверяет, что закэшированный список карточек темы обновляется после записи другим экземпляром базы"""
+    topic = file_db.create_topic("Тема")
+    flashcard = file_db.create_flashcard(topic[0], "Вопрос", "старый")
+    assert file_db.get_flashcards_by_topic(topic[0])[0].answer == "старый"
+
+    other = SimpleDB(db_file=str(tmp_path / "flashcards.db"))
+    other.update_flashcard(flashcard[0], answer="новый")
+    other.close()
+    assert file_db.get_flashcards_by_topic(topic[0])[0].answer == "новый"
+
+
+def test_cache_ttl_and_eviction():
+    """Проверяет устаревание записей по времени жизни и вытеснение самых старых записей"""
+    now = [0.0]
+    cache = ReadThroughCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    loads = []
+
+    def loader(value):
+        loads.append(value)
+        return value
+
+    cache.get_or_load("a", lambda: loader(1))
+    cache.get_or_load("b", lambda: loader(2))
+    cache.get_or_load("a", lambda: loader(1))
+    cache.get_or_load("c", lambda: loader(3))
+    assert cache.stats()["evictions"] == 1
+    cache.get_or_load("b", lambda: loader(2))
+    assert loads == [1, 2, 3, 2]
+
+    now[0] = 11
+    cache.get_or_load("c", lambda: loader(3))
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cache_discards_value_loaded_during_invalidation():
+    """Проверяет, что значение, прочитанное до инвалидации, не попадает в кэш"""
+    cache = ReadThroughCache()
+
+    def stale_loader():
+        cache.invalidate("key")
+        return "старое значение"
+
+    assert cache.get_or_load("key", stale_loader) == "старое значение"
+    assert cache.get_or_load("key", lambda: "новое значение") == "новое значение"
+
+
+def test_cache_is_bypassed_inside_write_transaction(test_db):
+    """Проверяет, что незафиксированные изменения не попадают в кэш при откате транзакции"""
+    topic = test_db.create_topic("Тема")
+    with pytest.raises(RuntimeError):
+        with test_db._write() as conn:
+            conn.execute("UPDATE topics SET name = 'Откаченное имя' WHERE id = ?", (topic[0],))
+            assert test_db.get_topic(topic[0])[1] == "Откаченное имя"
+            raise RuntimeError
+    assert test_db.get_topic(topic[0])[1] == "Тема"
+
+
+def test_slow_queries_are_logged_with_plan(caplog):
+    """Проверяет, что запросы дольше порога попадают в журнал вместе с планом выполнения"""
+    db_instance = SimpleDB(":memory:", slow_query_ms=0)
+    topic = db_instance.create_topic("Тема")
+    db_instance.create_flashcard(topic[0], "Вопрос", "Ответ")
+    with caplog.at_level("WARNING"):
+        db_instance.get_flashcard_by_question("Вопрос")
+
+    slow = db_instance.query_stats.slow_queries[-1]
+    assert slow["sql"] == "SELECT * FROM flashcards WHERE question = ?"
+    assert slow["rows"] == 1
+    assert any("ux_flashcards_question" in step for step in slow["plan"])
+    assert "Медленный запрос" in caplog.text
+    db_instance.close()
+
+
+def test_unfinished_cursor_is_not_explained_by_finalizer(monkeypatch):
+    """Проверяет, что план снимается сразу после медленного execute, а финализатор курсора соединение не трогает"""
+    db_instance = SimpleDB(":memory:", slow_query_ms=0)
+    topic = db_instance.create_topic("Тема")
+    sql = "SELECT * FROM topics WHERE id = ?"
+    explained = []
+    original = InstrumentedCursor._explain
+    monkeypatch.setattr(
+        InstrumentedCursor, "_explain", lambda self, sql, params: explained.append(sql) or original(self, sql, params)
+    )
+    with db_instance._snapshot() as conn:
+        cursor = conn.execute(sql, (topic[0],))
+        assert cursor.fetchone()[0] == topic[0]
+        assert explained.count(sql) == 1
+        del cursor
+        gc.collect()
+
+    assert explained.count(sql) == 1
+    slow = [entry for entry in db_instance.query_stats.slow_queries if entry["sql"] == sql][-1]
+    assert any("topics" in step for step in slow["plan"])
+    assert "\n" not in slow["label"] and slow["label"].startswith("select:topics:")
+    db_instance.close()
+
+
+def test_query_stats_count_rows_for_reads_and_writes(test_db):
+    """Проверяет учет строк для чтения и изменения и объединение пачек IN (?, ...) разной длины"""
+    topic = test_db.create_topic("Тема")
+    test_db.create_flashcards_bulk(topic[0], [(f"В{i}", "О", 1) for i in range(3)])
+    test_db.create_flashcards_bulk(topic[0], [("Еще", "О", 1)])
+    with test_db._write() as conn:
+        conn.execute("UPDATE flashcards SET answer = 'Новый'")
+    stats = test_db.query_stats.snapshot()
+    assert stats["UPDATE flashcards SET answer = 'Новый'"]["rows"] == 4
+    assert sum(1 for sql in stats if "?..." in sql) >= 1
+    assert not any("?, ?" in sql for sql in stats)
+    assert stats["COMMIT"]["count"] >= 1
+
+
+@pytest.fixture(name="group_db")
+def group_db_fixture(tmp_path):
+    """Создает файловую SimpleDB с групповой фиксацией изменений"""
+    db_instance = SimpleDB(db_file=str(tmp_path / "flashcards.db"), group_commit=True, group_commit_window_ms=20)
+    yield db_instance
+    db_instance.close()
+
+
+def test_group_commit_coalesces_concurrent_writes(group_db):
+    """Проверяет, что параллельные повторения фиксируются меньшим числом транзакций и видны после ответа"""
+    topic = group_db.create_topic("Тема")
+    flashcards = [group_db.create_flashcard(topic[0], f"Вопрос {i}", "Ответ") for i in range(20)]
+    assert group_db.get_flashcard_by_id(flashcards[0][0])[11] == 0
+
+    async def review_all():
+        return await asyncio.gather(*(group_db.aio.review_flashcard(card[0], 5) for card in flashcards))
+
+    reviewed = asyncio.run(review_all())
+    assert [card[0] for card in reviewed] == [card[0] for card in flashcards]
+    # Кэш сброшен, а изменения зафиксированы и видны через соединения чтения
+    assert all(group_db.get_flashcard_by_id(card[0])[11] == 1 for card in flashcards)
+
+    stats = group_db.group_commit.stats()
+    assert stats["operations"] == 41
+    assert stats["batches"] < stats["operations"]
+    assert stats["max_batch_size"] > 1
+
+
+def test_group_commit_failure_rolls_back_only_failed_write(group_db):
+    """Проверяет, что ошибка одного изменения пачки не отменяет остальные"""
+    topic = group_db.create_topic("Тема")
+    card = group_db.create_flashcard(topic[0], "Вопрос", "Ответ")
+    writer = group_db.group_commit
+
+    def failing(db):
+        db.update_flashcard(card[0], answer="Откаченный ответ")
+        raise sqlite3.IntegrityError("ошибка изменения")
+
+    futures = [
+        writer.submit(SimpleDB.update_topic.__wrapped__, group_db, topic[0], name="Новое имя"),
+        writer.submit(failing, group_db),
+        writer.submit(SimpleDB.create_topic.__wrapped__, group_db, "Вторая тема"),
+    ]
+    assert futures[0].result()[1] == "Новое имя"
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[1].result()
+    assert futures[2].result()[1] == "Вторая тема"
+
+    assert group_db.get_flashcard_by_id(card[0])[3] == "Ответ"
+    assert [row[1] for row in group_db.get_all_topics()] == ["Новое имя", "Вторая тема"]
+    assert writer.stats()["failed_batches"] == 0
+
+
+def test_delete_topic_cascades_to_flashcards(test_db):
+    """Проверяет, что карточки удаляются вместе с темой, из поиска, кэша и с надгробиями в журнале"""
+    topic = test_db.create_topic("Тема")
+    other = test_db.create_topic("Другая тема")
+    cards = [test_db.create_flashcard(topic[0], f"Вопрос {i}", "Ответ") for i in range(3)]
+    kept = test_db.create_flashcard(other[0], "Оставшийся вопрос", "Ответ")
+    assert test_db.get_flashcard_by_id(cards[0][0]) is not None
+
+    assert test_db.delete_topic(topic[0])
+    assert test_db.get_flashcard_by_id(cards[0][0]) is None
+    assert [card[0] for card in test_db.get_all_flashcards()] == [kept[0]]
+    assert all(hit[0] == kept[0] for hit in test_db.search_flashcards("Вопрос"))
+    deleted = {(entity, entity_id) for _, entity, entity_id, is_deleted, _ in test_db.get_changes() if is_deleted}
+    assert deleted == {("topic", topic[0])} | {("flashcard", card[0]) for card in cards}
+
+
+def test_migration_removes_orphans_and_keeps_schema_objects(tmp_path):
+    """Проверяет, что миграция каскадного удаления убирает карточки без темы и сохраняет индексы и триггеры"""
+    path = str(tmp_path / "orphans.db")
+    conn = sqlite3.connect(path)
+    migrate(conn, target=6)
+    conn.execute("INSERT INTO topics(id, name) VALUES (1, 'Тема')")
+    conn.execute("INSERT INTO flashcards(topic_id, question, answer) VALUES (1, 'Живой вопрос', 'Ответ')")
+    conn.execute("INSERT INTO flashcards(topic_id, question, answer) VALUES (2, 'Сирота', 'Ответ')")
+    conn.commit()
+    objects = conn.execute("SELECT type, name FROM sqlite_master WHERE tbl_name = 'flashcards'").fetchall()
+    conn.close()
+
+    db_instance = SimpleDB(db_file=path)
+    assert [card[2] for card in db_instance.get_all_flashcards()] == ["Живой вопрос"]
+    assert db_instance.get_topic_stats(1)["card_count"] == 1
+    with db_instance._read() as conn:
+        assert set(objects) <= set(conn.execute("SELECT type, name FROM sqlite_master WHERE tbl_name = 'flashcards'"))
+        assert conn.execute("PRAGMA foreign_key_list(flashcards)").fetchone()[6] == "CASCADE"
+    assert db_instance.search_flashcards("Живой")[0][2] == "Живой вопрос"
+    with pytest.raises(sqlite3.IntegrityError):
+        db_instance.create_flashcard(99, "Вопрос без темы", "Ответ")
+    db_instance.close()
+
+
+def test_compact_returns_free_pages(tmp_path):
+    """Проверяет, что после удаления темы compact и фоновый поток возвращают свободные страницы"""
+    db_instance = SimpleDB(db_file=str(tmp_path / "compact.db"))
+    topic = db_instance.create_topic("Тема")
+    db_instance.create_flashcards_bulk(topic[0], [(f"Вопрос {i}", "Ответ " * 50, 1) for i in range(2000)])
+    db_instance.delete_topic(topic[0])
+
+    stats = db_instance.storage_stats()
+    assert stats["auto_vacuum"] == 2
+    assert stats["freelist_count"] > 100
+    assert db_instance.compact(max_pages=10, step_pages=4) == 10
+    assert db_instance.compact(step_pages=64) == stats["freelist_count"] - 10
+    assert db_instance.storage_stats()["freelist_count"] == 0
+    assert db_instance.storage_stats()["page_count"] < stats["page_count"]
+
+    topic = db_instance.create_topic("Тема")
+    db_instance.create_flashcards_bulk(topic[0], [(f"Вопрос {i}", "Ответ " * 50, 1) for i in range(500)])
+    db_instance.delete_topic(topic[0])
+    compactor = Compactor(db_instance, interval=3600, min_free_pages=1)
+    assert compactor.run_once() > 0
+    assert db_instance.storage_stats()["freelist_count"] == 0
+    compactor.close()
+    db_instance.close()
+
+
+def test_topic_stats_follow_writes(test_db):
+    """Проверяет, что счетчики тем обновляются при создании, изменении, повторении, переносе и удалении карточек"""
+    topic = test_db.create_topic("Тема")
+    other = test_db.create_topic("Другая тема")
+    first = test_db.create_flashcard(topic[0], "Первый", "Ответ", 1)
+    test_db.create_flashcard(topic[0], "Второй", "Ответ", 3)
+    test_db.create_flashcards_bulk(topic[0], [("Третий", "Ответ", 3), ("Четвертый", "Ответ", 5)])
+    moved = test_db.create_flashcard(topic[0], "Переносимый", "Ответ", 5)
+
+    test_db.update_flashcard(first[0], difficulty_level=2)
+    test_db.update_flashcard(moved[0], topic_id=other[0])
+    reviewed = datetime(2030, 1, 1, 12, 0)
+    test_db.review_flashcard(first[0], 5, reviewed_at=reviewed)
+    test_db.delete_flashcard(test_db.get_flashcard_by_question("Четвертый")[0])
+
+    stats = test_db.get_topic_stats(topic[0], now=datetime(2030, 1, 1, 13, 0))
+    assert stats["card_count"] == 3
+    assert stats["difficulty_histogram"] == [
+        {"difficulty_level": 2, "card_count": 1},
+        {"difficulty_level": 3, "card_count": 2},
+    ]
+    assert stats["average_difficulty"] == pytest.approx(8 / 3)
+    assert stats["due_count"] == 2
+    assert stats["overdue_count"] == 2
+    assert stats["last_reviewed_at"] == reviewed
+    assert test_db.get_topic_stats(other[0])["card_count"] == 1
+
+    test_db.delete_topic(topic[0])
+    assert test_db.get_topic_stats(topic[0]) is None
+    with test_db._read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM topic_difficulty WHERE topic_id = ?", (topic[0],)).fetchone()[0] == 0
+
+
+def test_similarity_index_follows_updates(test_db):
+    """Проверяет, что индекс похожих карточек обновляется при изменении текста и удалении карточки"""
+    topic = test_db.create_topic("Тема")
+    first = test_db.create_flashcard(topic[0], "Первый закон Ньютона", "Тело сохраняет состояние покоя")
+    second = test_db.create_flashcard(topic[0], "Что такое рекурсия", "Вызов функцией самой себя")
+    assert test_db.get_similar_flashcards(first[0]) == []
+
+    test_db.update_flashcard(second[0], question="Первый закон Ньютона?", answer="Тело сохраняет состояние покоя.")
+    similar = test_db.get_similar_flashcards(first[0])
+    assert [(flashcard[0], round(value, 2)) for flashcard, value in similar] == [(second[0], 1.0)]
+    found = test_db.find_similar_flashcards("Первый закон Ньютона", "Тело сохраняет покой")
+    assert {flashcard[0] for flashcard, _ in found} == {first[0], second[0]}
+
+    test_db.delete_flashcard(second[0])
+    assert test_db.get_similar_flashcards(first[0]) == []
+    with test_db._read() as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM flashcard_lsh WHERE flashcard_id = ?", (second[0],)).fetchone()
+        assert rows[0] == 0
+
+
+def test_similarity_index_follows_answer_cleared_or_changed(test_db):
+    """Проверяет, что индекс похожих карточек строится по новому ответу, в том числе пустому"""
+    topic = test_db.create_topic("Тема")
+    answer = "Тело сохраняет состояние покоя или равномерного прямолинейного движения"
+    first = test_db.create_flashcard(topic[0], "Первый закон Ньютона", answer)
+    second = test_db.create_flashcard(topic[0], "Закон инерции", answer)
+
+    test_db.update_flashcard(second[0], answer="")
+    found = test_db.find_similar_flashcards("Закон инерции", "", threshold=0.9)
+    assert [(flashcard[0], round(value, 2)) for flashcard, value in found] == [(second[0], 1.0)]
+
+    test_db.update_flashcard(second[0], answer="Ускорение пропорционально силе")
+    found = test_db.find_similar_flashcards("Закон инерции", "Ускорение пропорционально силе", threshold=0.9)
+    assert [flashcard[0] for flashcard, _ in found] == [second[0]]
+    assert test_db.find_similar_flashcards("Закон инерции", "", threshold=0.9) == []
+    assert second[0] not in {flashcard[0] for flashcard, _ in test_db.get_similar_flashcards(first[0], 0.3)}
+
+
+def test_similarity_index_is_built_on_lookup_not_on_write(test_db):
+    """Проверяет, что запись карточек не трогает индекс похожих, а поиск дописывает в него изменения из журнала"""
+
+    def indexed():
+        with test_db._read() as conn:
+            return conn.execute("SELECT COUNT(*) FROM flashcard_minhash").fetchone()[0]
+
+    topic = test_db.create_topic("Тема")
+    answer = "Тело сохраняет состояние покоя или равномерного прямолинейного движения"
+    first = test_db.create_flashcard(topic[0], "Первый закон Ньютона", answer)
+    second = test_db.create_flashcard(topic[0], "Закон инерции", answer)
+    assert indexed() == 0
+
+    assert [flashcard[0] for flashcard, _ in test_db.get_similar_flashcards(first[0], 0.3)] == [second[0]]
+    assert indexed() == 2
+
+    test_db.update_flashcard(second[0], answer="Ускорение пропорционально силе")
+    test_db.review_flashcard(first[0], 4)
+    assert test_db.get_similar_flashcards(first[0], 0.3) == []
+    assert indexed() == 2
+
+
+def test_write_waits_for_lock_held_by_another_process(tmp_path):
+    """Проверяет, что запись, заблокированная другим экземпляром базы (процессом), повторяется или возвращает 503"""
+    path = str(tmp_path / "flashcards.db")
+    holder = SimpleDB(db_file=path)
+    patient = SimpleDB(db_file=path, storage=StorageConfig(busy_timeout=0.01, busy_retries=8, busy_backoff=0.02))
+    impatient = SimpleDB(db_file=path, storage=StorageConfig(busy_timeout=0, busy_retries=0))
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        with holder._write():
+            locked.set()
+            release.wait()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(hold_lock)
+        locked.wait()
+        with pytest.raises(DatabaseBusy):
+            impatient.create_topic("Не дождалась")
+        threading.Timer(0.1, release.set).start()
+        patient.create_topic("Дождалась")
+
+    assert patient.busy_stats()["retries"] > 0
+    assert [topic[1] for topic in holder.get_all_topics()] == ["Дождалась"]
+    for db_instance in (holder, patient, impatient):
+        db_instance.close()
+
+
+def test_concurrent_startup_applies_migrations_once(tmp_path):
+    """Проверяет, что несколько экземпляров, одновременно открывающих новую базу, применяют миграции по одному разу"""
+    path = str(tmp_path / "flashcards.db")
+    barrier = threading.Barrier(4)
+
+    def open_db():
+        barrier.wait()
+        return SimpleDB(db_file=path)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        instances = list(executor.map(lambda _: open_db(), range(4)))
+    instances[0].create_topic("Тема")
+    with instances[1]._read() as conn:
+        assert schema_version(conn) == MIGRATIONS[-1][0]
+    assert [topic[1] for topic in instances[2].get_all_topics()] == ["Тема"]
+    for db_instance in instances:
+        db_instance.close()
+
+
+def test_get_flashcards_by_ids_uses_cache_and_chunks(file_db):
+    """Проверяет, что карточки по нескольким id берутся из кэша, а промахи читаются запросами по chunk_size id"""
+    topic = file_db.create_topic("Тема")
+    ids = [file_db.create_flashcard(topic[0], f"Вопрос {i}", "Ответ")[0] for i in range(5)]
+    file_db.get_flashcard_by_id(ids[0])
+    before = file_db.query_stats.snapshot()
+
+    rows = file_db.get_flashcards_by_ids([*ids, ids[1], 999], chunk_size=2)
+    assert sorted(rows) == ids
+    assert rows[ids[3]][2] == "Вопрос 3"
+    after = file_db.query_stats.snapshot()
+    batch_queries = [sql for sql in after if "WHERE id IN" in sql]
+    # Кэшированная карточка не запрашивается, остальные пять id (четыре и отсутствующий) - тремя запросами
+    assert sum(after[sql]["count"] - before.get(sql, {"count": 0})["count"] for sql in batch_queries) == 3
+
+    hits = file_db.cache_stats()["hits"]
+    assert set(file_db.get_flashcards_by_ids(ids)) == set(ids)
+    assert file_db.cache_stats()["hits"] == hits + len(ids)
+
+
+def test_timestamp_migration_keeps_values_and_output(tmp_path):
+    """Проверяет, что перевод меток времени в числа сохраняет значения до микросекунды и их вывод в API"""
+    path = str(tmp_path / "timestamps.db")
+    conn = sqlite3.connect(path)
+    migrate(conn, target=9)
+    created, reviewed = "2025-03-01T12:00:00", "2025-03-02T08:30:15.000120"
+    conn.execute("INSERT INTO topics(id, name, created_at, updated_at) VALUES (1, 'Тема', ?, ?)", (created, created))
+    conn.execute(
+        "INSERT INTO flashcards(topic_id, question, answer, difficulty_level, last_reviewed_at, created_at, "
+        "updated_at, due_at) VALUES (1, 'Вопрос', 'Ответ', 1, ?, ?, ?, ?)",
+        (reviewed, created, created, "2025-03-03T08:30:15.000120"),
+    )
+    conn.execute("INSERT INTO flashcards(topic_id, question, created_at) VALUES (1, 'Без повторения', 'не дата')")
+    conn.commit()
+    conn.close()
+
+    db_instance = SimpleDB(db_file=path)
+    with db_instance._read() as conn:
+        types = conn.execute(
+            "SELECT typeof(last_reviewed_at), typeof(created_at), typeof(due_at) FROM flashcards WHERE id = 1"
+        ).fetchone()
+        assert types == ("integer", "integer", "integer")
+        assert conn.execute("SELECT typeof(last_reviewed_at) FROM topic_stats").fetchone()[0] == "integer"
+    flashcard = db_instance.get_flashcard_by_id(1)
+    assert flashcard[5] == datetime.fromisoformat(reviewed)
+    body = json.loads(dumps(flashcard_dict(flashcard)))
+    assert (body["last_reviewed_at"], body["created_at"]) == (reviewed, created)
+    assert db_instance.get_flashcard_by_id(2)[6] is None
+    assert db_instance.get_topic_stats(1)["last_reviewed_at"] == datetime.fromisoformat(reviewed)
+
+    later = datetime(2025, 3, 5, 9, 0)
+    db_instance.review_flashcard(2, 5, later)
+    assert db_instance.get_topic_stats(1, now=later)["last_reviewed_at"] == later
+    assert [card[0] for card in db_instance.get_due_flashcards(1, 10, now=datetime(2025, 3, 4))] == [1]
+    db_instance.close()
+
+
+def test_timestamps_are_written_as_integers(file_db):
+    """Проверяет, что все записи передают метки времени числами, не полагаясь на адаптер datetime модуля sqlite3"""
+    assert sqlite3.adapters.get((datetime, sqlite3.PrepareProtocol)) is not to_timestamp
+    topic = file_db.create_topic("Тема")
+    file_db.update_topic(topic[0], description="Описание")
+    flashcard = file_db.create_flashcard(topic[0], "Вопрос", "Ответ")
+    file_db.create_flashcards_bulk(topic[0], [("Вопрос 2", "Ответ 2", 1)])
+    file_db.update_flashcard(flashcard[0], last_reviewed_at=datetime.fromisoformat("2024-01-01T10:00:00+03:00"))
+    file_db.review_flashcards([(flashcard[0], 4, datetime(2025, 3, 1, 9, 0))])
+
+    with file_db._read() as conn:
+        types = {
+            *conn.execute("SELECT typeof(created_at), typeof(updated_at) FROM topics").fetchall(),
+            *conn.execute(
+                "SELECT typeof(created_at), typeof(updated_at), typeof(due_at) FROM flashcards "
+                "UNION SELECT typeof(last_reviewed_at), 'integer', 'integer' FROM flashcards WHERE id = ?",
+                (flashcard[0],),
+            ).fetchall(),
+        }
+    assert types == {("integer", "integer"), ("integer", "integer", "integer")}
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from app import serialization
+from app.schemas import FlashcardRead, FlashcardSearchHit, TopicRead
+from app.serialization import (
+    dumps,
+    flashcard_dict,
+    iter_json_array,
+    rows_response,
+    search_hit_dict,
+    topic_dict,
+)
+
+# test_db создается классом database.database.SimpleDB, поэтому и записи берутся из модуля верхнего уровня
+from database.records import FlashcardRecord  # noqa: E402  isort:skip
+
+
+def test_rows_serialize_exactly_like_pydantic_schemas(test_db):
+    """Проверяет, что быстрая сериализация записей дает те же байты, что и Pydantic-схемы ответа"""
+    topic = test_db.create_topic("Тема \"в кавычках\"", None)
+    flashcard = test_db.create_flashcard(topic[0], "Что такое 😀?", "Ответ\nв две строки", 3)
+    reviewed = test_db.update_flashcard(flashcard[0], last_reviewed_at=datetime(2024, 1, 2, 3, 4, 5))
+    hit = test_db.search_flashcards("Что")[0]
+
+    assert dumps(topic_dict(topic)) == TopicRead.from_row(topic).model_dump_json().encode()
+    for row in (flashcard, reviewed):
+        assert dumps(flashcard_dict(row)) == FlashcardRead.from_row(row).model_dump_json().encode()
+    assert dumps(search_hit_dict(hit)) == FlashcardSearchHit.from_row(hit).model_dump_json().encode()
+
+
+def test_stdlib_fallback_matches_orjson(test_db, monkeypatch):
+    """Проверяет, что без orjson метки времени записываются в том же формате, что и с ним"""
+    topic = test_db.create_topic("Тема")
+    flashcard = test_db.create_flashcard(topic[0], "Вопрос", "Ответ")
+    reviewed = test_db.update_flashcard(flashcard[0], last_reviewed_at=datetime(2024, 1, 2, 3, 4, 5, 6))
+    expected = dumps(flashcard_dict(reviewed))
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert dumps(flashcard_dict(reviewed)) == expected
+
+
+def test_streamed_array_matches_rows_response(test_db):
+    """Проверяет, что потоковый JSON-массив совпадает по байтам с обычным ответом и читает записи пачками"""
+    topic = test_db.create_topic("Тема", None)
+    for i in range(5):
+        test_db.create_flashcard(topic[0], f"Вопрос {i}", "Ответ", 1)
+    rows = test_db.get_all_flashcards()
+    assert isinstance(rows[0], FlashcardRecord) and rows[0].question == rows[0][2] == "Вопрос 0"
+
+    expected = rows_response(rows, flashcard_dict).body
+    for batch_size in (1, 2, 5, 10):
+        assert b"".join(iter_json_array(iter(rows), flashcard_dict, batch_size)) == expected
+    assert b"".join(iter_json_array([], flashcard_dict)) == b"[]"
+    assert len(list(iter_json_array(test_db.iter_flashcards(batch_size=2), flashcard_dict, batch_size=2))) == 4